@@ -1,19 +1,20 @@
 # ~/CombinedNiftyNewsApp/app.py
 import os
 import logging
-from flask import Flask, render_template, request, jsonify, session as flask_session
+from flask import Flask, render_template, request, jsonify, g, session as flask_session
 from datetime import datetime, timedelta, timezone
 import json
 import time
 from sqlalchemy.orm import Session
 import pandas as pd
-import yfinance as yf
 
 # Project-specific utils
-from utils import gemini_utils, sentiment_analyzer, db_crud, newsapi_helpers
-from utils.database_models import SessionLocal, create_db_and_tables, ScrapedArticle
+from utils import gemini_utils, sentiment_analyzer, sentiment_aggregates, sentiment_series, db_crud, newsapi_helpers, price_store, leadlag, near_duplicates
+from utils.database_models import SessionLocal, create_db_and_tables, ScrapedArticle, engine
+from utils.storage import storage_stats
 from utils.newsfetch_lib.google import GoogleSearchNewsURLExtractor
 from utils.newsfetch_lib.news import Newspaper
+from utils.logging_setup import setup_queued_logging
 
 import config
 
@@ -21,17 +22,17 @@ app = Flask(__name__)
 app.secret_key = config.FLASK_SECRET_KEY
 
 # --- Logging Setup ---
-logging.basicConfig(
+# Request threads only enqueue records; a background listener writes the console and the rotating, gzipped app.log
+setup_queued_logging(
+    os.path.join(os.path.dirname(__file__), "app.log"),
     level=logging.DEBUG,
-    format='%(asctime)s - %(name)s - %(levelname)s - [%(filename)s:%(lineno)d (%(funcName)s)] - %(message)s',
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler(os.path.join(os.path.dirname(__file__), "app.log"))
-    ]
+    fmt='%(asctime)s - %(name)s - %(levelname)s - [%(filename)s:%(lineno)d (%(funcName)s)] - %(message)s'
 )
 logger = logging.getLogger(__name__)
 logging.getLogger("werkzeug").setLevel(logging.INFO)
 logging.getLogger("urllib3").setLevel(logging.WARNING)
+logging.getLogger("httpx").setLevel(logging.WARNING) # Shared pooled client logs every request at INFO
+logging.getLogger("httpcore").setLevel(logging.WARNING)
 logging.getLogger("nltk").setLevel(logging.INFO)
 logging.getLogger("selenium.webdriver.remote.remote_connection").setLevel(logging.WARNING)
 logging.getLogger("undetected_chromedriver").setLevel(logging.WARNING)
@@ -41,10 +42,17 @@ logging.getLogger("newsplease").setLevel(logging.INFO) # For news-please if it's
 
 # --- Database ---
 def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
+    """Request-scoped session: created on first use, closed (and rolled back on error) at teardown."""
+    if 'db' not in g:
+        g.db = SessionLocal()
+    return g.db
+
+@app.teardown_appcontext
+def close_db(exception=None):
+    db = g.pop('db', None)
+    if db is not None:
+        if exception is not None:
+            db.rollback()
         db.close()
 
 # --- API Key Management ---
@@ -127,21 +135,136 @@ def update_api_keys_route():
     logger.info(f"Session API Keys updated: {'; '.join(log_updates)}")
     return jsonify({"message": "Session API keys processed."})
 
+@app.route('/api/storage-metrics', methods=['GET'])
+def storage_metrics_route():
+    """Connection pool state, effective SQLite pragmas, statement latencies and lock waits/timeouts."""
+    return jsonify(storage_stats(engine))
+
+@app.route('/api/llm-analyses', methods=['GET'])
+def llm_analyses_route():
+    """Stored Gemini scores for one target over time: ?target_type=stock&target_name=TCS[&start_date=&end_date=&model=]."""
+    target_type = request.args.get('target_type', 'stock')
+    target_name = request.args.get('target_name', '').strip()
+    if not target_name:
+        return jsonify({'error': True, 'messages': ["target_name is required."]}), 400
+    rows = db_crud.get_llm_analyses(get_db(), target_type, target_name,
+                                    robust_date_parse(request.args.get('start_date')),
+                                    robust_date_parse(request.args.get('end_date')),
+                                    model_name=request.args.get('model'))
+    analyses = [{
+        'id': row.id, 'window_start': row.window_start.isoformat(), 'window_end': row.window_end.isoformat(),
+        'prompt_hash': row.prompt_hash, 'model_name': row.model_name, 'sentiment_score': row.sentiment_score,
+        'sentiment_label': row.sentiment_label, 'article_count': row.article_count,
+        'updated_at': row.updated_at.isoformat() if row.updated_at else None
+    } for row in rows]
+    return jsonify({'error': False, 'target_type': target_type, 'target_name': target_name, 'analyses': analyses})
+
+@app.route('/api/sentiment-series', methods=['GET'])
+def sentiment_series_route():
+    """
+    Daily count-weighted mean, rolling mean, EMA and z-score per entity over the full corpus, e.g.
+    ?entity=sector:Nifty IT&entity=stock:TCS&start_date=2024-01-01&end_date=2024-12-31&window=7&ema_span=10&z_window=30&score=vader
+    """
+    started = time.perf_counter()
+    errors = []
+    entities = []
+    for raw_entity in request.args.getlist('entity'):
+        entity_type, _, entity_name = raw_entity.partition(':')
+        if entity_type not in ('sector', 'stock') or not entity_name.strip():
+            errors.append(f"Invalid entity '{raw_entity}'; expected 'sector:<name>' or 'stock:<name>'.")
+        else:
+            entities.append((entity_type, entity_name.strip()))
+    if not entities and not errors:
+        errors.append("At least one entity parameter is required.")
+    if len(entities) > sentiment_series.MAX_SERIES_ENTITIES:
+        errors.append(f"At most {sentiment_series.MAX_SERIES_ENTITIES} entities per request.")
+
+    end_date = robust_date_parse(request.args.get('end_date')) or datetime.now(timezone.utc).date()
+    start_date = robust_date_parse(request.args.get('start_date')) or end_date - timedelta(days=364)
+    if start_date > end_date:
+        errors.append("Start date cannot be after end date.")
+    score = request.args.get('score', 'vader')
+    if score not in sentiment_series.SCORE_COLUMNS:
+        errors.append(f"score must be one of {sorted(sentiment_series.SCORE_COLUMNS)}.")
+    try:
+        rolling_window = int(request.args.get('window', sentiment_series.DEFAULT_ROLLING_WINDOW_DAYS))
+        ema_span = int(request.args.get('ema_span', sentiment_series.DEFAULT_EMA_SPAN_DAYS))
+        z_window = int(request.args.get('z_window', sentiment_series.DEFAULT_ZSCORE_WINDOW_DAYS))
+        if min(rolling_window, ema_span, z_window) < 1: raise ValueError
+    except ValueError:
+        errors.append("window, ema_span and z_window must be positive integers.")
+    if errors:
+        return jsonify({'error': True, 'messages': errors}), 400
+
+    payload = sentiment_series.get_sentiment_series(get_db(), entities, start_date, end_date, score=score,
+                                                    rolling_window=rolling_window, ema_span=ema_span, z_window=z_window)
+    payload.update({'error': False, 'score': score, 'window': rolling_window, 'ema_span': ema_span, 'z_window': z_window,
+                    'elapsed_ms': round((time.perf_counter() - started) * 1000, 2)})
+    return jsonify(payload)
+
+@app.route('/api/lead-lag', methods=['GET'])
+def lead_lag_route():
+    """
+    Sentiment/return cross-correlations at lags -max_lag..+max_lag, rolling correlations and Granger tests for every
+    configured stock, with Fisher-averaged sector rows for a heatmap, e.g.
+    ?start_date=2024-01-01&end_date=2024-12-31&sector=Nifty IT&max_lag=5&window=60&rolling_lag=1&score=vader&granger=1
+    """
+    started = time.perf_counter()
+    errors = []
+    sectors = request.args.getlist('sector')
+    unknown_sectors = [sector for sector in sectors if sector not in gemini_utils.NIFTY_SECTORS_QUERY_CONFIG]
+    if unknown_sectors:
+        errors.append(f"Unknown sector(s): {', '.join(unknown_sectors)}.")
+    end_date = robust_date_parse(request.args.get('end_date')) or datetime.now(timezone.utc).date()
+    start_date = robust_date_parse(request.args.get('start_date')) or end_date - timedelta(days=364)
+    if start_date > end_date:
+        errors.append("Start date cannot be after end date.")
+    score = request.args.get('score', 'vader')
+    if score not in leadlag.SCORES:
+        errors.append(f"score must be one of {list(leadlag.SCORES)}.")
+    try:
+        max_lag = int(request.args.get('max_lag', leadlag.DEFAULT_MAX_LAG_DAYS))
+        rolling_window = int(request.args.get('window', leadlag.DEFAULT_ROLLING_WINDOW_DAYS))
+        rolling_lag = int(request.args.get('rolling_lag', leadlag.DEFAULT_ROLLING_LAG_DAYS))
+        if not 1 <= max_lag <= leadlag.MAX_LAG_DAYS or rolling_window < 3 or not 0 <= rolling_lag <= max_lag: raise ValueError
+    except ValueError:
+        errors.append(f"max_lag must be 1-{leadlag.MAX_LAG_DAYS}, window at least 3 and rolling_lag between 0 and max_lag.")
+    granger = request.args.get('granger', '1').lower() not in ('0', 'false', 'no')
+    if errors:
+        return jsonify({'error': True, 'messages': errors}), 400
+
+    payload = leadlag.get_lead_lag(get_db(), start_date, end_date, sectors=sectors or None, score=score, max_lag=max_lag,
+                                   rolling_window=rolling_window, rolling_lag=rolling_lag, granger=granger)
+    payload.update({'error': False, 'start_date': start_date.isoformat(), 'end_date': end_date.isoformat(),
+                    'elapsed_ms': round((time.perf_counter() - started) * 1000, 2)})
+    return jsonify(payload)
+
 def process_articles_for_llm(articles_list, target_name_for_log, db_session_for_vader_update: Session, source_type="db"):
-    """ Processes articles from DB or NewsAPI for LLM input. """
+    """
+    Processes articles from DB or NewsAPI for LLM input.
+    DB articles are metadata rows (db_crud.get_article_metadata_for_analysis); their 'content' stays None
+    until attach_article_contents() loads it for the ones actually sent to Gemini. Bodies are only read
+    here for articles that still need a VADER score.
+    """
     processed_list = []
     if not articles_list: return processed_list
+
+    bodies_for_vader, vader_updates = {}, []
+    if source_type == "db":
+        bodies_for_vader = db_crud.get_article_bodies(db_session_for_vader_update,
+                                                      [art.id for art in articles_list if art.vader_score is None])
     
     for art_data in articles_list:
-        if source_type == "db": # art_data is a ScrapedArticle object
-            if not art_data.article_text:
-                logger.warning(f"Skipping DB article for LLM (no text): {art_data.url} for {target_name_for_log}")
-                continue
-            content_to_analyze = art_data.article_text
+        if source_type == "db": # art_data is a metadata row (id, url, publication_date, source_domain, vader_score, ...)
+            content_to_analyze = None
             vader_s = art_data.vader_score
             if vader_s is None:
+                content_to_analyze = bodies_for_vader.get(art_data.id)
+                if not content_to_analyze:
+                    logger.warning(f"Skipping DB article for LLM (no text): {art_data.url} for {target_name_for_log}")
+                    continue
                 vader_s = sentiment_analyzer.get_vader_sentiment_score(content_to_analyze)
-                db_crud.update_article_sentiment_scores(db_session_for_vader_update, article_url=art_data.url, vader_score=vader_s)
+                vader_updates.append((art_data.id, {'vader_score': vader_s}))
             
             processed_list.append({
                 'content': content_to_analyze,
@@ -157,16 +280,37 @@ def process_articles_for_llm(articles_list, target_name_for_log, db_session_for_
                 continue
             # vader_score should already be in newsapi article dict from newsapi_helpers
             processed_list.append(art_data) 
-            
+
+    db_crud.bulk_update_article_sentiment_scores(db_session_for_vader_update, vader_updates) # One statement + commit for the batch
     return processed_list
 
+def attach_article_contents(db: Session, articles):
+    """Loads article_text (one query) for the DB articles in `articles` that have no 'content' yet; drops any without text."""
+    missing_ids = [art['db_id'] for art in articles if art.get('content') is None and art.get('db_id') is not None]
+    bodies = db_crud.get_article_bodies(db, missing_ids)
+    for art in articles:
+        if art.get('content') is None and art.get('db_id') is not None:
+            art['content'] = bodies.get(art['db_id'])
+    return [art for art in articles if art.get('content')]
+
+def record_llm_analysis(db: Session, target_type, target_name, window_start, window_end, custom_prompt, gemini_result, articles,
+                        batched=False):
+    """Stores one llm_analyses row (typed score/label + JSON) linked to the DB articles that were sent to Gemini."""
+    if not gemini_result:
+        return None
+    return db_crud.save_llm_analysis(
+        db, target_type, target_name, window_start, window_end,
+        gemini_utils.analysis_prompt_hash(target_type, custom_prompt, batched=batched), gemini_utils.GEMINI_MODEL_NAME,
+        gemini_result, [art.get('db_id') for art in articles]
+    )
+
 @app.route('/api/sector-analysis', methods=['POST'])
 def perform_sector_analysis_route():
     form_data = request.json
     logger.info(f"Batch Sector Analysis Request: {form_data}")
     ui_log_messages = []
     append_log_local = setup_local_logger(ui_log_messages)
-    db: Session = next(get_db())
+    db: Session = get_db()
     current_api_keys = get_api_keys_from_session_or_config()
     results_payload = []
     user_facing_errors = []
@@ -219,13 +363,13 @@ def perform_sector_analysis_route():
         db_query_keywords_sector = [sector_name] + sector_config_details.get("newsapi_keywords", [])[:3]
 
         append_log_local(f"Querying DB for sector '{sector_name}' with keywords: {db_query_keywords_sector}", "DEBUG")
-        db_sector_articles_raw = db_crud.get_articles_for_analysis(
+        db_sector_articles_raw = db_crud.get_article_metadata_for_analysis(
             db, query_start_date, query_end_date,
             target_keywords=list(set(db_query_keywords_sector)),
             limit=max_articles_llm_sector * 3
         )
         articles_for_sector_llm_input = process_articles_for_llm(db_sector_articles_raw, sector_name, db, source_type="db")
-        articles_trimmed_for_llm = articles_for_sector_llm_input[:max_articles_llm_sector]
+        articles_trimmed_for_llm = attach_article_contents(db, articles_for_sector_llm_input[:max_articles_llm_sector])
         # (Rest of your logic for sector_gemini_result, VADER, and appending to results_payload)
         # ... (This part seems mostly fine from previous version)
         current_sector_error = None
@@ -241,11 +385,18 @@ def perform_sector_analysis_route():
             sector_gemini_result, gemini_err = gemini_utils.analyze_news_with_gemini(
                 current_api_keys['gemini'],
                 [art['content'] for art in articles_trimmed_for_llm],
-                sector_name, llm_context_range_str, custom_prompt, append_log_local, target_type="sector"
+                sector_name, llm_context_range_str, custom_prompt, append_log_local, target_type="sector",
+                relevance_keywords=db_query_keywords_sector
             )
             if gemini_err: current_sector_error = gemini_err
+            record_llm_analysis(db, "sector", sector_name, query_start_date, query_end_date, custom_prompt,
+                                sector_gemini_result, articles_trimmed_for_llm)
         
-        avg_vader_score_for_this_sector_batch = sentiment_analyzer.get_average_vader_score(all_vader_scores_for_sector)
+        sector_vader_summary = sentiment_aggregates.get_entity_sentiment_summary(db, "sector", sector_name, query_start_date, query_end_date)
+        if sector_vader_summary['vader_count']: # All articles tagged with the sector in range, from daily_entity_sentiment
+            avg_vader_score_for_this_sector_batch = sector_vader_summary['avg_vader_score']
+        else:
+            avg_vader_score_for_this_sector_batch = sentiment_analyzer.get_average_vader_score(all_vader_scores_for_sector)
         vader_label_for_this_sector_batch = sentiment_analyzer.get_sentiment_label_from_score(avg_vader_score_for_this_sector_batch)
 
         results_payload.append({
@@ -269,7 +420,7 @@ def perform_sub_stock_analysis_route():
     logger.info(f"Sub-Stock Analysis Request: {form_data}")
     ui_log_messages = []
     append_log_local = setup_local_logger(ui_log_messages)
-    db: Session = next(get_db())
+    db: Session = get_db()
     current_api_keys = get_api_keys_from_session_or_config()
     stock_analysis_results_payload = []
     user_facing_errors = []
@@ -315,46 +466,57 @@ def perform_sub_stock_analysis_route():
     sector_full_config = gemini_utils.NIFTY_SECTORS_QUERY_CONFIG.get(sector_name, {})
     stocks_config_for_sector = sector_full_config.get("stocks", {})
 
+    stock_inputs = {} # stock_name -> (articles considered, articles sent to the LLM, query keywords, error)
     for stock_name in selected_stocks_from_form:
         append_log_local(f"--- Processing STOCK: {stock_name} (Sector: {sector_name}) ---", "INFO")
         stock_db_query_keywords = stocks_config_for_sector.get(stock_name, [stock_name])
-        db_stock_articles_raw = db_crud.get_articles_for_analysis(
+        db_stock_articles_raw = db_crud.get_article_metadata_for_analysis(
             db, query_start_date, query_end_date,
             target_keywords=list(set(stock_db_query_keywords)),
             limit=max_articles_llm_stock * 3
         )
         articles_for_stock_llm_input = process_articles_for_llm(db_stock_articles_raw, stock_name, db, source_type="db")
-        articles_trimmed_for_llm_stock = articles_for_stock_llm_input[:max_articles_llm_stock]
-        # (Rest of your logic for stock_gemini_result, VADER, and appending to stock_analysis_results_payload)
-        # ... (This part seems mostly fine from previous version)
+        articles_trimmed_for_llm_stock = attach_article_contents(db, articles_for_stock_llm_input[:max_articles_llm_stock])
         current_stock_error = None
         if not articles_trimmed_for_llm_stock:
             current_stock_error = f"No relevant articles with text found in DB for stock '{stock_name}' for LLM."
             append_log_local(current_stock_error, "WARNING")
-        
-        stock_gemini_result = None
-        all_vader_scores_for_stock = [art['vader_score'] for art in articles_for_stock_llm_input if art.get('vader_score') is not None]
+        stock_inputs[stock_name] = (articles_for_stock_llm_input, articles_trimmed_for_llm_stock, stock_db_query_keywords, current_stock_error)
+
+    # One Gemini request per group of stocks (GEMINI_BATCH_MAX_ENTITIES) instead of one per stock
+    entity_articles = {stock_name: ([art['content'] for art in trimmed], keywords)
+                       for stock_name, (_, trimmed, keywords, error) in stock_inputs.items() if trimmed and not error}
+    gemini_outcomes = {}
+    if entity_articles:
+        append_log_local(f"Sending articles for {len(entity_articles)} stocks to Gemini in batched requests.", "INFO")
+        gemini_outcomes = gemini_utils.analyze_entities_batch_with_gemini(
+            current_api_keys['gemini'], entity_articles, llm_context_range_str, custom_prompt, append_log_local,
+            target_type="stock"
+        )
 
-        if articles_trimmed_for_llm_stock and not current_stock_error:
-            append_log_local(f"Sending {len(articles_trimmed_for_llm_stock)} articles to Gemini for stock '{stock_name}'.", "INFO")
-            stock_gemini_result, gemini_err = gemini_utils.analyze_news_with_gemini(
-                current_api_keys['gemini'],
-                [art['content'] for art in articles_trimmed_for_llm_stock],
-                stock_name, llm_context_range_str, custom_prompt, append_log_local, target_type="stock"
+    for stock_name, (articles_for_stock_llm_input, articles_trimmed_for_llm_stock, _, current_stock_error) in stock_inputs.items():
+        all_vader_scores_for_stock = [art['vader_score'] for art in articles_for_stock_llm_input if art.get('vader_score') is not None]
+        stock_gemini_result, gemini_err, batched = gemini_outcomes.get(stock_name, (None, None, False))
+        if gemini_err: current_stock_error = gemini_err
+        if stock_gemini_result: # Store the analysis once (not per article) and tag the contributing articles
+            record_llm_analysis(db, "stock", stock_name, query_start_date, query_end_date, custom_prompt,
+                                stock_gemini_result, articles_trimmed_for_llm_stock, batched=batched)
+            llm_score = stock_gemini_result.get('sentiment_score_llm')
+            related_fields = { # Per-article LLM score feeds daily_entity_sentiment's llm_* cells; the JSON stays in llm_analyses
+                'llm_sentiment_score': float(llm_score) if isinstance(llm_score, (int, float)) else None,
+                'llm_sentiment_label': stock_gemini_result.get('overall_sentiment'),
+                'related_sector': sector_name, 'related_stock': stock_name
+            }
+            db_crud.bulk_update_article_sentiment_scores(
+                db, [(art_input_item['db_id'], related_fields) for art_input_item in articles_trimmed_for_llm_stock
+                     if art_input_item.get('db_id')] # Only DB articles
             )
-            if gemini_err: current_stock_error = gemini_err
-            if stock_gemini_result: # Update DB with LLM results if successful
-                for art_input_item in articles_trimmed_for_llm_stock:
-                    if art_input_item.get('db_id'): # Only if it's a DB article
-                        db_crud.update_article_sentiment_scores(
-                            db, article_url=art_input_item['uri'], # URL is more unique
-                            llm_sentiment_score=stock_gemini_result.get('sentiment_score_llm'),
-                            llm_sentiment_label=stock_gemini_result.get('overall_sentiment'),
-                            llm_analysis_json=json.dumps(stock_gemini_result),
-                            related_sector=sector_name, related_stock=stock_name
-                        )
         
-        avg_vader_score_for_this_stock_batch = sentiment_analyzer.get_average_vader_score(all_vader_scores_for_stock)
+        stock_vader_summary = sentiment_aggregates.get_entity_sentiment_summary(db, "stock", stock_name, query_start_date, query_end_date)
+        if stock_vader_summary['vader_count']:
+            avg_vader_score_for_this_stock_batch = stock_vader_summary['avg_vader_score']
+        else:
+            avg_vader_score_for_this_stock_batch = sentiment_analyzer.get_average_vader_score(all_vader_scores_for_stock)
         vader_label_for_this_stock_batch = sentiment_analyzer.get_sentiment_label_from_score(avg_vader_score_for_this_stock_batch)
 
         stock_analysis_results_payload.append({
@@ -378,7 +540,7 @@ def adhoc_analysis_scrape_route():
     logger.info(f"Ad-hoc Analysis/Scrape Request: {form_data}")
     ui_log_messages = []
     append_log_local = setup_local_logger(ui_log_messages)
-    db: Session = next(get_db())
+    db: Session = get_db()
     current_api_keys = get_api_keys_from_session_or_config()
     user_facing_errors = []
 
@@ -439,10 +601,10 @@ def adhoc_analysis_scrape_route():
         append_log_local("On-demand scrape attempt finished. Proceeding with analysis.", "INFO")
     
     articles_for_analysis = [] # This will hold dicts like {'content': ..., 'date': ..., 'uri': ..., 'source': ..., 'vader_score': ...}
+    db_query_keywords = [target_name] # Also the relevance keywords for Gemini context packing
     
     if news_source_priority in ['local_db_then_newsapi', 'local_db_only']:
         append_log_local(f"Fetching from Local DB for '{target_name}'", "INFO")
-        db_query_keywords = [target_name]
         # Add more specific keywords for DB query if possible
         if target_type == "sector":
             sector_cfg = gemini_utils.NIFTY_SECTORS_QUERY_CONFIG.get(target_name, {})
@@ -453,7 +615,7 @@ def adhoc_analysis_scrape_route():
                     db_query_keywords.extend(sector_data_val["stocks"][target_name][:2])
                     break
         
-        db_articles_raw = db_crud.get_articles_for_analysis(
+        db_articles_raw = db_crud.get_article_metadata_for_analysis(
             db, query_start_date_obj, query_end_date_obj,
             target_keywords=list(set(db_query_keywords)),
             limit=max_articles_llm * 3 # Fetch more for VADER even if LLM count is small
@@ -510,7 +672,7 @@ def adhoc_analysis_scrape_route():
 
 
     articles_for_analysis.sort(key=lambda x: x.get('date', '1970-01-01'), reverse=True)
-    articles_trimmed_for_llm = articles_for_analysis[:max_articles_llm]
+    articles_trimmed_for_llm = attach_article_contents(db, articles_for_analysis[:max_articles_llm])
 
     llm_analysis_result = None
     current_target_error = newsapi_err_msg
@@ -528,15 +690,25 @@ def adhoc_analysis_scrape_route():
         llm_analysis_result, gemini_err = gemini_utils.analyze_news_with_gemini(
             current_api_keys['gemini'],
             [art['content'] for art in articles_trimmed_for_llm],
-            target_name, llm_context_range_str, custom_prompt, append_log_local, target_type=target_type
+            target_name, llm_context_range_str, custom_prompt, append_log_local, target_type=target_type,
+            relevance_keywords=db_query_keywords
         )
         if gemini_err:
             current_target_error = (current_target_error + "; " + gemini_err) if current_target_error else gemini_err
             append_log_local(f"Gemini error for {target_name}: {gemini_err}", "ERROR")
+        record_llm_analysis(db, target_type, target_name, query_start_date_obj, query_end_date_obj, custom_prompt,
+                            llm_analysis_result, articles_trimmed_for_llm)
 
     # Prepare data for daily rolling sentiment (VADER based on all fetched articles)
     daily_sentiment_data = []
-    if articles_for_analysis:
+    if news_source_priority != 'newsapi_only':
+        # Indexed read of the incrementally maintained daily_entity_sentiment rows for this target
+        daily_sentiment_data = [
+            {'date': day['date'], 'avg_sentiment_score': day['avg_vader_score']}
+            for day in sentiment_aggregates.get_daily_sentiment_series(db, target_type, target_name, query_start_date_obj, query_end_date_obj)
+            if day['avg_vader_score'] is not None
+        ]
+    if not daily_sentiment_data and articles_for_analysis: # Untagged target or NewsAPI-only: average the fetched articles
         df_articles = pd.DataFrame(articles_for_analysis)
         if not df_articles.empty and 'date' in df_articles.columns and 'vader_score' in df_articles.columns:
             df_articles['date_obj'] = pd.to_datetime(df_articles['date'], errors='coerce')
@@ -550,7 +722,7 @@ def adhoc_analysis_scrape_route():
 
     price_data_for_chart = []
     if target_type == "stock":
-        price_data_for_chart = get_yfinance_prices(target_name, query_start_date_obj.strftime('%Y-%m-%d'), query_end_date_obj.strftime('%Y-%m-%d'), append_log_local)
+        price_data_for_chart = get_stock_prices_for_chart(target_name, query_start_date_obj, query_end_date_obj, append_log_local)
 
     return jsonify({
         'error': bool(current_target_error),
@@ -565,118 +737,26 @@ def adhoc_analysis_scrape_route():
         'logs': ui_log_messages
     })
 
-def get_yfinance_prices(ticker, start_date_str, end_date_str, append_log_local):
-    """Fetches historical price data using yfinance."""
-    if not ticker:
-        append_log_local(f"No ticker provided for yfinance.", "ERROR")
+def get_stock_prices_for_chart(stock_name, start_date_obj, end_date_obj, append_log_local):
+    """Daily closes for the chart from the local price store, topping up only missing dates (whole sector at once)."""
+    if not stock_name:
+        append_log_local("No ticker provided for price lookup.", "ERROR")
         return []
-
-    ticker_yf = ticker.upper()
-    if '.' not in ticker_yf: # If no exchange suffix, default to .NS
-        ticker_yf = f"{ticker_yf}.NS"
-    
-    append_log_local(f"Fetching yfinance data for {ticker_yf} from {start_date_str} to {end_date_str}", "INFO")
-    
+    symbol = price_store.nse_symbol(stock_name)
     try:
-        yf_end_date_dt = datetime.strptime(end_date_str, "%Y-%m-%d") + timedelta(days=1)
-        yf_end_date_str_inclusive = yf_end_date_dt.strftime("%Y-%m-%d")
-
-        stock_data_df = yf.download(
-            ticker_yf, 
-            start=start_date_str, 
-            end=yf_end_date_str_inclusive, 
-            progress=False, 
-            auto_adjust=True
-        )
-        
-        if stock_data_df.empty:
-            append_log_local(f"No price data found for {ticker_yf} (attempt 1) for period {start_date_str} to {end_date_str}.", "WARNING")
-            if ticker_yf.endswith(".NS"):
-                ticker_plain = ticker_yf[:-3]
-                append_log_local(f"Retrying yfinance for {ticker_plain} without .NS suffix.", "INFO")
-                stock_data_df = yf.download(ticker_plain, start=start_date_str, end=yf_end_date_str_inclusive, progress=False, auto_adjust=True)
-                if stock_data_df.empty:
-                    append_log_local(f"Still no price data for {ticker_plain} (attempt 2).", "WARNING")
-                    return []
-            else:
-                return []
-        
-        stock_data_df_reset = stock_data_df.reset_index()
-        
-        price_list = []
-        for index, row_data in stock_data_df_reset.iterrows(): # row_data is a Pandas Series for each row
-            date_scalar = None
-            close_price_scalar = None
-
-            # --- CRITICAL FIX: Ensure we are working with SCALAR values ---
-            try:
-                # Attempt to get the scalar value. If row_data['Date'] is already scalar, this is fine.
-                # If it's a Series with one item, .item() extracts it.
-                # If it's a Series with multiple items (unexpected here), .item() would raise an error.
-                date_value_from_row = row_data['Date']
-                if isinstance(date_value_from_row, pd.Series):
-                    if len(date_value_from_row) == 1:
-                        date_scalar = date_value_from_row.item()
-                    else:
-                        append_log_local(f"Row {index} 'Date' is a Series with multiple values: {date_value_from_row}. Skipping.", "ERROR")
-                        continue
-                else: # Assume it's already a scalar (Timestamp, datetime, or other)
-                    date_scalar = date_value_from_row
-
-                close_price_from_row = row_data['Close']
-                if isinstance(close_price_from_row, pd.Series):
-                    if len(close_price_from_row) == 1:
-                        close_price_scalar = close_price_from_row.item()
-                    else:
-                        append_log_local(f"Row {index} 'Close' is a Series with multiple values: {close_price_from_row}. Skipping.", "ERROR")
-                        continue
-                else: # Assume it's already a scalar
-                    close_price_scalar = close_price_from_row
-
-            except KeyError as ke:
-                append_log_local(f"KeyError accessing 'Date' or 'Close' for row {index}: {ke}. Row data: {row_data.to_dict()}", "ERROR")
-                continue
-            except ValueError as ve: # Handles .item() error if Series has more than one element
-                append_log_local(f"ValueError extracting scalar for row {index} (likely multi-value Series): {ve}. Row Date: {row_data.get('Date')}, Row Close: {row_data.get('Close')}. Skipping.", "ERROR")
-                continue
-
-
-            # Now date_scalar and close_price_scalar should be actual scalar values or None
-            if pd.isna(date_scalar) or pd.isna(close_price_scalar):
-                append_log_local(f"Skipping row {index} due to NaN date or price. Date: {date_scalar}, Price: {close_price_scalar}", "DEBUG")
-                continue
-
-            formatted_date = ""
-            if isinstance(date_scalar, pd.Timestamp):
-                formatted_date = date_scalar.strftime('%Y-%m-%d')
-            elif isinstance(date_scalar, datetime): # datetime.datetime object
-                formatted_date = date_scalar.strftime('%Y-%m-%d')
-            else: # Fallback for other types, like strings if data was odd
-                append_log_local(f"Unexpected date type for {ticker_yf} at row {index}: {type(date_scalar)}. Value: {date_scalar}. Attempting string conversion and parsing.", "WARNING")
-                try:
-                    formatted_date = pd.to_datetime(str(date_scalar)).strftime('%Y-%m-%d')
-                except Exception as e_conv:
-                    append_log_local(f"Could not format date '{date_scalar}' at row {index}: {e_conv}. Skipping point.", "ERROR")
-                    continue
-            
-            try:
-                numeric_close_price = float(close_price_scalar)
-            except (ValueError, TypeError) as e_price_conv:
-                append_log_local(f"Could not convert close price '{close_price_scalar}' to float at row {index}: {e_price_conv}. Skipping point.", "ERROR")
-                continue
-
-            price_list.append({
-                "date": formatted_date,
-                "close_price": numeric_close_price
-            })
-            
-        append_log_local(f"Successfully processed {len(price_list)} price points for {ticker_yf}.", "INFO")
-        return price_list
-        
+        topped_up = price_store.ensure_prices([symbol] + price_store.sector_peer_symbols(stock_name), start_date_obj, end_date_obj)
+        if topped_up:
+            append_log_local(f"Price store topped up for {len(topped_up)} symbols ({start_date_obj} to {end_date_obj}).", "INFO")
+        price_list = price_store.chart_price_records(price_store.read_prices(symbol, start_date_obj, end_date_obj, columns=["Close"]))
     except Exception as e:
-        append_log_local(f"General error fetching or processing yfinance data for {ticker_yf}: {e}", "ERROR")
-        logger.error(f"Full yfinance error details for {ticker_yf}:", exc_info=True)
+        append_log_local(f"Error loading price data for {symbol}: {e}", "ERROR")
+        logger.error(f"Full price store error details for {symbol}:", exc_info=True)
         return []
+    if not price_list:
+        append_log_local(f"No price data stored for {symbol} for period {start_date_obj} to {end_date_obj}.", "WARNING")
+    else:
+        append_log_local(f"Loaded {len(price_list)} price points for {symbol} from the price store.", "INFO")
+    return price_list
 
 def run_on_demand_scrape(target_name, target_type, start_date_obj, end_date_obj, domains_to_scrape, db_session, append_log_local):
     """
@@ -715,8 +795,9 @@ def run_on_demand_scrape(target_name, target_type, start_date_obj, end_date_obj,
                     end_date_str=google_end_date_param,
                     lang="en", 
                     country_code="IN", 
-                    num_pages=1 # For on-demand, usually 1 page is enough
+                    num_pages=1, # For on-demand, usually 1 page is enough
                     # proxy_config=get_random_proxy() # If you implement proxy rotation
+                    governor_wait_timeout=60 # Don't hold the request while Google's CAPTCHA circuit is open
                 )
                 # Call the method that fetches URLs and manages the driver
                 found_urls = google_tool.fetch_all_urls() 
@@ -760,9 +841,15 @@ def run_on_demand_scrape(target_name, target_type, start_date_obj, end_date_obj,
                                 keywords_extracted=json.dumps(news_article.keywords) if news_article.keywords else None,
                                 summary_generated=news_article.summary,
                                 related_sector=target_name if target_type == "sector" else None,
-                                related_stock=target_name if target_type == "stock" else None
+                                related_stock=target_name if target_type == "stock" else None,
+                                vader_score=sentiment_analyzer.get_vader_sentiment_score(news_article.article),
+                                http_etag=news_article.etag,
+                                http_last_modified=news_article.last_modified,
+                                content_hash=news_article.content_hash
                             )
                             db_session.add(db_entry)
+                            near_duplicates.assign_clusters(db_session, [db_entry])
+                            sentiment_aggregates.record_new_articles(db_session, [db_entry])
                             db_session.commit() # Commit each article to make it available sooner
                             existing_db_urls.add(url) # Add to set after successful save
                             articles_saved_count += 1
@@ -0,0 +1,41 @@
+# tests/test_context_packing.py
+import pytest
+
+from utils.context_packing import ARTICLE_SEPARATOR, estimate_tokens, pack_articles, split_sentences
+
+ARTICLES = [
+    " ".join(f"Tata Motors reported quarter {n} revenue growth of {n * 3} per cent as demand for its trucks rose."
+             for n in range(1, 40)),
+    "Markets were volatile. " + " ".join(f"Analysts raised the target price on Tata Motors to Rs. {700 + n} after results."
+                                         for n in range(25)),
+    " ".join(f"The monsoon covered {n} districts this week, the weather office said in its update." for n in range(30)),
+    # A syndicated copy of the first article: its sentences are repeats
+    " ".join(f"Tata Motors reported quarter {n} revenue growth of {n * 3} per cent as demand for its trucks rose."
+             for n in range(1, 40)),
+]
+
+
+@pytest.mark.parametrize("budget", [40, 150, 600, 6000])
+def test_packed_context_stays_within_the_token_budget(budget):
+    packed, stats = pack_articles(ARTICLES, ["Tata Motors"], token_budget=budget)
+    assert stats['estimated_tokens'] <= budget
+    assert estimate_tokens(ARTICLE_SEPARATOR.join(packed)) <= budget
+
+
+def test_repeated_sentences_are_packed_once():
+    packed, stats = pack_articles(ARTICLES, ["Tata Motors"], token_budget=100000)
+    sentences = [sentence for text in packed for sentence in split_sentences(text)]
+    assert len(sentences) == len(set(sentences))
+    assert stats['repeats_dropped'] > 0
+
+
+def test_relevant_sentences_are_preferred_under_a_tight_budget():
+    packed, _ = pack_articles(ARTICLES[:3], ["Tata Motors"], token_budget=150)
+    text = " ".join(packed)
+    assert "Tata Motors" in text
+    assert text.count("monsoon") <= 1 # Only the lead-sentence bonus can get an off-topic sentence in
+
+
+def test_abbreviations_do_not_split_sentences():
+    assert split_sentences("Shares rose to Rs. 720 on Monday. Volumes doubled.") == [
+        "Shares rose to Rs. 720 on Monday.", "Volumes doubled."]
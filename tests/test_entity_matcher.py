@@ -0,0 +1,48 @@
+# tests/test_entity_matcher.py
+import pytest
+
+from utils.entity_matcher import RELEVANCE_WEIGHTS, EntityMatcher
+
+SKIP_THRESHOLD = 0.25 # SERP_RELEVANCE_SKIP_THRESHOLD default in scrape_financial_news_db.py
+
+CONFIG = {
+    "Nifty Bank": {
+        "newsapi_keywords": ["Banking India", "State Bank of India", "Punjab National Bank"],
+        "stocks": {
+            "SBI": ["State Bank of India", "SBI banking", "SBI loans"],
+            "PNB": ["Punjab National Bank", "PNB banking"],
+            "Kotak Mahindra Bank": ["Kotak Bank", "Kotak wealth"],
+            "Indian Bank": ["Indian Bank India"],
+        },
+    },
+}
+
+
+@pytest.fixture(scope="module")
+def matcher():
+    return EntityMatcher(CONFIG)
+
+
+@pytest.mark.parametrize("stock_name, title", [
+    ("SBI", "State Bank of India Q2 profit jumps 30%"),
+    ("PNB", "Punjab National Bank cuts lending rates"),
+    ("Kotak Mahindra Bank", "Kotak Bank shares surge"),
+])
+def test_proper_name_alias_in_title_scores_like_the_name(matcher, stock_name, title):
+    score = matcher.score_relevance("stock", stock_name, title=title)
+    assert score == RELEVANCE_WEIGHTS['title_name']
+    assert score > SKIP_THRESHOLD
+
+
+def test_lowercase_alias_stays_weak(matcher):
+    assert matcher.score_relevance("stock", "Indian Bank", title="Indian bank stocks rally") < SKIP_THRESHOLD
+    assert matcher.score_relevance("stock", "Indian Bank", title="Indian Bank Q2 results") > SKIP_THRESHOLD
+
+
+def test_topic_alias_is_not_a_proper_name(matcher):
+    assert matcher.score_relevance("stock", "Kotak Mahindra Bank", title="Kotak wealth arm hires advisers") < SKIP_THRESHOLD
+
+
+@pytest.mark.parametrize("title", ["SBI SHARES JUMP 5% AFTER Q2 RESULTS", "state bank of india q2 profit jumps 30%"])
+def test_titles_without_mixed_case_match_the_name_in_any_case(matcher, title):
+    assert matcher.score_relevance("stock", "SBI", title=title) == RELEVANCE_WEIGHTS['title_name']
@@ -0,0 +1,57 @@
+# tests/test_gemini_batching.py
+import copy
+
+import pytest
+
+from utils import gemini_utils
+from utils.gemini_utils import DEFAULT_RESPONSE_STRUCTURE, analysis_entry_problems
+
+
+def _entry(**overrides):
+    entry = copy.deepcopy(DEFAULT_RESPONSE_STRUCTURE)
+    entry.update(summary="Deposits grew.", overall_sentiment="Positive", sentiment_score_llm=0.4, key_themes=["deposits"])
+    entry.update(overrides)
+    return entry
+
+
+def test_well_formed_entry_is_accepted():
+    assert analysis_entry_problems(_entry()) == []
+
+
+def test_key_themes_may_be_the_no_news_text():
+    assert analysis_entry_problems(_entry(key_themes="N/A due to lack of relevant news")) == []
+    assert analysis_entry_problems(_entry(risks_identified="none")) == ["'risks_identified' is not a list"]
+
+
+@pytest.mark.parametrize("entry, problem", [
+    ("Positive outlook", "not a JSON object"),
+    ({k: v for k, v in _entry().items() if k != "summary"}, "missing 'summary'"),
+    (_entry(sentiment_score_llm=1.5), "'sentiment_score_llm' is not a number in [-1, 1]"),
+    (_entry(sentiment_score_llm="0.4"), "'sentiment_score_llm' is not a number in [-1, 1]"),
+    (_entry(sentiment_score_llm=True), "'sentiment_score_llm' is not a number in [-1, 1]"),
+    (_entry(summary=None), "'summary' is not a string"),
+    (_entry(overall_sentiment="Bullish"), "unknown overall_sentiment 'Bullish'"),
+])
+def test_malformed_entries_are_rejected(entry, problem):
+    assert problem in analysis_entry_problems(entry)
+
+
+def test_rejected_batched_entries_fall_back_to_single_requests(monkeypatch):
+    monkeypatch.setattr(gemini_utils, "_configure_gemini", lambda api_key, log: None)
+    # Keys come back in another case; PNB's entry is malformed and Canara Bank's is missing.
+    monkeypatch.setattr(gemini_utils, "_generate_json", lambda prompt, label, log: {
+        "sbi": _entry(), "PNB": _entry(overall_sentiment="Bullish")})
+    single_requests = []
+
+    def analyze_one(api_key, texts, name, *args, **kwargs):
+        single_requests.append(name)
+        return _entry(summary=f"Single {name}"), None
+    monkeypatch.setattr(gemini_utils, "analyze_news_with_gemini", analyze_one)
+
+    entity_articles = {name: ([f"{name} reported higher deposits this quarter."], []) for name in ("SBI", "PNB", "Canara Bank")}
+    outcomes = gemini_utils.analyze_entities_batch_with_gemini("test-key", entity_articles, "2024-05-01 to 2024-05-31",
+                                                              max_entities_per_call=3)
+    assert list(outcomes) == ["SBI", "PNB", "Canara Bank"]
+    assert outcomes["SBI"] == (_entry(), None, True)
+    assert single_requests == ["PNB", "Canara Bank"]
+    assert outcomes["PNB"] == (_entry(summary="Single PNB"), None, False)
@@ -0,0 +1,58 @@
+# tests/test_leadlag.py
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.leadlag import cross_correlations, daily_returns, rolling_correlation
+
+N_STOCKS, N_DAYS = 4, 250
+
+
+def _shifted_pair(rng, lead):
+    """Sentiment and returns where returns[t + lead] follows sentiment[t] (lead < 0: returns lead sentiment)."""
+    base = rng.normal(size=(N_STOCKS, N_DAYS + abs(lead)))
+    if lead >= 0:
+        sentiment, returns = base[:, lead:lead + N_DAYS], base[:, :N_DAYS]
+    else:
+        sentiment, returns = base[:, :N_DAYS], base[:, -lead:-lead + N_DAYS]
+    return sentiment.copy(), returns + rng.normal(scale=0.1, size=returns.shape)
+
+
+@pytest.mark.parametrize("lead", [2, -3])
+def test_cross_correlation_peaks_at_the_shift(lead):
+    sentiment, returns = _shifted_pair(np.random.default_rng(3), lead)
+    sentiment[:, ::7] = np.nan # Days without news
+    lags, correlations, observations = cross_correlations(sentiment, returns, max_lag=5)
+    assert (lags[np.argmax(correlations, axis=1)] == lead).all()
+    assert (correlations[:, lags == lead] > 0.95).all()
+    assert (observations <= N_DAYS).all()
+
+
+def test_cross_correlations_match_pandas():
+    rng = np.random.default_rng(11)
+    sentiment, returns = rng.normal(size=(2, N_DAYS)), rng.normal(size=(2, N_DAYS))
+    sentiment[rng.random(sentiment.shape) < 0.2] = np.nan
+    lags, correlations, _ = cross_correlations(sentiment, returns, max_lag=3)
+    for row in range(2):
+        for column, lag in enumerate(lags):
+            expected = pd.Series(sentiment[row]).corr(pd.Series(returns[row]).shift(-lag))
+            assert correlations[row, column] == pytest.approx(expected)
+
+
+@pytest.mark.parametrize("lag", [0, 1, 3])
+def test_rolling_correlation_matches_pandas(lag):
+    rng = np.random.default_rng(5)
+    window = 20
+    sentiment, returns = rng.normal(size=(2, N_DAYS)), rng.normal(size=(2, N_DAYS))
+    sentiment[rng.random(sentiment.shape) < 0.2] = np.nan
+    result = rolling_correlation(sentiment, returns, window, lag=lag)
+    assert np.isnan(result[:, :lag]).all()
+    for row in range(2):
+        expected = pd.Series(returns[row]).rolling(window, min_periods=window // 2).corr(pd.Series(sentiment[row]).shift(lag))
+        np.testing.assert_allclose(result[row], expected.to_numpy(), rtol=1e-7, atol=1e-9)
+
+
+def test_daily_returns_are_nan_around_missing_closes():
+    closes = np.array([[100.0, 110.0, np.nan, 121.0, 133.1]])
+    returns = daily_returns(closes)
+    np.testing.assert_allclose(returns, [[np.nan, 0.1, np.nan, np.nan, 0.1]])
@@ -0,0 +1,61 @@
+# tests/test_price_store.py
+from datetime import date, datetime, timedelta, timezone
+
+import pandas as pd
+import pytest
+
+from utils import price_store
+
+
+@pytest.fixture(autouse=True)
+def store_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(price_store, "PRICE_STORE_DIR", str(tmp_path))
+    return tmp_path
+
+
+def _bars(first_day, days, close=100.0):
+    index = pd.date_range(first_day, periods=days, freq="D", name="Date")
+    return pd.DataFrame({"Open": close, "High": close, "Low": close, "Close": close, "Volume": 1000.0}, index=index)
+
+
+def test_write_prices_merges_rows_and_widens_coverage():
+    price_store.write_prices("M&M", _bars("2024-05-10", 5), date(2024, 5, 10), date(2024, 5, 14), "M&M.NS")
+    stored = price_store.write_prices("M&M", _bars("2024-05-13", 5, close=120.0), date(2024, 5, 13), date(2024, 5, 20), "M&M.NS")
+    assert stored == 8
+
+    prices = price_store.read_prices("M&M")
+    assert prices.index.is_monotonic_increasing
+    assert prices.loc["2024-05-12", "Close"] == 100.0
+    assert prices.loc["2024-05-13", "Close"] == 120.0 # Newer rows win
+    coverage = price_store.stored_coverage("M&M")
+    assert (coverage['start'], coverage['end'], coverage['ticker']) == (date(2024, 5, 10), date(2024, 5, 20), "M&M.NS")
+
+
+def test_empty_download_still_records_the_requested_range():
+    price_store.write_prices("SBIN", _bars("2024-05-10", 3), date(2024, 5, 10), date(2024, 5, 12), "SBIN.NS")
+    price_store.write_prices("SBIN", pd.DataFrame(columns=price_store.PRICE_COLUMNS), date(2024, 5, 1), date(2024, 5, 9), "SBIN.NS")
+    assert len(price_store.read_prices("SBIN")) == 3
+    assert price_store.stored_coverage("SBIN")['start'] == date(2024, 5, 1)
+
+
+def test_missing_ranges_request_only_dates_outside_the_coverage():
+    price_store.write_prices("SBIN", _bars("2024-05-10", 5), date(2024, 5, 10), date(2024, 5, 20), "SBIN.NS")
+    missing = price_store._missing_ranges(["SBIN", "PNB"], date(2024, 5, 1), date(2024, 5, 31))
+    assert missing == {
+        (date(2024, 5, 1), date(2024, 5, 9)): ["SBIN"],
+        (date(2024, 5, 21), date(2024, 5, 31)): ["SBIN"],
+        (date(2024, 5, 1), date(2024, 5, 31)): ["PNB"],
+    }
+    assert price_store._missing_ranges(["SBIN"], date(2024, 5, 12), date(2024, 5, 18)) == {}
+
+
+def test_missing_ranges_throttle_only_the_open_latest_bar():
+    today = datetime.now(timezone.utc).date()
+    yesterday = today - timedelta(days=1)
+    price_store.write_prices("SBIN", _bars(yesterday - timedelta(days=4), 5), yesterday - timedelta(days=4), yesterday, "SBIN.NS")
+    # Just fetched: today's bar is not re-requested, and the range never runs past today.
+    assert price_store._missing_ranges(["SBIN"], yesterday - timedelta(days=4), today + timedelta(days=5)) == {}
+
+    price_store.write_prices("PNB", _bars(today - timedelta(days=10), 3), today - timedelta(days=10), today - timedelta(days=8), "PNB.NS")
+    assert price_store._missing_ranges(["PNB"], today - timedelta(days=10), today) == {
+        (today - timedelta(days=7), today): ["PNB"]}
@@ -0,0 +1,87 @@
+# tests/test_sentiment_aggregates.py
+from datetime import date, datetime
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from utils import db_crud
+from utils.database_models import Base, DailyEntitySentiment, ScrapedArticle
+from utils.sentiment_aggregates import (ArticleAggregateChanges, article_snapshot, get_entity_sentiment_summary,
+                                        rebuild_daily_entity_sentiment, record_new_articles)
+
+
+@pytest.fixture()
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+def _aggregate_rows(db):
+    return sorted(
+        (row.entity_type, row.entity_name, row.day, row.source, row.article_count, round(row.vader_sum, 9),
+         row.vader_count, row.vader_min, row.vader_max, round(row.llm_score_sum, 9), row.llm_score_count)
+        for row in db.query(DailyEntitySentiment).all())
+
+
+def _ingest(db, url, day, source, sector=None, stock=None, vader=None, cluster_of=None):
+    article = ScrapedArticle(url=url, publication_date=datetime.combine(day, datetime.min.time()).replace(hour=10),
+                             source_domain=source, related_sector=sector, related_stock=stock, vader_score=vader)
+    db.add(article)
+    db.flush()
+    article.cluster_id = cluster_of.id if cluster_of is not None else article.id
+    record_new_articles(db, [article])
+    db.commit()
+    return article
+
+
+def test_incremental_updates_match_a_full_rebuild(db):
+    day_one, day_two = date(2024, 5, 1), date(2024, 5, 2)
+    first = _ingest(db, "https://a.example/1", day_one, "a.example", sector="Nifty Bank", stock="SBI", vader=0.4)
+    second = _ingest(db, "https://b.example/2", day_one, "b.example", sector="Nifty Bank", vader=-0.2)
+    third = _ingest(db, "https://a.example/3", day_two, "a.example", stock="PNB")
+    _ingest(db, "https://c.example/1-copy", day_one, "c.example", sector="Nifty Bank", stock="SBI", vader=0.9, cluster_of=first)
+
+    db_crud.bulk_update_article_sentiment_scores(db, [
+        (first.id, {'vader_score': 0.1}), # Replaced score -> cell rebuilt
+        (second.id, {'llm_sentiment_score': 0.5, 'related_stock': "SBI"}), # New score and a newly tagged entity
+        (third.id, {'vader_score': -0.6, 'llm_sentiment_score': -0.3}), # First scores only
+    ])
+    db_crud.update_article_sentiment_scores(db, "https://b.example/2", vader_score=0.3)
+    db.expire_all()
+    incremental = _aggregate_rows(db)
+
+    rebuild_daily_entity_sentiment(db)
+    assert incremental == _aggregate_rows(db)
+
+
+def test_near_duplicate_copies_count_once(db):
+    day = date(2024, 5, 1)
+    original = _ingest(db, "https://a.example/story", day, "a.example", stock="SBI", vader=0.5)
+    _ingest(db, "https://b.example/story-copy", day, "b.example", stock="SBI", vader=0.5, cluster_of=original)
+    _ingest(db, "https://c.example/other", day, "c.example", stock="SBI", vader=-0.5)
+
+    summary = get_entity_sentiment_summary(db, "stock", "SBI", day, day)
+    assert summary['article_count'] == 2
+    assert summary['avg_vader_score'] == pytest.approx(0.0)
+
+    rebuild_daily_entity_sentiment(db)
+    assert get_entity_sentiment_summary(db, "stock", "SBI", day, day) == summary
+
+
+def test_cluster_reassignment_moves_the_copy_out_of_the_aggregates(db):
+    day = date(2024, 5, 1)
+    original = _ingest(db, "https://a.example/story", day, "a.example", stock="SBI", vader=0.5)
+    late_copy = _ingest(db, "https://b.example/story", day, "b.example", stock="SBI", vader=0.7)
+    assert get_entity_sentiment_summary(db, "stock", "SBI", day, day)['article_count'] == 2
+
+    changes = ArticleAggregateChanges() # As backfill_clusters does when it finds a copy
+    before = article_snapshot(late_copy)
+    late_copy.cluster_id = original.id
+    changes.add(before, article_snapshot(late_copy))
+    changes.apply(db)
+    db.commit()
+    assert get_entity_sentiment_summary(db, "stock", "SBI", day, day)['article_count'] == 1
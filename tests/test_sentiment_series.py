@@ -0,0 +1,55 @@
+# tests/test_sentiment_series.py
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.sentiment_series import compute_sentiment_series
+
+START, N_DAYS, N_ENTITIES = date(2015, 1, 1), 3500, 3 # Long enough for _ema() to cross a block boundary
+ROLLING_WINDOW, EMA_SPAN, Z_WINDOW = 7, 10, 30
+
+
+@pytest.fixture(scope="module")
+def frames():
+    """Sparse per-(entity, day) aggregates, the series computed from them, and the same data as dense pandas frames."""
+    rng = np.random.default_rng(42)
+    present = rng.random((N_ENTITIES, N_DAYS)) < 0.6
+    entity_index, day_offsets = np.nonzero(present)
+    score_counts = rng.integers(1, 6, size=len(entity_index)).astype(np.float64)
+    score_sums = score_counts * rng.uniform(-1.0, 1.0, size=len(entity_index))
+    days = np.datetime64(START, "D") + day_offsets
+    series = compute_sentiment_series(entity_index, days, score_sums, score_counts, score_counts + 1, N_ENTITIES,
+                                      START, START + timedelta(days=N_DAYS - 1), rolling_window=ROLLING_WINDOW,
+                                      ema_span=EMA_SPAN, z_window=Z_WINDOW)
+    sums, counts = np.zeros((N_ENTITIES, N_DAYS)), np.zeros((N_ENTITIES, N_DAYS))
+    sums[entity_index, day_offsets], counts[entity_index, day_offsets] = score_sums, score_counts
+    return series, pd.DataFrame(sums.T), pd.DataFrame(counts.T) # Pandas frames are days x entities
+
+
+def _check(actual, expected):
+    np.testing.assert_allclose(actual, expected.to_numpy().T, rtol=1e-9, atol=1e-9)
+
+
+def test_daily_and_rolling_means_match_pandas(frames):
+    series, sums, counts = frames
+    _check(series['mean'], (sums / counts).where(counts > 0))
+    rolling_counts = counts.rolling(ROLLING_WINDOW, min_periods=1).sum()
+    _check(series['rolling_mean'], (sums.rolling(ROLLING_WINDOW, min_periods=1).sum() / rolling_counts).where(rolling_counts > 0))
+
+
+def test_count_weighted_ema_matches_pandas(frames):
+    series, sums, counts = frames
+    alpha = 2.0 / (EMA_SPAN + 1.0)
+    # With adjust=True both EMAs share the same normalising weights, so their ratio is the count-weighted EMA.
+    ema_counts = counts.ewm(alpha=alpha, adjust=True).mean()
+    _check(series['ema'], (sums.ewm(alpha=alpha, adjust=True).mean() / ema_counts).where(ema_counts > 0))
+
+
+def test_zscore_matches_pandas(frames):
+    series, sums, counts = frames
+    daily_mean = (sums / counts).where(counts > 0)
+    prior = daily_mean.shift(1).rolling(Z_WINDOW, min_periods=2)
+    expected = (daily_mean - prior.mean()) / prior.std(ddof=0)
+    np.testing.assert_allclose(series['zscore'], expected.to_numpy().T, rtol=1e-6, atol=1e-6)
@@ -0,0 +1,144 @@
+# tests/test_sitemap_discovery.py
+import threading
+from datetime import date, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from utils.newsfetch_lib import sitemap_discovery
+from utils.newsfetch_lib.sitemap_discovery import SitemapFeedDiscovery
+
+DOMAIN = "news.example.com"
+DOCUMENTS = {} # Path -> XML served by the fixture server
+
+
+class _FixtureHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = DOCUMENTS.get(self.path)
+        self.send_response(200 if body is not None else 404)
+        self.send_header("Content-Type", "application/xml")
+        self.end_headers()
+        if body is not None:
+            self.wfile.write(body.encode())
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def server_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _FixtureHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+
+@pytest.fixture(autouse=True)
+def documents():
+    DOCUMENTS.clear()
+    yield DOCUMENTS
+    DOCUMENTS.clear()
+
+
+def _urlset(items):
+    """items: [(slug, title, published datetime)] as a Google News sitemap."""
+    urls = "".join(
+        f"<url><loc>https://{DOMAIN}/{slug}</loc><news:news><news:publication_date>{published.isoformat()}Z"
+        f"</news:publication_date><news:title>{title}</news:title></news:news></url>" for slug, title, published in items)
+    return ('<?xml version="1.0" encoding="UTF-8"?><urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9" '
+            f'xmlns:news="http://www.google.com/schemas/sitemap-news/0.9">{urls}</urlset>')
+
+
+def _rss(items):
+    entries = "".join(f"<item><title>{title}</title><link>https://{DOMAIN}/{slug}</link>"
+                      f"<pubDate>{published:%a, %d %b %Y %H:%M:%S} +0530</pubDate></item>" for slug, title, published in items)
+    return f'<?xml version="1.0"?><rss version="2.0"><channel><title>Markets</title>{entries}</channel></rss>'
+
+
+def _index(children):
+    """children: [(path URL, lastmod datetime)]."""
+    sitemaps = "".join(f"<sitemap><loc>{loc}</loc><lastmod>{lastmod.isoformat()}Z</lastmod></sitemap>"
+                       for loc, lastmod in children)
+    return f'<?xml version="1.0"?><sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{sitemaps}</sitemapindex>'
+
+
+def _match_sbi(text, url):
+    return [{'item_type': "stock", 'item_name': "SBI"}] if "SBI" in text else []
+
+
+def _discover(sources, start, end, watermarks=None, incremental=True):
+    discovery = SitemapFeedDiscovery(DOMAIN, start, end, sources=sources, watermarks=watermarks,
+                                     keyword_matcher=_match_sbi, incremental=incremental)
+    return discovery, {candidate['url'].rsplit('/', 1)[-1] for candidate in discovery.discover()}
+
+
+def _daily_items(first_day, days):
+    return [(f"sbi-{day:%m%d}", f"SBI update {day:%d %b}", datetime.combine(day, datetime.min.time()).replace(hour=9))
+            for day in (first_day + timedelta(days=n) for n in range(days))]
+
+
+def test_urlset_and_rss_items_are_filtered_by_date_and_entity(server_url, documents):
+    documents["/news.xml"] = _urlset([
+        ("sbi-in", "SBI profit rises", datetime(2024, 5, 10, 8)),
+        ("sbi-late", "SBI cuts rates", datetime(2024, 6, 2, 8)),
+        ("monsoon", "Monsoon arrives early", datetime(2024, 5, 11, 8)),
+    ])
+    documents["/feed.rss"] = _rss([("sbi-feed", "SBI raises deposits", datetime(2024, 5, 12, 18)),
+                                   ("sbi-old", "SBI old news", datetime(2024, 4, 2, 18))])
+    discovery, found = _discover([f"{server_url}/news.xml", f"{server_url}/feed.rss"], date(2024, 5, 1), date(2024, 5, 31))
+    assert found == {"sbi-in", "sbi-feed"}
+    assert discovery.stats['items_out_of_range'] == 2
+    assert discovery.stats['items_unmatched'] == 1
+
+
+def test_backfill_through_a_daily_archive_index_reaches_the_requested_days(server_url, documents, monkeypatch):
+    monkeypatch.setattr(sitemap_discovery, "MAX_CHILD_SITEMAPS_PER_SOURCE", 5)
+    children = []
+    for day in (date(2024, 5, 1) + timedelta(days=n) for n in range(120)):
+        documents[f"/archive/{day}.xml"] = _urlset(_daily_items(day, 1))
+        children.append((f"{server_url}/archive/{day}.xml", datetime.combine(day + timedelta(days=1), datetime.min.time())))
+    documents["/index.xml"] = _index(children)
+    _, found = _discover([f"{server_url}/index.xml"], date(2024, 5, 2), date(2024, 5, 4))
+    assert found == {"sbi-0502", "sbi-0503", "sbi-0504"}
+
+
+def test_watermark_skips_scanned_items_and_backfills_before_the_scanned_range(server_url, documents):
+    source = f"{server_url}/news.xml"
+    documents["/news.xml"] = _urlset(_daily_items(date(2024, 5, 1), 31))
+    first, found = _discover([source], date(2024, 5, 20), date(2024, 5, 31))
+    assert len(found) == 12
+    assert first.watermarks[source] == (datetime(2024, 5, 20), datetime(2024, 5, 31, 9))
+
+    documents["/news.xml"] = _urlset(_daily_items(date(2024, 5, 1), 41))
+    resumed, found = _discover([source], date(2024, 5, 25), date(2024, 6, 10), watermarks=first.watermarks)
+    assert found == {f"sbi-06{day:02d}" for day in range(1, 11)}
+    assert resumed.watermarks[source] == (datetime(2024, 5, 20), datetime(2024, 6, 10, 9))
+
+    # Starts before the stored range: May 1-19 were never scanned, so the whole range is.
+    widened, found = _discover([source], date(2024, 5, 1), date(2024, 6, 10), watermarks=first.watermarks)
+    assert len(found) == 41
+    assert widened.watermarks[source] == (datetime(2024, 5, 1), datetime(2024, 6, 10, 9))
+
+    # A backfill inside the stored range is scanned in full and leaves the range as it was.
+    backfill, found = _discover([source], date(2024, 5, 21), date(2024, 5, 22), watermarks=first.watermarks)
+    assert found == {"sbi-0521", "sbi-0522"}
+    assert backfill.watermarks[source] == first.watermarks[source]
+
+
+def test_failed_candidates_are_offered_again(server_url, documents):
+    source = f"{server_url}/news.xml"
+    documents["/news.xml"] = _urlset(_daily_items(date(2024, 5, 1), 10))
+    discovery, _ = _discover([source], date(2024, 5, 1), date(2024, 5, 10))
+    watermarks = discovery.advance_watermarks({f"https://{DOMAIN}/sbi-0507", f"https://{DOMAIN}/sbi-0509"})
+    assert watermarks[source][1] < datetime(2024, 5, 7, 9)
+
+    _, found = _discover([source], date(2024, 5, 5), date(2024, 5, 10), watermarks=watermarks)
+    assert found == {"sbi-0507", "sbi-0508", "sbi-0509", "sbi-0510"}
+
+
+def test_unreachable_source_keeps_its_stored_range(server_url):
+    source = f"{server_url}/missing.xml"
+    stored = {source: (datetime(2024, 5, 1), datetime(2024, 5, 10, 9))}
+    discovery, found = _discover([source], date(2024, 5, 5), date(2024, 5, 20), watermarks=stored)
+    assert not found
+    assert discovery.watermarks == {}
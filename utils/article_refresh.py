@@ -0,0 +1,103 @@
+# utils/article_refresh.py
+import logging
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy.orm import Session
+
+from .database_models import ScrapedArticle
+from .near_duplicates import assign_clusters
+from .sentiment_aggregates import ArticleAggregateChanges, article_snapshot
+from .newsfetch_lib.http_client import compute_content_hash, fetch_conditional
+from .newsfetch_lib.news import Newspaper
+from .newsfetch_lib.news_please_handler import NewsPleaseHandler
+from .sentiment_analyzer import get_vader_sentiment_score
+
+logger = logging.getLogger(__name__)
+
+REFRESH_COMMIT_BATCH_SIZE = 50
+
+
+def main_text_hash(url, html):
+    """
+    content_hash of a page from one news-please main-text extraction (no newspaper4k parse, no .nlp()).
+    Newspaper.article prefers the same text, so this matches the hash stored at ingest whenever
+    news-please found the article body; None when it found nothing.
+    """
+    return compute_content_hash(NewsPleaseHandler(url, html=html).article)
+
+
+def refresh_recent_articles(db: Session, days: int = 2, limit: int = None):
+    """
+    Re-checks recently scraped articles (live blogs, results coverage) for changes.
+
+    Each page is requested with If-None-Match / If-Modified-Since. A 304 only touches
+    last_checked_date. For a 200, only the main text is extracted first (main_text_hash); if
+    it hashes to the stored content_hash (only ads, timestamps etc. changed), the full
+    Newspaper extraction, VADER, clustering and tagging are all skipped. Changed articles are
+    fully re-extracted and get the new text and a fresh VADER score; related_sector/
+    related_stock are kept.
+    Returns a dict of counters.
+    """
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    since = now - timedelta(days=days)
+    stats = {'checked': 0, 'not_modified': 0, 'unchanged_hash': 0, 'updated': 0, 'failed': 0}
+
+    query = db.query(
+        ScrapedArticle.id, ScrapedArticle.url, ScrapedArticle.http_etag,
+        ScrapedArticle.http_last_modified, ScrapedArticle.content_hash
+    ).filter(ScrapedArticle.download_date >= since).order_by(ScrapedArticle.download_date.desc())
+    if limit:
+        query = query.limit(limit)
+    candidates = query.all()
+    logger.info(f"[Refresh] {len(candidates)} articles downloaded since {since:%Y-%m-%d %H:%M} to re-check.")
+
+    pending, aggregate_changes = 0, ArticleAggregateChanges()
+    for article_id, url, etag, last_modified, stored_hash in candidates:
+        stats['checked'] += 1
+        response = fetch_conditional(url, etag=etag, last_modified=last_modified)
+        if response is None:
+            stats['failed'] += 1
+            continue
+
+        article = db.get(ScrapedArticle, article_id)
+        article.last_checked_date = now
+        if response.status_code == 304:
+            stats['not_modified'] += 1
+        else:
+            article.http_etag = response.headers.get("ETag") or article.http_etag
+            article.http_last_modified = response.headers.get("Last-Modified") or article.http_last_modified
+            news_article_obj = None
+            new_hash = main_text_hash(url, response.text)
+            if not (stored_hash and new_hash == stored_hash): # Changed (or news-please found no body): full extraction
+                try:
+                    news_article_obj = Newspaper(url=url, html=response.text)
+                except ValueError as ve_nf:
+                    logger.warning(f"[Refresh] Re-extraction failed for {url}: {ve_nf}")
+                    stats['failed'] += 1
+                    continue
+                new_hash = news_article_obj.content_hash
+            if stored_hash and new_hash == stored_hash:
+                stats['unchanged_hash'] += 1
+            else:
+                before = article_snapshot(article)
+                if news_article_obj.article:
+                    article.article_text = news_article_obj.article
+                    article.vader_score = get_vader_sentiment_score(news_article_obj.article)
+                    assign_clusters(db, [article]) # Re-sign; the article keeps its cluster
+                article.headline = news_article_obj.headline or article.headline
+                article.summary_generated = news_article_obj.summary or article.summary_generated
+                article.content_hash = new_hash or article.content_hash
+                aggregate_changes.add(before, article_snapshot(article)) # New VADER score -> daily_entity_sentiment
+                stats['updated'] += 1
+                logger.info(f"[Refresh] Content changed, re-extracted: {url}")
+
+        pending += 1
+        if pending >= REFRESH_COMMIT_BATCH_SIZE:
+            aggregate_changes.apply(db)
+            db.commit()
+            pending = 0
+
+    aggregate_changes.apply(db)
+    db.commit()
+    logger.info(f"[Refresh] Done. {stats}")
+    return stats
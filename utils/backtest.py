@@ -0,0 +1,247 @@
+# utils/backtest.py
+"""
+Sentiment-driven daily long/short backtest across every stock in NIFTY_SECTORS_QUERY_CONFIG.
+
+All stocks are simulated at once as (n_stocks x n_trading_days) NumPy matrices: signal ->
+position -> weights -> PnL, with transaction costs charged on turnover.
+
+Lookahead safety: sentiment is bucketed by UTC publication day and NSE closes at 10:00 UTC,
+so a day's news is not complete until after that day's close. The position held from the
+close of trading day t to the close of t+1 only uses sentiment dated strictly before t's date.
+Prices come from the local price store (utils/price_store.py), never from the network.
+"""
+import argparse
+import json
+import logging
+from datetime import date, timedelta
+
+import numpy as np
+
+from .gemini_utils import NIFTY_SECTORS_QUERY_CONFIG
+from .price_store import ensure_prices, load_close_matrix, nse_symbol
+from .sentiment_series import load_daily_matrices, trailing_mean
+
+logger = logging.getLogger(__name__)
+
+TRADING_DAYS_PER_YEAR = 252
+MAX_LOOKBACK_DAYS = 60 # Sentiment history loaded before start_date, bounds params['lookback_days']
+DEFAULT_PARAMS = {
+    'score': 'blend', # 'vader', 'llm' or 'blend'
+    'llm_weight': 0.5, # Share of the LLM score in 'blend' (falls back to whichever score exists)
+    'lookback_days': 3, # Calendar days of news averaged (count-weighted) into the signal
+    'threshold_positive': 0.05, # Same defaults as sentiment_analyzer.get_sentiment_label_from_score
+    'threshold_negative': -0.05,
+    'min_articles': 1, # Scored articles needed in the lookback for a non-zero signal
+    'holding_days': 1, # Each day's signal is held this many trading days (overlapping sleeves)
+    'long_only': False,
+    'cost_bps': 10.0, # Charged per unit of one-way turnover (brokerage + STT + slippage)
+}
+
+
+class BacktestData:
+    """Aligned NumPy inputs for run_backtest(). Holds no DB handles or DataFrames, so it can be shared with worker processes."""
+
+    ARRAY_FIELDS = ('trade_day_index', 'closes', 'vader_sums', 'vader_counts', 'llm_sums', 'llm_counts')
+
+    def __init__(self, symbols, names, calendar_start, trade_dates, trade_day_index, closes,
+                 vader_sums, vader_counts, llm_sums, llm_counts):
+        self.symbols = list(symbols) # One row per NSE symbol
+        self.names = list(names) # Configured stock name(s) per symbol, e.g. "ITC / ITC Ltd"
+        self.calendar_start = calendar_start # Day 0 of the sentiment matrices
+        self.trade_dates = trade_dates # datetime64[D], trading days in the price store
+        self.trade_day_index = trade_day_index # Calendar column of each trading day
+        self.closes = closes # (n_symbols, n_trade_days), NaN where no close
+        self.vader_sums, self.vader_counts = vader_sums, vader_counts # (n_symbols, n_calendar_days)
+        self.llm_sums, self.llm_counts = llm_sums, llm_counts
+
+
+def stock_universe(sectors=None):
+    """Configured stock names (first occurrence order), optionally only those of `sectors`."""
+    names = []
+    for sector_name, details in NIFTY_SECTORS_QUERY_CONFIG.items():
+        if sectors and sector_name not in sectors:
+            continue
+        names.extend(details.get("stocks", {}).keys())
+    return list(dict.fromkeys(names))
+
+
+def load_backtest_data(db, start_date, end_date, stocks=None, sectors=None):
+    """Prices from the local store and daily stock sentiment from daily_entity_sentiment, aligned for run_backtest()."""
+    names = list(dict.fromkeys(stocks or stock_universe(sectors)))
+    names_by_symbol = {}
+    for name in names: # Several configured names can share a symbol (e.g. "ITC" / "ITC Ltd")
+        names_by_symbol.setdefault(nse_symbol(name), []).append(name)
+    symbols = list(names_by_symbol)
+
+    trade_dates, closes = load_close_matrix(symbols, start_date, end_date)
+    has_prices = np.isfinite(closes).any(axis=1) if closes.size else np.zeros(len(symbols), dtype=bool)
+    missing = [symbol for symbol, ok in zip(symbols, has_prices) if not ok]
+    if missing:
+        logger.warning(f"[Backtest] No stored prices for {len(missing)} symbols (skipped): {', '.join(missing[:20])}"
+                       f"{' ...' if len(missing) > 20 else ''}")
+    symbols = [symbol for symbol, ok in zip(symbols, has_prices) if ok]
+    closes = closes[has_prices] if closes.size else np.zeros((0, len(trade_dates)))
+
+    calendar_start = start_date - timedelta(days=MAX_LOOKBACK_DAYS + 1)
+    entities = [("stock", name) for symbol in symbols for name in names_by_symbol[symbol]]
+    row_of_entity = np.array([row for row, symbol in enumerate(symbols) for _ in names_by_symbol[symbol]], dtype=np.int64)
+    n_calendar_days = (end_date - calendar_start).days + 1
+    matrices = {score: (np.zeros((0, n_calendar_days)), np.zeros((0, n_calendar_days))) for score in ('vader', 'llm')}
+    for score in (('vader', 'llm') if symbols else ()):
+        _, sums, counts, _ = load_daily_matrices(db, entities, calendar_start, end_date, score=score)
+        symbol_sums = np.zeros((len(symbols), sums.shape[1]))
+        symbol_counts = np.zeros_like(symbol_sums)
+        np.add.at(symbol_sums, row_of_entity, sums) # Merge names that map to the same symbol
+        np.add.at(symbol_counts, row_of_entity, counts)
+        matrices[score] = (symbol_sums, symbol_counts)
+
+    trade_day_index = (trade_dates - np.datetime64(calendar_start, "D")).astype(np.int64)
+    logger.info(f"[Backtest] Loaded {len(symbols)} symbols x {len(trade_dates)} trading days ({start_date} to {end_date}).")
+    return BacktestData(symbols, [" / ".join(names_by_symbol[symbol]) for symbol in symbols], calendar_start,
+                        trade_dates, trade_day_index, closes, *matrices['vader'], *matrices['llm'])
+
+
+def _rolling_sum(values, window):
+    """Sum of the last `window` columns (including the current one) along axis 1; shorter at the start."""
+    cumulative = np.cumsum(np.pad(values, ((0, 0), (window, 0))), axis=1)
+    return cumulative[:, window:] - cumulative[:, :-window]
+
+
+def sentiment_scores(data, params):
+    """(score, scored_article_count) matrices on the calendar axis, each over the trailing lookback window."""
+    lookback = params['lookback_days']
+    vader_mean = trailing_mean(data.vader_sums, data.vader_counts, lookback)
+    llm_mean = trailing_mean(data.llm_sums, data.llm_counts, lookback)
+    vader_n = _rolling_sum(data.vader_counts, lookback)
+    llm_n = _rolling_sum(data.llm_counts, lookback)
+    if params['score'] == 'vader':
+        return vader_mean, vader_n
+    if params['score'] == 'llm':
+        return llm_mean, llm_n
+    weight = params['llm_weight']
+    blended = np.where(np.isnan(llm_mean), vader_mean,
+                       np.where(np.isnan(vader_mean), llm_mean, (1.0 - weight) * vader_mean + weight * llm_mean))
+    return blended, np.maximum(vader_n, llm_n)
+
+
+def _max_drawdown(equity):
+    if equity.size == 0:
+        return 0.0
+    return float(np.min(equity / np.maximum.accumulate(equity) - 1.0))
+
+
+def run_backtest(data, keep_matrices=False, **params):
+    """Simulates `params` (DEFAULT_PARAMS overrides) on `data`; returns metrics, the daily return/equity curve and per-stock PnL."""
+    params = dict(DEFAULT_PARAMS, **params)
+    if not 1 <= params['lookback_days'] <= MAX_LOOKBACK_DAYS:
+        raise ValueError(f"lookback_days must be between 1 and {MAX_LOOKBACK_DAYS}.")
+    if params['holding_days'] < 1:
+        raise ValueError("holding_days must be at least 1.")
+    n_symbols, n_days = data.closes.shape
+    if n_symbols == 0 or n_days < 2:
+        return {'params': params, 'metrics': summarize_returns(np.zeros(0), np.zeros(0), np.zeros(0)),
+                'dates': [], 'returns': [], 'equity': [], 'stock_pnl': {}}
+
+    score, scored_articles = sentiment_scores(data, params)
+    known_day = data.trade_day_index - 1 # Last calendar day fully known at trading day t's close
+    score_t, articles_t = score[:, known_day], scored_articles[:, known_day]
+    active = (articles_t >= params['min_articles']) & np.isfinite(score_t)
+    signal = np.where(active, (score_t > params['threshold_positive']).astype(np.float64)
+                      - (score_t < params['threshold_negative']).astype(np.float64), 0.0)
+    if params['long_only']:
+        signal = np.maximum(signal, 0.0)
+
+    holding = params['holding_days']
+    position = _rolling_sum(signal, holding) / holding # Overlapping sleeves
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        next_returns = data.closes[:, 1:] / data.closes[:, :-1] - 1.0 # Close t -> close t+1
+    position = position[:, :-1] # The last day has no next-day return
+    position = np.where(np.isfinite(next_returns), position, 0.0) # Untradeable without both closes
+    next_returns = np.nan_to_num(next_returns, nan=0.0, posinf=0.0, neginf=0.0)
+
+    gross = np.abs(position).sum(axis=0)
+    weights = np.divide(position, gross, out=np.zeros_like(position), where=gross > 0) # Fully invested in active names
+    turnover = np.abs(np.diff(weights, axis=1, prepend=0.0)).sum(axis=0)
+    stock_pnl = weights * next_returns
+    costs = turnover * params['cost_bps'] / 10000.0
+    returns = stock_pnl.sum(axis=0) - costs
+
+    result = {
+        'params': params,
+        'metrics': summarize_returns(returns, turnover, gross > 0),
+        'dates': np.datetime_as_string(data.trade_dates[1:], unit="D").tolist(), # Day each return is realised
+        'returns': returns,
+        'equity': np.cumprod(1.0 + returns),
+        'stock_pnl': dict(zip(data.symbols, stock_pnl.sum(axis=1).tolist())),
+    }
+    if keep_matrices:
+        result['matrices'] = {'signal': signal, 'weights': weights, 'stock_pnl': stock_pnl}
+    return result
+
+
+def summarize_returns(returns, turnover, invested):
+    """Headline statistics for a daily portfolio return series."""
+    n_days = len(returns)
+    if n_days == 0:
+        return {'days': 0, 'total_return': 0.0, 'cagr': 0.0, 'ann_volatility': 0.0, 'sharpe': 0.0,
+                'max_drawdown': 0.0, 'hit_rate': None, 'avg_daily_turnover': 0.0, 'invested_fraction': 0.0}
+    equity = np.cumprod(1.0 + returns)
+    volatility = float(np.std(returns, ddof=1)) if n_days > 1 else 0.0
+    invested_returns = returns[invested]
+    return {
+        'days': n_days,
+        'total_return': float(equity[-1] - 1.0),
+        'cagr': float(equity[-1] ** (TRADING_DAYS_PER_YEAR / n_days) - 1.0) if equity[-1] > 0 else -1.0,
+        'ann_volatility': volatility * np.sqrt(TRADING_DAYS_PER_YEAR),
+        'sharpe': float(np.mean(returns) / volatility * np.sqrt(TRADING_DAYS_PER_YEAR)) if volatility > 0 else 0.0,
+        'max_drawdown': _max_drawdown(equity),
+        'hit_rate': float(np.mean(invested_returns > 0)) if invested_returns.size else None,
+        'avg_daily_turnover': float(np.mean(turnover)),
+        'invested_fraction': float(np.mean(invested)),
+    }
+
+
+def _parse_param(text):
+    key, _, value = text.partition("=")
+    if key not in DEFAULT_PARAMS:
+        raise argparse.ArgumentTypeError(f"Unknown parameter '{key}'. Known: {', '.join(DEFAULT_PARAMS)}")
+    default = DEFAULT_PARAMS[key]
+    if isinstance(default, bool):
+        return key, value.lower() in ("1", "true", "yes")
+    return key, type(default)(value)
+
+
+if __name__ == "__main__":
+    import time
+
+    from .database_models import SessionLocal, create_db_and_tables
+
+    parser = argparse.ArgumentParser(description="Sentiment backtest over NIFTY_SECTORS_QUERY_CONFIG stocks.")
+    parser.add_argument("--start-date", type=date.fromisoformat, required=True)
+    parser.add_argument("--end-date", type=date.fromisoformat, default=date.today())
+    parser.add_argument("--sectors", nargs="*", help="Limit the universe to these sectors (default: all).")
+    parser.add_argument("--download-prices", action="store_true", help="Top up missing dates in the local price store from yfinance first.")
+    parser.add_argument("--param", action="append", type=_parse_param, default=[], help="Override, e.g. --param holding_days=5")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    if args.download_prices:
+        ensure_prices([nse_symbol(name) for name in stock_universe(args.sectors)], args.start_date, args.end_date,
+                      offline=False)
+    create_db_and_tables()
+    session = SessionLocal()
+    try:
+        started = time.perf_counter()
+        backtest_data = load_backtest_data(session, args.start_date, args.end_date, sectors=args.sectors)
+        loaded = time.perf_counter()
+        outcome = run_backtest(backtest_data, **dict(args.param))
+        finished = time.perf_counter()
+    finally:
+        session.close()
+    top = sorted(outcome['stock_pnl'].items(), key=lambda item: item[1], reverse=True)
+    print(json.dumps({
+        'params': outcome['params'], 'metrics': outcome['metrics'],
+        'best_stocks': top[:5], 'worst_stocks': top[-5:][::-1],
+        'load_seconds': round(loaded - started, 3), 'simulate_seconds': round(finished - loaded, 4),
+    }, indent=2))
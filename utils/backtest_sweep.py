@@ -0,0 +1,248 @@
+# utils/backtest_sweep.py
+"""
+Parameter sweeps for utils/backtest.py over a process pool.
+
+The sentiment and price matrices are loaded once, copied into named shared-memory blocks
+and attached (zero-copy) by every worker at start-up; tasks only carry a small params dict
+and return the metrics dict. Sweeps are either a full grid or an optuna study (optional
+dependency) whose trials are asked in pool-sized batches. Every evaluated configuration is
+stored in the backtest_results table and the best ones are reported.
+"""
+import argparse
+import hashlib
+import itertools
+import json
+import logging
+import math
+import multiprocessing
+import os
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from .backtest import DEFAULT_PARAMS, MAX_LOOKBACK_DAYS, BacktestData, run_backtest
+
+logger = logging.getLogger(__name__)
+
+SWEEP_WORKERS = int(os.environ.get("SWEEP_WORKERS", max(1, (os.cpu_count() or 2) - 1)))
+SWEEP_START_METHOD = os.environ.get("SWEEP_START_METHOD", "spawn") # Workers never inherit the parent's DB/log threads
+OBJECTIVES = ('sharpe', 'total_return', 'cagr', 'max_drawdown', 'hit_rate') # All "higher is better"
+DEFAULT_GRID = {
+    'score': ['vader', 'blend'],
+    'lookback_days': [1, 3, 7],
+    'threshold_positive': [0.05, 0.1, 0.2],
+    'threshold_negative': [-0.05, -0.1, -0.2],
+    'holding_days': [1, 3, 5],
+}
+# name -> (kind, *bounds) for optuna trial.suggest_*
+OPTUNA_SEARCH_SPACE = {
+    'score': ('categorical', ['vader', 'llm', 'blend']),
+    'llm_weight': ('float', 0.0, 1.0),
+    'lookback_days': ('int', 1, 30),
+    'threshold_positive': ('float', 0.0, 0.5),
+    'threshold_negative': ('float', -0.5, 0.0),
+    'min_articles': ('int', 1, 5),
+    'holding_days': ('int', 1, 20),
+}
+_SHARED_FIELDS = BacktestData.ARRAY_FIELDS + ('trade_dates',)
+
+
+class SharedBacktestData:
+    """Parent side: copies a BacktestData's arrays into shared memory. Use as a context manager (unlinks on exit)."""
+
+    def __init__(self, data):
+        self.blocks, self.specs = [], {}
+        try:
+            for field in _SHARED_FIELDS:
+                array = np.ascontiguousarray(getattr(data, field))
+                block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+                self.blocks.append(block)
+                np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+                self.specs[field] = (block.name, array.shape, array.dtype.str)
+        except Exception:
+            self.close()
+            raise
+        self.meta = {'symbols': data.symbols, 'names': data.names, 'calendar_start': data.calendar_start}
+
+    def close(self):
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _attach_block(name):
+    try:
+        return shared_memory.SharedMemory(name=name, track=False) # Python 3.13+
+    except TypeError:
+        # Older Pythons register the attach with the resource tracker, but pool workers share the parent's
+        # tracker, where the block is already registered. Unregistering here would drop the parent's entry.
+        return shared_memory.SharedMemory(name=name)
+
+
+def attach_backtest_data(specs, meta):
+    """Worker side: BacktestData whose arrays are views on the parent's shared memory (plus the blocks to keep alive)."""
+    blocks, arrays = [], {}
+    for field, (name, shape, dtype) in specs.items():
+        block = _attach_block(name)
+        blocks.append(block)
+        arrays[field] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+    return BacktestData(meta['symbols'], meta['names'], meta['calendar_start'], **arrays), blocks
+
+
+_worker_data = None
+_worker_blocks = []
+
+
+def _init_worker(specs, meta):
+    global _worker_data, _worker_blocks
+    _worker_data, _worker_blocks = attach_backtest_data(specs, meta)
+
+
+def _evaluate(params):
+    try:
+        return params, run_backtest(_worker_data, **params)['metrics'], None
+    except Exception as e: # One bad configuration must not kill the sweep
+        return params, None, str(e)
+
+
+def parameter_grid(grid):
+    """Every combination of the value lists in `grid` ({name: [values]}), as params dicts."""
+    keys = list(grid)
+    for values in itertools.product(*(grid[key] for key in keys)):
+        yield dict(zip(keys, values))
+
+
+def _objective_value(metrics, objective):
+    value = metrics.get(objective) if metrics else None
+    return float(value) if value is not None and math.isfinite(value) else None
+
+
+def _make_pool(shared, workers):
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(SWEEP_START_METHOD),
+                               initializer=_init_worker, initargs=(shared.specs, shared.meta))
+
+
+def run_grid_sweep(data, grid=None, base_params=None, workers=SWEEP_WORKERS):
+    """Evaluates every grid configuration in parallel; returns [(params, metrics or None, error or None)]."""
+    configs = [dict(base_params or {}, **params) for params in parameter_grid(grid or DEFAULT_GRID)]
+    logger.info(f"[Sweep] Grid sweep: {len(configs)} configurations on {workers} workers.")
+    with SharedBacktestData(data) as shared, _make_pool(shared, workers) as pool:
+        chunksize = max(1, len(configs) // (workers * 4))
+        return list(pool.map(_evaluate, configs, chunksize=chunksize))
+
+
+def _suggest(trial, search_space):
+    params = {}
+    for name, (kind, *bounds) in search_space.items():
+        if kind == 'categorical':
+            params[name] = trial.suggest_categorical(name, bounds[0])
+        elif kind == 'int':
+            params[name] = trial.suggest_int(name, *bounds)
+        else:
+            params[name] = trial.suggest_float(name, *bounds)
+    return params
+
+
+def run_optuna_sweep(data, n_trials, objective="sharpe", search_space=None, base_params=None,
+                     workers=SWEEP_WORKERS, seed=None):
+    """TPE search maximising `objective`; each batch of `workers` trials is evaluated in parallel."""
+    try:
+        import optuna
+    except ImportError as e:
+        raise RuntimeError("optuna is not installed; use a grid sweep or `pip install optuna`.") from e
+    search_space = search_space or OPTUNA_SEARCH_SPACE
+    study = optuna.create_study(direction="maximize", sampler=optuna.samplers.TPESampler(seed=seed))
+    evaluations = []
+    logger.info(f"[Sweep] Optuna sweep: {n_trials} trials on {workers} workers, maximising {objective}.")
+    with SharedBacktestData(data) as shared, _make_pool(shared, workers) as pool:
+        while len(evaluations) < n_trials:
+            trials = [study.ask() for _ in range(min(workers, n_trials - len(evaluations)))]
+            batch = [dict(base_params or {}, **_suggest(trial, search_space)) for trial in trials]
+            for trial, evaluation in zip(trials, pool.map(_evaluate, batch)):
+                value = _objective_value(evaluation[1], objective)
+                if value is None:
+                    study.tell(trial, state=optuna.trial.TrialState.FAIL)
+                else:
+                    study.tell(trial, value)
+                evaluations.append(evaluation)
+    return evaluations
+
+
+def result_rows(evaluations, sweep_id, objective, universe, start_date, end_date):
+    """backtest_results rows for successful evaluations."""
+    rows = []
+    for params, metrics, _ in evaluations:
+        if metrics is None:
+            continue
+        params_json = json.dumps(dict(DEFAULT_PARAMS, **params), sort_keys=True)
+        rows.append({
+            'sweep_id': sweep_id, 'universe': universe, 'start_date': start_date, 'end_date': end_date,
+            'params_json': params_json, 'params_hash': hashlib.sha256(params_json.encode("utf-8")).hexdigest(),
+            'objective': objective, 'objective_value': _objective_value(metrics, objective),
+            'sharpe': metrics.get('sharpe'), 'total_return': metrics.get('total_return'), 'cagr': metrics.get('cagr'),
+            'max_drawdown': metrics.get('max_drawdown'), 'hit_rate': metrics.get('hit_rate'),
+            'avg_daily_turnover': metrics.get('avg_daily_turnover'), 'trading_days': metrics.get('days'),
+        })
+    return rows
+
+
+if __name__ == "__main__":
+    import time
+
+    from . import db_crud
+    from .backtest import load_backtest_data
+    from .database_models import SessionLocal, create_db_and_tables
+
+    parser = argparse.ArgumentParser(description="Parallel parameter sweep for utils/backtest.py.")
+    parser.add_argument("--start-date", type=date.fromisoformat, required=True)
+    parser.add_argument("--end-date", type=date.fromisoformat, default=date.today())
+    parser.add_argument("--sectors", nargs="*", help="Limit the universe to these sectors (default: all).")
+    parser.add_argument("--grid", type=json.loads, default=None, help='JSON {param: [values]} (default: DEFAULT_GRID)')
+    parser.add_argument("--optuna-trials", type=int, default=0, help="Run an optuna study with this many trials instead of a grid.")
+    parser.add_argument("--objective", choices=OBJECTIVES, default="sharpe")
+    parser.add_argument("--cost-bps", type=float, default=DEFAULT_PARAMS['cost_bps'])
+    parser.add_argument("--workers", type=int, default=SWEEP_WORKERS)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    if args.grid and any(not 1 <= lookback <= MAX_LOOKBACK_DAYS for lookback in args.grid.get('lookback_days', [])):
+        parser.error(f"lookback_days values must be between 1 and {MAX_LOOKBACK_DAYS}.")
+    create_db_and_tables()
+    session = SessionLocal()
+    try:
+        backtest_data = load_backtest_data(session, args.start_date, args.end_date, sectors=args.sectors)
+        started = time.perf_counter()
+        base = {'cost_bps': args.cost_bps}
+        if args.optuna_trials:
+            results = run_optuna_sweep(backtest_data, args.optuna_trials, objective=args.objective, base_params=base,
+                                       workers=args.workers, seed=args.seed)
+        else:
+            results = run_grid_sweep(backtest_data, grid=args.grid, base_params=base, workers=args.workers)
+        elapsed = time.perf_counter() - started
+        failures = [(params, error) for params, metrics, error in results if metrics is None]
+        for params, error in failures[:5]:
+            logger.warning(f"[Sweep] Configuration failed: {params}: {error}")
+
+        sweep = uuid.uuid4().hex
+        rows = result_rows(results, sweep, args.objective, ",".join(args.sectors) if args.sectors else "all",
+                           args.start_date, args.end_date)
+        db_crud.save_backtest_results(session, rows)
+        print(f"Sweep {sweep}: {len(results)} configurations in {elapsed:.1f}s ({len(failures)} failed). "
+              f"Best by {args.objective}:")
+        for best in db_crud.get_best_backtest_results(session, sweep_id=sweep, limit=args.top):
+            print(f"  {args.objective}={best.objective_value:.4f} sharpe={best.sharpe:.3f} "
+                  f"total_return={best.total_return:.2%} max_dd={best.max_drawdown:.2%} params={best.params_json}")
+    finally:
+        session.close()
@@ -0,0 +1,141 @@
+# utils/context_packing.py
+"""
+Token-budgeted packing of article texts for Gemini prompts.
+
+Previously articles were concatenated until a fixed character cap and the rest was cut,
+so one or two long articles filled the whole prompt. Here each article is split into
+sentences, and each sentence is scored for relevance to the target: keyword/alias mentions,
+financial cue words, and a bonus for the lead sentences. Repeated and near-repeated
+sentences across articles are dropped. Sentences are then chosen round-robin, taking each
+article's best remaining sentence in turn, until the estimated token budget is used. Each
+article keeps its chosen sentences in their original order.
+"""
+import logging
+import os
+import re
+
+logger = logging.getLogger(__name__)
+
+LLM_CONTEXT_TOKEN_BUDGET = int(os.environ.get("LLM_CONTEXT_TOKEN_BUDGET", 6000)) # ~ the old 25,000-char cap
+CHARS_PER_TOKEN = 4.0 # Rough average for English news text
+MAX_SENTENCE_CHARS = 600 # Longer "sentences" (tables, run-ons) are clipped
+MIN_SENTENCE_CHARS = 25
+NEAR_DUPLICATE_JACCARD = 0.8 # Token-set overlap at which two sentences count as repeats
+KEYWORD_WEIGHT = 3.0
+CUE_WEIGHT = 1.0
+LEAD_SENTENCE_BONUS = (1.5, 0.75) # Bonus for an article's first and second sentence
+FINANCIAL_CUES = (
+    "profit", "loss", "revenue", "margin", "ebitda", "earnings", "guidance", "outlook", "order", "contract",
+    "deal", "acquisition", "merger", "stake", "share", "shares", "stock", "rating", "upgrade", "downgrade",
+    "target price", "dividend", "buyback", "rbi", "sebi", "regulator", "penalty", "crore", "lakh", "growth",
+    "decline", "demand", "capex", "debt", "quarter", "q1", "q2", "q3", "q4", "fy", "results", "ipo",
+)
+_ABBREVIATIONS = ("rs", "ltd", "co", "inc", "corp", "mr", "mrs", "ms", "dr", "vs", "no", "st", "approx", "govt", "pvt")
+_SENTENCE_BOUNDARY_RE = re.compile(r"(?<=[.!?])[\"')\]]?\s+(?=[\"'(\[]?[A-Z0-9])|\n+")
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_CUE_RE = re.compile(r"\b(?:" + "|".join(re.escape(cue) for cue in FINANCIAL_CUES) + r")\b")
+ARTICLE_SEPARATOR = "\n\n--- ARTICLE SEPARATOR ---\n\n"
+
+
+def estimate_tokens(text):
+    return int(len(text) / CHARS_PER_TOKEN) + 1
+
+
+def split_sentences(text):
+    """Sentences of `text`, without splitting after abbreviations such as "Rs." or "Ltd."."""
+    sentences = []
+    for fragment in _SENTENCE_BOUNDARY_RE.split(text or ""):
+        fragment = fragment.strip()
+        if not fragment:
+            continue
+        previous_word = sentences[-1].rsplit(None, 1)[-1].rstrip(".").lower() if sentences else ""
+        if sentences and sentences[-1].endswith(".") and previous_word in _ABBREVIATIONS:
+            sentences[-1] = f"{sentences[-1]} {fragment}"
+        else:
+            sentences.append(fragment)
+    return sentences
+
+
+def _keyword_pattern(keywords):
+    keywords = sorted({keyword.strip().lower() for keyword in keywords if keyword and keyword.strip()}, key=len, reverse=True)
+    if not keywords:
+        return None
+    return re.compile(r"\b(?:" + "|".join(re.escape(keyword) for keyword in keywords) + r")\b")
+
+
+def score_sentence(sentence, position, keyword_pattern):
+    lowered = sentence.lower()
+    score = CUE_WEIGHT * len(_CUE_RE.findall(lowered))
+    if keyword_pattern is not None:
+        score += KEYWORD_WEIGHT * len(keyword_pattern.findall(lowered))
+    if position < len(LEAD_SENTENCE_BONUS):
+        score += LEAD_SENTENCE_BONUS[position]
+    return score
+
+
+def _is_repeat(tokens, normalized, seen_normalized, selected_token_sets):
+    if normalized in seen_normalized:
+        return True
+    for other in selected_token_sets:
+        smaller, larger = (tokens, other) if len(tokens) <= len(other) else (other, tokens)
+        if len(smaller) < NEAR_DUPLICATE_JACCARD * len(larger): # Jaccard cannot reach the threshold
+            continue
+        if len(tokens & other) >= NEAR_DUPLICATE_JACCARD * len(tokens | other):
+            return True
+    return False
+
+
+def pack_articles(texts, keywords, token_budget=LLM_CONTEXT_TOKEN_BUDGET):
+    """
+    Condenses `texts` (in priority order) to their most relevant, non-repeated sentences within `token_budget`
+    (estimate_tokens of the joined result, separators included). Returns (packed texts, one per article that kept
+    at least one sentence, stats dict).
+    """
+    keyword_pattern = _keyword_pattern(keywords)
+    separator_tokens = estimate_tokens(ARTICLE_SEPARATOR)
+    queues = []
+    for article_index, text in enumerate(texts):
+        candidates = []
+        for position, sentence in enumerate(split_sentences(text)):
+            if len(sentence) < MIN_SENTENCE_CHARS:
+                continue
+            if len(sentence) > MAX_SENTENCE_CHARS:
+                sentence = sentence[:MAX_SENTENCE_CHARS].rsplit(" ", 1)[0] + " ..."
+            score = score_sentence(sentence, position, keyword_pattern)
+            if score > 0:
+                candidates.append((score, -position, sentence))
+        candidates.sort() # Best (highest score, then earliest) last, for pop()
+        queues.append((article_index, candidates))
+
+    chosen = {} # article_index -> [(position, sentence)]
+    seen_normalized, selected_token_sets = set(), []
+    used_tokens, dropped_repeats, dropped_for_budget = 0, 0, 0
+    min_cost = estimate_tokens("x" * MIN_SENTENCE_CHARS)
+    while token_budget - used_tokens >= min_cost and any(candidates for _, candidates in queues):
+        for article_index, candidates in queues: # One sentence per article per round
+            while candidates:
+                _, negative_position, sentence = candidates.pop()
+                tokens = frozenset(_TOKEN_RE.findall(sentence.lower()))
+                normalized = " ".join(sorted(tokens))
+                if _is_repeat(tokens, normalized, seen_normalized, selected_token_sets):
+                    dropped_repeats += 1
+                    continue
+                cost = estimate_tokens(sentence) + (separator_tokens if article_index not in chosen else 1)
+                if used_tokens + cost > token_budget:
+                    dropped_for_budget += 1 # A shorter sentence may still fit
+                    continue
+                chosen.setdefault(article_index, []).append((-negative_position, sentence))
+                seen_normalized.add(normalized)
+                selected_token_sets.append(tokens)
+                used_tokens += cost
+                break
+
+    packed = [" ".join(sentence for _, sentence in sorted(chosen[index])) for index in sorted(chosen)]
+    stats = {
+        'articles_in': len(texts), 'articles_packed': len(packed),
+        'sentences_packed': sum(len(sentences) for sentences in chosen.values()),
+        'repeats_dropped': dropped_repeats, 'over_budget_dropped': dropped_for_budget, 'estimated_tokens': used_tokens,
+        'input_chars': sum(len(text or "") for text in texts), 'packed_chars': sum(len(text) for text in packed),
+    }
+    logger.debug(f"[ContextPack] {stats}")
+    return packed, stats
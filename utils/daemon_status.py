@@ -0,0 +1,104 @@
+# utils/daemon_status.py
+import json
+import logging
+import os
+import threading
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+
+def _utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class DaemonStatus:
+    """
+    Liveness/lag state of the scraping daemon. Every update is written atomically to a JSON
+    file (for cron/monitoring scripts) and served by the optional status HTTP server.
+
+    Liveness: the daemon is unhealthy when a cycle has been running longer than
+    `max_cycle_seconds`, or when the next cycle is overdue by more than `max_cycle_seconds`.
+    `live_counters` (e.g. the scraper's run_stats dict) is included as-is in every snapshot.
+    """
+
+    def __init__(self, status_path, max_cycle_seconds, live_counters=None):
+        self.status_path = status_path
+        self.max_cycle_seconds = max_cycle_seconds
+        self.live_counters = live_counters if live_counters is not None else {}
+        self._lock = threading.Lock()
+        self._state = {'state': 'starting', 'pid': os.getpid(), 'started_at': _utcnow().isoformat()}
+
+    def update(self, **fields):
+        with self._lock:
+            self._state.update(fields)
+            self._state['heartbeat_at'] = _utcnow().isoformat()
+            snapshot = self._snapshot_locked()
+        try:
+            tmp_path = f"{self.status_path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(snapshot, f, indent=2, default=str)
+            os.replace(tmp_path, self.status_path)
+        except OSError as e:
+            logger.warning(f"[DaemonStatus] Could not write status file {self.status_path}: {e}")
+
+    def _snapshot_locked(self):
+        snapshot = dict(self._state)
+        snapshot['counters'] = dict(self.live_counters)
+        snapshot['healthy'], snapshot['health_reason'] = self._health_locked()
+        return snapshot
+
+    def snapshot(self):
+        with self._lock:
+            return self._snapshot_locked()
+
+    def _health_locked(self):
+        now = _utcnow()
+        if self._state.get('state') == 'running' and self._state.get('cycle_started_at'):
+            running_for = (now - datetime.fromisoformat(self._state['cycle_started_at'])).total_seconds()
+            if running_for > self.max_cycle_seconds:
+                return False, f"cycle running for {running_for:.0f}s"
+        if self._state.get('state') == 'idle' and self._state.get('next_cycle_at'):
+            overdue = (now - datetime.fromisoformat(self._state['next_cycle_at'])).total_seconds()
+            if overdue > self.max_cycle_seconds:
+                return False, f"next cycle overdue by {overdue:.0f}s"
+        return True, "ok"
+
+
+def start_status_server(status, port, host="127.0.0.1", metrics_text=None):
+    """
+    Serves GET /status (JSON snapshot) and /healthz (200 / 503) from a daemon thread, plus
+    /metrics (Prometheus text) when a `metrics_text` callable is given.
+    """
+
+    class _StatusHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.startswith("/metrics") and metrics_text is not None:
+                self._send(200, metrics_text(), "text/plain; version=0.0.4; charset=utf-8")
+                return
+            snapshot = status.snapshot()
+            if self.path.startswith("/healthz"):
+                code = 200 if snapshot['healthy'] else 503
+                body = json.dumps({'healthy': snapshot['healthy'], 'reason': snapshot['health_reason']})
+            elif self.path.startswith("/status"):
+                code, body = 200, json.dumps(snapshot, default=str)
+            else:
+                code, body = 404, json.dumps({'error': 'not found'})
+            self._send(code, body, "application/json")
+
+        def _send(self, code, body, content_type):
+            payload = body.encode('utf-8')
+            self.send_response(code)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args): # Keep probes out of the scraper log
+            logger.debug(f"[DaemonStatus] {self.address_string()} {format % args}")
+
+    server = ThreadingHTTPServer((host, port), _StatusHandler)
+    threading.Thread(target=server.serve_forever, name="daemon-status-http", daemon=True).start()
+    logger.info(f"[DaemonStatus] Status server on http://{host}:{port}/status and /healthz{' and /metrics' if metrics_text else ''}")
+    return server
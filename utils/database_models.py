@@ -1,13 +1,15 @@
 # ~/CombinedNiftyNewsApp/utils/database_models.py
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, Float, Index
-from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy import Column, Integer, BigInteger, String, Text, Date, DateTime, Float, ForeignKey, Index, inspect, text
+from sqlalchemy.orm import sessionmaker, declarative_base, deferred
 from datetime import datetime, timezone
 import os
 
+from .storage import create_storage_engine
+
 DEFAULT_DATABASE_URL = "sqlite:///./news_data.db"
 DATABASE_URL = os.environ.get("DATABASE_URL", DEFAULT_DATABASE_URL)
 
-engine = create_engine(DATABASE_URL)
+engine = create_storage_engine(DATABASE_URL) # WAL + tuned pragmas for SQLite, see utils/storage.py
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
@@ -17,29 +19,185 @@ class ScrapedArticle(Base):
     id = Column(Integer, primary_key=True, index=True)
     url = Column(String, unique=True, index=True, nullable=False)
     headline = Column(Text, nullable=True)
-    article_text = Column(Text, nullable=True)
+    # Large text columns are deferred: loaded on first attribute access (or via undefer/projection), not with the row
+    article_text = deferred(Column(Text, nullable=True), group="body")
     publication_date = Column(DateTime, index=True, nullable=True)
     download_date = Column(DateTime, default=lambda: datetime.now(timezone.utc).replace(tzinfo=None))
     source_domain = Column(String, index=True, nullable=True)
     language = Column(String, nullable=True)
-    authors = Column(Text, nullable=True) # Store as JSON string
-    keywords_extracted = Column(Text, nullable=True) # Store as JSON string
-    summary_generated = Column(Text, nullable=True)
+    authors = deferred(Column(Text, nullable=True), group="extras") # Store as JSON string
+    keywords_extracted = deferred(Column(Text, nullable=True), group="extras") # Store as JSON string
+    summary_generated = deferred(Column(Text, nullable=True), group="extras")
     
     vader_score = Column(Float, nullable=True, index=True)
     llm_sentiment_score = Column(Float, nullable=True, index=True)
     llm_sentiment_label = Column(String, nullable=True)
-    llm_analysis_json = Column(Text, nullable=True) # Store full Gemini JSON response
+    llm_analysis_json = deferred(Column(Text, nullable=True), group="extras") # Store full Gemini JSON response
 
     related_sector = Column(String, nullable=True, index=True)
     related_stock = Column(String, nullable=True, index=True) # Ticker or name
 
+    # HTTP validators for conditional re-fetch (refresh mode)
+    http_etag = Column(String, nullable=True)
+    http_last_modified = Column(String, nullable=True) # Raw Last-Modified header value
+    content_hash = Column(String(64), nullable=True) # SHA-256 of the normalized extracted article text
+    last_checked_date = Column(DateTime, nullable=True, index=True)
+
+    # Near-duplicate detection (utils/near_duplicates.py)
+    simhash = Column(BigInteger, nullable=True) # Signed 64-bit SimHash of the body (NULL if too short to sign)
+    cluster_id = Column(Integer, nullable=True, index=True) # id of the first-ingested copy of this story
+
     __table_args__ = (
         Index('ix_scraped_articles_pub_date_domain_headline', 'publication_date', 'source_domain', 'headline'),
     )
 
+class ArticleSimhashBand(Base):
+    """LSH band index over ScrapedArticle.simhash: one row per article and 16-bit band."""
+    __tablename__ = "article_simhash_bands"
+
+    band = Column(Integer, primary_key=True) # 0..3
+    bucket = Column(Integer, primary_key=True) # The band's 16 bits
+    article_id = Column(Integer, ForeignKey("scraped_articles.id", ondelete="CASCADE"), primary_key=True, index=True)
+
+class DiscoveryWatermark(Base):
+    """Contiguous range of item dates already offered per sitemap/feed source, for incremental discovery."""
+    __tablename__ = "discovery_watermarks"
+
+    source_url = Column(String, primary_key=True)
+    news_domain = Column(String, index=True, nullable=False)
+    last_item_date = Column(DateTime, nullable=True)
+    scanned_from = Column(DateTime, nullable=True) # Start of the range scanned through last_item_date
+    updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc).replace(tzinfo=None))
+
+class ScrapeCoverage(Base):
+    """One completed search window: entity x domain x query pattern over inclusive publication days."""
+    __tablename__ = "scrape_coverage"
+
+    id = Column(Integer, primary_key=True, index=True)
+    entity_type = Column(String, nullable=False) # 'sector' / 'stock'
+    entity_name = Column(String, nullable=False)
+    news_domain = Column(String, nullable=False)
+    query_pattern = Column(String, nullable=False) # Year-free query template, e.g. "stock_news"
+    start_date = Column(Date, nullable=False)
+    end_date = Column(Date, nullable=False)
+    urls_found = Column(Integer, default=0)
+    articles_saved = Column(Integer, default=0)
+    searched_at = Column(DateTime, default=lambda: datetime.now(timezone.utc).replace(tzinfo=None))
+
+    __table_args__ = (
+        Index('ix_scrape_coverage_entity_domain', 'entity_type', 'entity_name', 'news_domain', 'query_pattern'),
+        Index('ix_scrape_coverage_dates', 'start_date', 'end_date'),
+    )
+
+class EntityWatermark(Base):
+    """Day through which an entity's Google coverage is contiguous on every domain/query pattern (daemon mode)."""
+    __tablename__ = "entity_watermarks"
+
+    entity_type = Column(String, primary_key=True)
+    entity_name = Column(String, primary_key=True)
+    covered_through = Column(Date, nullable=True)
+    updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc).replace(tzinfo=None))
+
+class LlmAnalysis(Base):
+    """One Gemini analysis of a target over a date window, keyed by prompt fingerprint and model."""
+    __tablename__ = "llm_analyses"
+
+    id = Column(Integer, primary_key=True, index=True)
+    target_type = Column(String, nullable=False) # 'sector' / 'stock'
+    target_name = Column(String, nullable=False)
+    window_start = Column(Date, nullable=False)
+    window_end = Column(Date, nullable=False)
+    prompt_hash = Column(String(64), nullable=False) # gemini_utils.analysis_prompt_hash()
+    model_name = Column(String, nullable=False)
+    sentiment_score = Column(Float, nullable=True)
+    sentiment_label = Column(String, nullable=True)
+    article_count = Column(Integer, default=0)
+    analysis_json = deferred(Column(Text, nullable=True)) # Full Gemini JSON response
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc).replace(tzinfo=None))
+    updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc).replace(tzinfo=None))
+
+    __table_args__ = (
+        Index('ux_llm_analyses_target_window_prompt_model', 'target_type', 'target_name', 'window_start',
+              'window_end', 'prompt_hash', 'model_name', unique=True),
+        Index('ix_llm_analyses_target_window_end', 'target_type', 'target_name', 'window_end'),
+    )
+
+class LlmAnalysisArticle(Base):
+    """Articles that were sent to Gemini for an LlmAnalysis."""
+    __tablename__ = "llm_analysis_articles"
+
+    analysis_id = Column(Integer, ForeignKey("llm_analyses.id", ondelete="CASCADE"), primary_key=True)
+    article_id = Column(Integer, ForeignKey("scraped_articles.id", ondelete="CASCADE"), primary_key=True, index=True)
+
+class DailyEntitySentiment(Base):
+    """
+    Running per-day sentiment totals for an entity (related_sector / related_stock) and source domain.
+    Maintained incrementally by utils/sentiment_aggregates.py; averages are sum / count.
+    """
+    __tablename__ = "daily_entity_sentiment"
+
+    entity_type = Column(String, primary_key=True) # 'sector' / 'stock'
+    entity_name = Column(String, primary_key=True)
+    day = Column(Date, primary_key=True) # publication_date (UTC) day
+    source = Column(String, primary_key=True) # source_domain, '' when unknown
+    article_count = Column(Integer, nullable=False, default=0)
+    vader_sum = Column(Float, nullable=False, default=0.0)
+    vader_count = Column(Integer, nullable=False, default=0)
+    vader_min = Column(Float, nullable=True)
+    vader_max = Column(Float, nullable=True)
+    llm_score_sum = Column(Float, nullable=False, default=0.0)
+    llm_score_count = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc).replace(tzinfo=None))
+
+class BacktestResult(Base):
+    """Metrics of one backtest configuration from a parameter sweep (utils/backtest_sweep.py)."""
+    __tablename__ = "backtest_results"
+
+    id = Column(Integer, primary_key=True, index=True)
+    sweep_id = Column(String(32), nullable=False, index=True)
+    universe = Column(String, nullable=False) # Comma-separated sectors, or 'all'
+    start_date = Column(Date, nullable=False)
+    end_date = Column(Date, nullable=False)
+    params_json = Column(Text, nullable=False)
+    params_hash = Column(String(64), nullable=False, index=True) # SHA-256 of params_json (sorted keys)
+    objective = Column(String, nullable=False) # Metric the sweep maximised
+    objective_value = Column(Float, nullable=True)
+    sharpe = Column(Float, nullable=True)
+    total_return = Column(Float, nullable=True)
+    cagr = Column(Float, nullable=True)
+    max_drawdown = Column(Float, nullable=True)
+    hit_rate = Column(Float, nullable=True)
+    avg_daily_turnover = Column(Float, nullable=True)
+    trading_days = Column(Integer, nullable=True)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc).replace(tzinfo=None))
+
+    __table_args__ = (
+        Index('ix_backtest_results_sweep_objective', 'sweep_id', 'objective_value'),
+    )
+
+def _add_missing_columns():
+    """
+    create_all() never alters existing tables, so columns added to the models after a
+    database was first created are appended here with ALTER TABLE ... ADD COLUMN.
+    """
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing_columns = {col['name'] for col in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+                if column.index:
+                    conn.execute(text(f'CREATE INDEX IF NOT EXISTS ix_{table.name}_{column.name} ON {table.name} ({column.name})'))
+
 def create_db_and_tables():
     Base.metadata.create_all(bind=engine)
+    _add_missing_columns()
 
 if __name__ == "__main__":
     print(f"Attempting to create database and tables at {DATABASE_URL}...")
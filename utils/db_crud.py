@@ -1,32 +1,37 @@
 # ~/CombinedNiftyNewsApp/utils/db_crud.py
-from sqlalchemy.orm import Session
-from sqlalchemy import or_, and_
-from .database_models import ScrapedArticle # Relative import
-from datetime import datetime, timedelta
+from sqlalchemy.orm import Session, undefer_group
+from sqlalchemy import or_, and_, func, update, bindparam, select
+from .database_models import (ScrapedArticle, DiscoveryWatermark, ScrapeCoverage, EntityWatermark, # Relative import
+                              LlmAnalysis, LlmAnalysisArticle, BacktestResult)
+from .sentiment_aggregates import ArticleAggregateChanges, article_snapshot, SNAPSHOT_FIELDS
+from datetime import datetime, timedelta, timezone
 import json
 import logging
 
 logger = logging.getLogger(__name__)
 
-def get_articles_for_analysis(db: Session, start_date: datetime, end_date: datetime, 
-                              target_keywords: list, source_domains_filter: list = None, 
-                              limit: int = 50):
+# Everything an analysis route needs except the large text columns
+ARTICLE_METADATA_COLUMNS = (
+    ScrapedArticle.id, ScrapedArticle.url, ScrapedArticle.headline, ScrapedArticle.publication_date,
+    ScrapedArticle.source_domain, ScrapedArticle.vader_score, ScrapedArticle.llm_sentiment_score,
+    ScrapedArticle.llm_sentiment_label, ScrapedArticle.related_sector, ScrapedArticle.related_stock,
+)
+
+def _filter_articles_for_analysis(query, start_date, end_date, target_keywords, source_domains_filter, collapse_duplicates=True):
     """
-    Fetches articles for sentiment analysis based on keywords in headline or article_text,
-    and optionally filters by source domains.
+    Date/text/domain/keyword filters shared by the ORM and projection queries (matching happens in SQL).
+    With collapse_duplicates, only the lowest-id matching article of each near-duplicate cluster is kept.
     """
-    logger.debug(f"DB CRUD: Fetching articles for analysis. Dates: {start_date} to {end_date}. Keywords: {target_keywords}. Domains: {source_domains_filter}. Limit: {limit}")
-    
-    query = db.query(ScrapedArticle).filter(
+    conditions = [
         ScrapedArticle.publication_date >= start_date,
         ScrapedArticle.publication_date <= end_date,
         ScrapedArticle.article_text != None,
         ScrapedArticle.article_text != ""
-    )
+    ]
 
     if source_domains_filter:
         domain_conditions = [ScrapedArticle.source_domain.ilike(f"%{domain}%") for domain in source_domains_filter]
-        query = query.filter(or_(*domain_conditions))
+        conditions.append(or_(*domain_conditions))
 
     if target_keywords:
         keyword_conditions = []
@@ -34,13 +39,52 @@ def get_articles_for_analysis(db: Session, start_date: datetime, end_date: datet
             keyword_conditions.append(ScrapedArticle.headline.ilike(f"%{kw}%"))
             keyword_conditions.append(ScrapedArticle.article_text.ilike(f"%{kw}%"))
         if keyword_conditions:
-            query = query.filter(or_(*keyword_conditions))
-    
-    articles = query.order_by(ScrapedArticle.publication_date.desc()).limit(limit).all()
+            conditions.append(or_(*keyword_conditions))
+
+    query = query.filter(*conditions)
+    if collapse_duplicates:
+        representatives = select(func.min(ScrapedArticle.id)).where(*conditions).group_by(
+            func.coalesce(ScrapedArticle.cluster_id, ScrapedArticle.id)) # Unclustered rows stand alone
+        query = query.filter(ScrapedArticle.id.in_(representatives))
+    return query.order_by(ScrapedArticle.publication_date.desc())
+
+
+def get_articles_for_analysis(db: Session, start_date: datetime, end_date: datetime, 
+                              target_keywords: list, source_domains_filter: list = None, 
+                              limit: int = 50, collapse_duplicates: bool = True):
+    """
+    Fetches articles for sentiment analysis based on keywords in headline or article_text,
+    and optionally filters by source domains. Full ORM rows with article_text loaded; prefer
+    get_article_metadata_for_analysis() + get_article_bodies() when only a few bodies are needed.
+    Near-duplicate copies (same cluster_id) are collapsed to one article unless collapse_duplicates=False.
+    """
+    logger.debug(f"DB CRUD: Fetching articles for analysis. Dates: {start_date} to {end_date}. Keywords: {target_keywords}. Domains: {source_domains_filter}. Limit: {limit}")
+    query = db.query(ScrapedArticle).options(undefer_group("body"))
+    articles = _filter_articles_for_analysis(query, start_date, end_date, target_keywords, source_domains_filter,
+                                             collapse_duplicates).limit(limit).all()
     logger.debug(f"DB CRUD: Found {len(articles)} articles matching criteria.")
     return articles
 
 
+def get_article_metadata_for_analysis(db: Session, start_date: datetime, end_date: datetime,
+                                      target_keywords: list, source_domains_filter: list = None,
+                                      limit: int = 50, collapse_duplicates: bool = True):
+    """Same selection as get_articles_for_analysis(), but returns ARTICLE_METADATA_COLUMNS rows (no text columns)."""
+    query = db.query(*ARTICLE_METADATA_COLUMNS)
+    rows = _filter_articles_for_analysis(query, start_date, end_date, target_keywords, source_domains_filter,
+                                         collapse_duplicates).limit(limit).all()
+    logger.debug(f"DB CRUD: Found {len(rows)} article metadata rows. Dates: {start_date} to {end_date}. Keywords: {target_keywords}.")
+    return rows
+
+
+def get_article_bodies(db: Session, article_ids):
+    """Returns {id: article_text} for the given ids in one query."""
+    article_ids = list(set(article_ids))
+    if not article_ids:
+        return {}
+    return dict(db.query(ScrapedArticle.id, ScrapedArticle.article_text).filter(ScrapedArticle.id.in_(article_ids)).all())
+
+
 def update_article_sentiment_scores(db: Session, article_url: str, 
                                    vader_score: float = None, 
                                    llm_sentiment_score: float = None, 
@@ -50,6 +94,7 @@ def update_article_sentiment_scores(db: Session, article_url: str,
                                    related_stock: str = None):
     article = db.query(ScrapedArticle).filter(ScrapedArticle.url == article_url).first()
     if article:
+        before = article_snapshot(article)
         updated = False
         if vader_score is not None: 
             article.vader_score = vader_score
@@ -72,6 +117,9 @@ def update_article_sentiment_scores(db: Session, article_url: str,
         
         if updated:
             try:
+                aggregate_changes = ArticleAggregateChanges()
+                aggregate_changes.add(before, article_snapshot(article))
+                aggregate_changes.apply(db) # daily_entity_sentiment, same transaction
                 db.commit()
                 logger.info(f"DB CRUD: Updated sentiment for article: {article_url}")
                 return True
@@ -83,7 +131,230 @@ def update_article_sentiment_scores(db: Session, article_url: str,
         logger.warning(f"DB CRUD: Article not found for sentiment update: {article_url}")
     return False
 
+# Overwritten when a value is given; related_* are only filled when still empty (as in update_article_sentiment_scores)
+BULK_SENTIMENT_FIELDS = ('vader_score', 'llm_sentiment_score', 'llm_sentiment_label', 'llm_analysis_json')
+BULK_FILL_IF_EMPTY_FIELDS = ('related_sector', 'related_stock')
+
+def bulk_update_article_sentiment_scores(db: Session, updates):
+    """
+    Applies many sentiment updates in one executemany UPDATE and one commit.
+    `updates` is an iterable of (article_id, {field: value}) with fields from BULK_SENTIMENT_FIELDS /
+    BULK_FILL_IF_EMPTY_FIELDS; None values leave the column unchanged. Returns the number of updates applied.
+    """
+    params = []
+    for article_id, fields in updates:
+        unknown = set(fields) - set(BULK_SENTIMENT_FIELDS) - set(BULK_FILL_IF_EMPTY_FIELDS)
+        if unknown:
+            raise ValueError(f"Unsupported fields for bulk sentiment update: {sorted(unknown)}")
+        row = {'b_id': article_id}
+        row.update({f"b_{field}": fields.get(field) for field in BULK_SENTIMENT_FIELDS + BULK_FILL_IF_EMPTY_FIELDS})
+        params.append(row)
+    if not params:
+        return 0
+
+    table = ScrapedArticle.__table__
+    values = {field: func.coalesce(bindparam(f"b_{field}"), table.c[field]) for field in BULK_SENTIMENT_FIELDS}
+    values.update({field: func.coalesce(func.nullif(table.c[field], ""), bindparam(f"b_{field}")) for field in BULK_FILL_IF_EMPTY_FIELDS})
+    statement = update(table).where(table.c.id == bindparam("b_id")).values(**values)
+    try:
+        aggregate_changes = _bulk_update_aggregate_changes(db, params)
+        db.execute(statement, params) # Core statement + list of params -> DBAPI executemany
+        aggregate_changes.apply(db) # daily_entity_sentiment, same transaction
+        db.commit()
+        logger.info(f"DB CRUD: Bulk-updated sentiment for {len(params)} articles.")
+        return len(params)
+    except Exception as e:
+        db.rollback()
+        logger.error(f"DB CRUD: Error in bulk sentiment update of {len(params)} articles: {e}")
+        return 0
+
+def _bulk_update_aggregate_changes(db: Session, params):
+    """Daily aggregate deltas for a bulk update: current snapshots (one query) + the COALESCE rules applied in Python."""
+    ids = list({row['b_id'] for row in params})
+    snapshot_columns = [getattr(ScrapedArticle, field) for field in SNAPSHOT_FIELDS]
+    current = {row[0]: dict(zip(SNAPSHOT_FIELDS, row[1:]))
+               for row in db.query(ScrapedArticle.id, *snapshot_columns).filter(ScrapedArticle.id.in_(ids)).all()}
+    changes = ArticleAggregateChanges()
+    for row in params:
+        before = current.get(row['b_id'])
+        if before is None:
+            continue
+        after = dict(before)
+        for field in ('vader_score', 'llm_sentiment_score'):
+            if row[f"b_{field}"] is not None:
+                after[field] = row[f"b_{field}"]
+        for field in BULK_FILL_IF_EMPTY_FIELDS:
+            if not after[field] and row[f"b_{field}"] is not None:
+                after[field] = row[f"b_{field}"]
+        changes.add(before, after)
+        current[row['b_id']] = after # Repeated ids see the earlier update, as the executemany does
+    return changes
+
 def get_article_by_url(db: Session, url: str):
     return db.query(ScrapedArticle).filter(ScrapedArticle.url == url).first()
 
+def get_discovery_watermarks(db: Session, news_domain: str):
+    """Returns {source_url: (scanned_from, last_item_date)} for a news domain's sitemap/feed sources."""
+    rows = db.query(DiscoveryWatermark.source_url, DiscoveryWatermark.scanned_from, DiscoveryWatermark.last_item_date).filter(
+        DiscoveryWatermark.news_domain == news_domain).all()
+    return {source_url: (scanned_from, last_item_date) for source_url, scanned_from, last_item_date in rows}
+
+def save_discovery_watermarks(db: Session, news_domain: str, watermarks: dict):
+    """
+    Upserts {source_url: (scanned_from, last_item_date)} as computed by SitemapFeedDiscovery, which
+    merges them with the stored ranges; a range may shrink when fetches failed.
+    """
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    try:
+        for source_url, (scanned_from, last_item_date) in watermarks.items():
+            row = db.get(DiscoveryWatermark, source_url)
+            if row is None:
+                db.add(DiscoveryWatermark(source_url=source_url, news_domain=news_domain, scanned_from=scanned_from,
+                                          last_item_date=last_item_date, updated_at=now))
+            else:
+                row.scanned_from, row.last_item_date = scanned_from, last_item_date
+                row.updated_at = now
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error(f"DB CRUD: Error saving discovery watermarks for {news_domain}: {e}")
+
+def get_scrape_coverage_rows(db: Session, start_date, end_date, news_domains: list = None):
+    """Coverage windows overlapping [start_date, end_date] (dates, inclusive), optionally for some domains only."""
+    query = db.query(
+        ScrapeCoverage.entity_type, ScrapeCoverage.entity_name, ScrapeCoverage.news_domain,
+        ScrapeCoverage.query_pattern, ScrapeCoverage.start_date, ScrapeCoverage.end_date,
+        ScrapeCoverage.urls_found, ScrapeCoverage.articles_saved
+    ).filter(ScrapeCoverage.start_date <= end_date, ScrapeCoverage.end_date >= start_date)
+    if news_domains:
+        query = query.filter(ScrapeCoverage.news_domain.in_(news_domains))
+    return query.all()
+
+def add_scrape_coverage(db: Session, entity_type: str, entity_name: str, news_domain: str, query_pattern: str,
+                        start_date, end_date, urls_found: int = 0, articles_saved: int = 0):
+    try:
+        db.add(ScrapeCoverage(entity_type=entity_type, entity_name=entity_name, news_domain=news_domain,
+                              query_pattern=query_pattern, start_date=start_date, end_date=end_date,
+                              urls_found=urls_found, articles_saved=articles_saved))
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error(f"DB CRUD: Error recording scrape coverage for {entity_name} on {news_domain}: {e}")
+
+def get_query_yield_stats(db: Session):
+    """
+    Historical search yield per (entity_type, entity_name, news_domain, query_pattern) over all
+    recorded searches: {key: (searches, articles_saved, urls_found)}.
+    """
+    rows = db.query(
+        ScrapeCoverage.entity_type, ScrapeCoverage.entity_name, ScrapeCoverage.news_domain, ScrapeCoverage.query_pattern,
+        func.count(ScrapeCoverage.id), func.coalesce(func.sum(ScrapeCoverage.articles_saved), 0),
+        func.coalesce(func.sum(ScrapeCoverage.urls_found), 0)
+    ).group_by(ScrapeCoverage.entity_type, ScrapeCoverage.entity_name, ScrapeCoverage.news_domain,
+               ScrapeCoverage.query_pattern).all()
+    return {(e_type, e_name, domain, pattern): (searches, saved, found)
+            for e_type, e_name, domain, pattern, searches, saved, found in rows}
+
+def get_entity_watermarks(db: Session):
+    """Returns {(entity_type, entity_name): covered_through date}."""
+    rows = db.query(EntityWatermark.entity_type, EntityWatermark.entity_name, EntityWatermark.covered_through).all()
+    return {(entity_type, entity_name): covered_through for entity_type, entity_name, covered_through in rows}
+
+def save_entity_watermarks(db: Session, watermarks: dict):
+    """Upserts {(entity_type, entity_name): covered_through}; a watermark never moves backwards."""
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    try:
+        for (entity_type, entity_name), covered_through in watermarks.items():
+            row = db.get(EntityWatermark, (entity_type, entity_name))
+            if row is None:
+                db.add(EntityWatermark(entity_type=entity_type, entity_name=entity_name,
+                                       covered_through=covered_through, updated_at=now))
+            elif covered_through and (row.covered_through is None or covered_through > row.covered_through):
+                row.covered_through = covered_through
+                row.updated_at = now
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error(f"DB CRUD: Error saving entity watermarks: {e}")
+
+def get_latest_publication_date(db: Session):
+    return db.query(func.max(ScrapedArticle.publication_date)).scalar()
+
+def save_llm_analysis(db: Session, target_type: str, target_name: str, window_start, window_end,
+                      prompt_hash: str, model_name: str, analysis: dict, article_ids):
+    """
+    Stores one analysis row per (target, window, prompt_hash, model) plus its article links. Re-running the
+    same analysis replaces that row's result and links. Returns the analysis id, or None on error.
+    """
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    article_ids = sorted({article_id for article_id in article_ids if article_id is not None})
+    score = analysis.get('sentiment_score_llm')
+    try:
+        row = db.query(LlmAnalysis).filter(
+            LlmAnalysis.target_type == target_type, LlmAnalysis.target_name == target_name,
+            LlmAnalysis.window_start == window_start, LlmAnalysis.window_end == window_end,
+            LlmAnalysis.prompt_hash == prompt_hash, LlmAnalysis.model_name == model_name).first()
+        if row is None:
+            row = LlmAnalysis(target_type=target_type, target_name=target_name, window_start=window_start,
+                              window_end=window_end, prompt_hash=prompt_hash, model_name=model_name, created_at=now)
+            db.add(row)
+        row.sentiment_score = float(score) if isinstance(score, (int, float)) else None
+        row.sentiment_label = analysis.get('overall_sentiment')
+        row.article_count = len(article_ids)
+        row.analysis_json = json.dumps(analysis)
+        row.updated_at = now
+        db.flush() # Assigns row.id for new analyses
+        db.query(LlmAnalysisArticle).filter(LlmAnalysisArticle.analysis_id == row.id).delete(synchronize_session=False)
+        db.add_all([LlmAnalysisArticle(analysis_id=row.id, article_id=article_id) for article_id in article_ids])
+        db.commit()
+        logger.info(f"DB CRUD: Saved LLM analysis {row.id} for {target_type} '{target_name}' ({window_start} to {window_end}, {len(article_ids)} articles).")
+        return row.id
+    except Exception as e:
+        db.rollback()
+        logger.error(f"DB CRUD: Error saving LLM analysis for {target_type} '{target_name}': {e}")
+        return None
+
+def get_llm_analyses(db: Session, target_type: str, target_name: str, start_date=None, end_date=None,
+                     model_name: str = None, include_json: bool = False):
+    """Typed score/label rows for a target, oldest window first, optionally limited to windows ending in [start_date, end_date]."""
+    columns = [LlmAnalysis.id, LlmAnalysis.window_start, LlmAnalysis.window_end, LlmAnalysis.prompt_hash,
+               LlmAnalysis.model_name, LlmAnalysis.sentiment_score, LlmAnalysis.sentiment_label,
+               LlmAnalysis.article_count, LlmAnalysis.updated_at]
+    if include_json:
+        columns.append(LlmAnalysis.analysis_json)
+    query = db.query(*columns).filter(LlmAnalysis.target_type == target_type, LlmAnalysis.target_name == target_name)
+    if start_date is not None:
+        query = query.filter(LlmAnalysis.window_end >= start_date)
+    if end_date is not None:
+        query = query.filter(LlmAnalysis.window_end <= end_date)
+    if model_name:
+        query = query.filter(LlmAnalysis.model_name == model_name)
+    return query.order_by(LlmAnalysis.window_end, LlmAnalysis.updated_at).all()
+
+def get_llm_analysis_article_ids(db: Session, analysis_id: int):
+    return [article_id for (article_id,) in db.query(LlmAnalysisArticle.article_id).filter(
+        LlmAnalysisArticle.analysis_id == analysis_id).all()]
+
+def save_backtest_results(db: Session, rows):
+    """Inserts BacktestResult rows (dicts of its columns) in one commit; returns how many were saved."""
+    rows = list(rows)
+    if not rows:
+        return 0
+    try:
+        db.add_all([BacktestResult(**row) for row in rows])
+        db.commit()
+        logger.info(f"DB CRUD: Saved {len(rows)} backtest results (sweep {rows[0].get('sweep_id')}).")
+        return len(rows)
+    except Exception as e:
+        db.rollback()
+        logger.error(f"DB CRUD: Error saving {len(rows)} backtest results: {e}")
+        return 0
+
+def get_best_backtest_results(db: Session, sweep_id: str = None, limit: int = 10):
+    """Highest objective_value first, for one sweep or across all sweeps."""
+    query = db.query(BacktestResult).filter(BacktestResult.objective_value != None)
+    if sweep_id:
+        query = query.filter(BacktestResult.sweep_id == sweep_id)
+    return query.order_by(BacktestResult.objective_value.desc()).limit(limit).all()
+
 # Add other CRUD functions as needed, e.g., for backtesting specific queries
\ No newline at end of file
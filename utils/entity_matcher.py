@@ -0,0 +1,183 @@
+# utils/entity_matcher.py
+import logging
+import re
+from functools import lru_cache
+
+from .gemini_utils import NIFTY_SECTORS_QUERY_CONFIG
+
+logger = logging.getLogger(__name__)
+
+# Points awarded by EntityMatcher.score_relevance(); the score is clamped to [0, 1].
+RELEVANCE_WEIGHTS = {
+    'title_name': 0.6,      # Entity name or a proper-name alias in the title with its configured casing ("Indian Bank", "TCS", "State Bank of India")
+    'title_alias': 0.15,    # Any alias in the title, case-insensitive ("indian bank stocks")
+    'sector_title_alias': 0.4, # Sector keywords are broad phrases, so a title hit counts for more
+    'snippet_name': 0.25,
+    'snippet_alias': 0.1,
+    'url_slug': 0.25,
+    'market_wrap_penalty': -0.2,  # Generic wrap/live-blog title not naming the entity
+    'crowded_title_penalty': -0.15, # Title about several other stocks but not this one
+}
+MARKET_WRAP_PATTERN = re.compile(
+    r'\b(stock market today|markets? live|live updates|closing bell|opening bell|stocks to (?:buy|watch)|'
+    r'top (?:gainers|losers)|sensex|market wrap|trade setup|pre-market)\b', re.IGNORECASE)
+CROWDED_TITLE_MIN_OTHER_STOCKS = 3
+_NAME_CONNECTORS = {"of", "and", "&"}
+
+
+def _has_mixed_case(text):
+    """False for all-caps or all-lowercase text, where configured casing carries no signal."""
+    return any(ch.isupper() for ch in text) and any(ch.islower() for ch in text)
+
+
+def _is_proper_name(alias):
+    """Multi-word alias written as a name ("State Bank of India", "Kotak Bank"), not a topic phrase ("SBI loans")."""
+    words = alias.split()
+    return len(words) > 1 and all(word[0].isupper() or word in _NAME_CONNECTORS for word in words)
+
+
+def _slugify(text):
+    """'Tata Motors' -> 'tata-motors', matching how news sites build article URL slugs."""
+    return re.sub(r'[^a-z0-9]+', '-', text.lower()).strip('-')
+
+
+class EntityMatcher:
+    """
+    Matches free text (titles, snippets, URLs) against the stocks and sectors in
+    NIFTY_SECTORS_QUERY_CONFIG.
+
+    Stock aliases are the stock name plus its configured keywords; sector aliases are the
+    sector name plus its `newsapi_keywords`. URLs are matched via slugified aliases so
+    '/tata-motors-q1-results/' hits 'Tata Motors'.
+    """
+
+    def __init__(self, config=None):
+        config = config if config is not None else NIFTY_SECTORS_QUERY_CONFIG
+        self.stock_sectors = {} # stock_name -> [sector, ...] (a stock can sit in several indices)
+        self.aliases = {} # (item_type, item_name) -> [alias, ...]
+        for sector_name, sector_details in config.items():
+            self.aliases[("sector", sector_name)] = [sector_name] + list(sector_details.get("newsapi_keywords", []))
+            for stock_name, stock_keywords in sector_details.get("stocks", {}).items():
+                self.stock_sectors.setdefault(stock_name, []).append(sector_name)
+                if ("stock", stock_name) not in self.aliases:
+                    self.aliases[("stock", stock_name)] = [stock_name] + list(stock_keywords)
+
+        # One combined alternation per matching mode; each hit is mapped back to its entities.
+        self._alias_entities = {} # lowercased alias -> {entity_key, ...}
+        self._slug_entities = {} # alias slug -> {entity_key, ...}
+        for entity_key, alias_list in self.aliases.items():
+            for alias in alias_list:
+                if not alias or not alias.strip():
+                    continue
+                self._alias_entities.setdefault(alias.strip().lower(), set()).add(entity_key)
+                slug = _slugify(alias)
+                if slug:
+                    self._slug_entities.setdefault(slug, set()).add(entity_key)
+        self._text_pattern = re.compile(
+            r'(?<![\w])(' + '|'.join(re.escape(a) for a in sorted(self._alias_entities, key=len, reverse=True)) + r')(?![\w])',
+            re.IGNORECASE)
+        self._slug_pattern = re.compile(
+            r'(?<![a-z0-9])(' + '|'.join(re.escape(sl) for sl in sorted(self._slug_entities, key=len, reverse=True)) + r')(?![a-z0-9])')
+
+        self._target_patterns_cache = {} # entity_key -> (exact name pattern, case-insensitive name pattern, case-insensitive alias pattern)
+
+    def sectors_for_stock(self, stock_name):
+        return self.stock_sectors.get(stock_name, [])
+
+    def find_aliases(self, text="", url=""):
+        """Returns {entity_key: {alias, ...}} for every alias found in `text` or in the slug of `url`."""
+        hits = {}
+        if text:
+            for alias in self._text_pattern.findall(text):
+                for entity_key in self._alias_entities[alias.lower()]:
+                    hits.setdefault(entity_key, set()).add(alias.lower())
+        if url:
+            for slug in self._slug_pattern.findall(url.lower()):
+                for entity_key in self._slug_entities[slug]:
+                    hits.setdefault(entity_key, set()).add(slug)
+        return hits
+
+    def match(self, text="", url="", item_types=("stock", "sector")):
+        """
+        Returns [{'item_type', 'item_name', 'sector_context', 'aliases'}] for every entity
+        mentioned in `text` or the `url`, stocks before sectors.
+        """
+        hits = self.find_aliases(text, url)
+        matches = []
+        for item_type in item_types:
+            for (hit_type, item_name), found in hits.items():
+                if hit_type != item_type:
+                    continue
+                sector_context = item_name if item_type == "sector" else self.stock_sectors[item_name][0]
+                matches.append({'item_type': item_type, 'item_name': item_name,
+                                'sector_context': sector_context, 'aliases': sorted(found)})
+        return matches
+
+    def _target_patterns(self, entity_key):
+        if entity_key not in self._target_patterns_cache:
+            names = [entity_key[1]]
+            if entity_key[0] == "stock": # Sector keywords name other entities ("State Bank of India" for PSU banks)
+                names += [a.strip() for a in self.aliases[entity_key][1:] if _is_proper_name(a.strip())]
+            name_alternation = '|'.join(re.escape(n) for n in sorted(set(names), key=len, reverse=True))
+            alias_alternation = '|'.join(re.escape(a.strip()) for a in sorted(self.aliases[entity_key], key=len, reverse=True) if a.strip())
+            self._target_patterns_cache[entity_key] = (
+                re.compile(r'(?<![\w])(?:' + name_alternation + r')(?![\w])'),
+                re.compile(r'(?<![\w])(?:' + name_alternation + r')(?![\w])', re.IGNORECASE),
+                re.compile(r'(?<![\w])(?:' + alias_alternation + r')(?![\w])', re.IGNORECASE),
+            )
+        return self._target_patterns_cache[entity_key]
+
+    def score_relevance(self, item_type, item_name, title="", snippet="", url=""):
+        """
+        Scores a search result (title, snippet, URL) for the queried stock/sector, 0.0-1.0.
+        Returns None when there is no title or snippet to judge, so callers don't skip blindly.
+
+        The name, or a multi-word proper-name alias, with its configured casing weighs most:
+        "Indian Bank Q2 results" and "State Bank of India Q2 profit jumps" score high,
+        "Indian bank stocks rally" only gets the weak case-insensitive alias credit.
+        All-caps or all-lowercase text has no casing to check, so there the name matches in any case.
+        Market wraps and titles about several other stocks are penalised.
+        """
+        if not (title or snippet):
+            return None
+        entity_key = (item_type, item_name)
+        if entity_key not in self.aliases:
+            return None
+        name_pattern, name_pattern_any_case, alias_pattern = self._target_patterns(entity_key)
+        weights = RELEVANCE_WEIGHTS
+        score = 0.0
+
+        def has_name(text): # Casing only counts when the text has any (not an all-caps/lowercase SERP title)
+            return bool(text) and bool((name_pattern if _has_mixed_case(text) else name_pattern_any_case).search(text))
+
+        name_in_title = has_name(title)
+        alias_in_title = name_in_title or bool(title and alias_pattern.search(title))
+        if name_in_title:
+            score += weights['title_name']
+        elif alias_in_title:
+            score += weights['sector_title_alias'] if item_type == "sector" else weights['title_alias']
+
+        if has_name(snippet):
+            score += weights['snippet_name']
+        elif snippet and alias_pattern.search(snippet):
+            score += weights['snippet_alias']
+
+        # Slugs are usually the lowercased title, so they only add evidence when the (possibly truncated) title has none.
+        if url and not alias_in_title and entity_key in self.find_aliases(url=url):
+            score += weights['url_slug']
+
+        if item_type == "stock" and title and not name_in_title:
+            if MARKET_WRAP_PATTERN.search(title):
+                score += weights['market_wrap_penalty']
+            title_entities = self.find_aliases(text=title)
+            other_stocks = [key for key in title_entities if key[0] == "stock" and key != entity_key]
+            if entity_key not in title_entities and len(other_stocks) >= CROWDED_TITLE_MIN_OTHER_STOCKS:
+                score += weights['crowded_title_penalty']
+
+        return round(min(1.0, max(0.0, score)), 3)
+
+
+@lru_cache(maxsize=1)
+def get_entity_matcher():
+    """Shared matcher built from the default config (regex compilation is done once per process)."""
+    return EntityMatcher()
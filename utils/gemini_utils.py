@@ -1,10 +1,20 @@
 # utils/gemini_utils.py
 import google.generativeai as genai
+import copy
+import hashlib
 import json
 import logging
+import os
+
+from .context_packing import ARTICLE_SEPARATOR, LLM_CONTEXT_TOKEN_BUDGET, pack_articles
 
 logger = logging.getLogger(__name__)
 
+GEMINI_MODEL_NAME = os.environ.get("GEMINI_MODEL_NAME", "gemini-1.5-flash-latest")
+GEMINI_BATCH_MAX_ENTITIES = int(os.environ.get("GEMINI_BATCH_MAX_ENTITIES", 5)) # Entities per batched prompt (bounded by response length)
+# Bump whenever the analysis prompt template below changes, so stored analyses are not mixed across prompt versions
+ANALYSIS_PROMPT_VERSION = "2" # 2: articles condensed by utils/context_packing.py
+
 # YOUR PROVIDED NIFTY_SECTORS_QUERY_CONFIG (incorporating stock details)
 NIFTY_SECTORS_QUERY_CONFIG = {
     "Nifty IT": {
@@ -578,64 +588,153 @@ NEWSAPI_INDIA_MARKET_KEYWORDS = ["India", "Indian market", "NSE", "BSE", "Indian
 # The `analysis_target_name` will be the stock's name when called for a stock.
 # The prompt's reference to '{analysis_target_name}' will then correctly refer to the stock.
 
-def analyze_news_with_gemini(
-    _api_key, articles_texts_list, analysis_target_name, date_range_str,
-    custom_instructions="", append_log_func=None, target_type="sector" # New parameter
-):
-    log_msg_prefix = f"[Gemini][{analysis_target_name}]"
-    
+SENTIMENT_LABELS = ("Strongly Positive", "Positive", "Neutral", "Negative", "Strongly Negative")
+DEFAULT_RESPONSE_STRUCTURE = { "summary": "N/A", "overall_sentiment": "Neutral", "sentiment_score_llm": 0.0, "sentiment_reason": "N/A", "key_themes": [], "potential_impact": "N/A", "key_companies_mentioned_context": [], "risks_identified": [], "opportunities_identified": []}
+
+LIST_KEYS_ALLOWING_TEXT = ("key_themes",) # The prompt allows "N/A due to lack of relevant news" instead of a list
+
+def analysis_prompt_hash(target_type, custom_instructions="", batched=False):
+    """SHA-256 fingerprint of everything in the prompt except the articles, target name and dates (llm_analyses.prompt_hash)."""
+    parts = [ANALYSIS_PROMPT_VERSION, target_type, (custom_instructions or "").strip()]
+    if batched: # Multi-entity prompt (analyze_entities_batch_with_gemini)
+        parts.append("batch")
+    fingerprint = json.dumps(parts)
+    return hashlib.sha256(fingerprint.encode("utf-8")).hexdigest()
+
+def _make_log(log_msg_prefix, append_log_func):
     def _log(message, level='info'):
         full_message = f"{log_msg_prefix} {message}"
         if level == 'error': logger.error(full_message)
         elif level == 'warning': logger.warning(full_message)
         else: logger.info(full_message)
         if append_log_func: append_log_func(message, level.upper())
+    return _log
 
-    _log(f"Starting analysis for {target_type} '{analysis_target_name}' with {len(articles_texts_list)} articles for dates {date_range_str}.")
-
+def _configure_gemini(_api_key, _log):
+    """Returns an error message, or None once the client is configured."""
     if not _api_key or _api_key == "YOUR_GEMINI_API_KEY_HERE":
         err_msg = "Gemini API Key not provided or is a placeholder."
         _log(err_msg, 'error')
-        return None, err_msg
-
+        return err_msg
     try:
         genai.configure(api_key=_api_key)
     except Exception as e:
         err_msg = f"Failed to configure Gemini API: {str(e)[:150]}"
         _log(err_msg, 'error')
-        return None, err_msg
-
-    MAX_TOTAL_CHARS_FOR_LLM = 25000 
-    truncated_articles_texts_list = []; current_chars = 0; num_original_articles = len(articles_texts_list)
-    for text in articles_texts_list:
-        if current_chars + len(text) > MAX_TOTAL_CHARS_FOR_LLM and truncated_articles_texts_list: break
-        text_to_add = text[:MAX_TOTAL_CHARS_FOR_LLM - current_chars]
-        truncated_articles_texts_list.append(text_to_add); current_chars += len(text_to_add)
-        if current_chars >= MAX_TOTAL_CHARS_FOR_LLM: break
-    
-    if len(truncated_articles_texts_list) < num_original_articles:
-        warn_msg = f"Truncated input for '{analysis_target_name}': {num_original_articles} to {len(truncated_articles_texts_list)} articles ({current_chars} chars)."
-        _log(warn_msg, 'warning')
+        return err_msg
+    return None
+
+def _response_keys_instructions(subject):
+    """The per-analysis JSON key specification, about `subject` (e.g. "'TCS'" or "that stock")."""
+    return f"""    - "summary": A concise 2-3 sentence summary of the key news and developments for {subject}. If no relevant news is found specific to {subject}, state that clearly.
+    - "overall_sentiment": Classify the overall sentiment FOR {subject}. Choose one: "Strongly Positive", "Positive", "Neutral", "Negative", "Strongly Negative". This should align with your "sentiment_score_llm".
+    - "sentiment_score_llm": A float value representing the sentiment FOR {subject}. Adhere to these ranges:
+        - Strongly Positive: 0.6 to 1.0
+        - Positive: 0.2 to 0.59
+        - Neutral: -0.19 to 0.19
+        - Negative: -0.59 to -0.2
+        - Strongly Negative: -1.0 to -0.6
+      GUIDANCE FOR NEUTRAL SCORES (apply this considering {subject}):
+      1. If the news contains a mix of positive and negative developments for {subject}, and they roughly balance out, assign a score near 0.0 (e.g., -0.05 to 0.05).
+      2. If the news is predominantly factual without clear positive or negative sentiment cues *directly impacting {subject}*, assign a score in the Neutral range.
+      3. If the news primarily concerns broader market/sector trends that only *indirectly* relate to {subject}, its specific sentiment is likely Neutral. However, if the *overall tone* of these indirect news items is slightly positive (e.g. general market optimism), you can use a score like 0.1 to 0.19 for {subject}. If the tone is slightly negative, use -0.1 to -0.19.
+      4. If there is truly no relevant information specific to {subject} or the information is entirely non-consequential, a score of 0.0 is appropriate.
+      Your score should reflect the *net sentiment impact on {subject}* based on the provided articles.
+    - "sentiment_reason": A brief 1-sentence explanation for the assigned sentiment and score for {subject}. If sentiment is Neutral due to indirect news or mixed signals, explain that.
+    - "key_themes": A list of 2-3 dominant themes emerging from the news concerning {subject}. If no relevant news, this can be an empty list or state "N/A due to lack of relevant news".
+    - "potential_impact": A 1-sentence assessment of the potential impact on {subject}. If no relevant news, state "N/A".
+    - "key_companies_mentioned_context": If analyzing a SECTOR, list key companies. If analyzing a specific STOCK ({subject}), this list can be broader entities or related companies mentioned. Provide brief context. Empty list if not applicable.
+    - "risks_identified": A list of 1-2 potential risks for {subject}. Each risk a short string. Empty list if none or no relevant news.
+    - "opportunities_identified": A list of 1-2 potential opportunities for {subject}. Each opportunity a short string. Empty list if none or no relevant news.
+
+"""
+
+def _no_content_response(analysis_target_name):
+    final_response = copy.deepcopy(DEFAULT_RESPONSE_STRUCTURE)
+    final_response["summary"] = f"No news content was available for LLM analysis for {analysis_target_name}."
+    final_response["sentiment_reason"] = "No articles available or all were empty/irrelevant for the LLM."
+    return final_response
+
+def _pack_for_prompt(articles_texts_list, analysis_target_name, relevance_keywords, token_budget, _log):
+    # Most relevant, de-duplicated sentences of every article within a token budget (utils/context_packing.py)
+    packed_articles_texts_list, packing_stats = pack_articles(
+        articles_texts_list, [analysis_target_name] + list(relevance_keywords or []), token_budget=token_budget)
+    _log(f"Packed {packing_stats['articles_packed']}/{packing_stats['articles_in']} articles into "
+         f"{packing_stats['sentences_packed']} sentences (~{packing_stats['estimated_tokens']} tokens, "
+         f"{packing_stats['packed_chars']}/{packing_stats['input_chars']} chars, {packing_stats['repeats_dropped']} repeats dropped).")
+    return ARTICLE_SEPARATOR.join(packed_articles_texts_list)
+
+def _generate_json(prompt, label, _log):
+    """Sends `prompt` and returns the parsed JSON object of the response (raises ValueError / JSONDecodeError)."""
+    model_name = GEMINI_MODEL_NAME
+    _log(f"Using Gemini model: {model_name} for {label}", 'info')
+    model = genai.GenerativeModel(model_name)
+    generation_config = genai.types.GenerationConfig(temperature=0.3)
+    response = model.generate_content(prompt, generation_config=generation_config)
     
-    combined_text = "\n\n--- ARTICLE SEPARATOR ---\n\n".join(truncated_articles_texts_list)
+    cleaned_response_text = ""
+    if hasattr(response, 'text') and response.text: cleaned_response_text = response.text.strip()
+    elif response.parts: cleaned_response_text = "".join(part.text for part in response.parts).strip()
+    else: 
+        _log(f"Gemini response for {label} is empty or in an unexpected format.", "error")
+        raise ValueError("Gemini response is empty or in an unexpected format.")
+
+    if cleaned_response_text.startswith("```json"): cleaned_response_text = cleaned_response_text[len("```json"):].strip()
+    if cleaned_response_text.endswith("```"): cleaned_response_text = cleaned_response_text[:-len("```")].strip()
     
-    default_response_structure = { "summary": "N/A", "overall_sentiment": "Neutral", "sentiment_score_llm": 0.0, "sentiment_reason": "N/A", "key_themes": [], "potential_impact": "N/A", "key_companies_mentioned_context": [], "risks_identified": [], "opportunities_identified": []}
+    json_start_index = cleaned_response_text.find('{'); json_end_index = cleaned_response_text.rfind('}')
+    if json_start_index != -1 and json_end_index != -1 and json_end_index > json_start_index:
+        cleaned_response_text = cleaned_response_text[json_start_index : json_end_index+1]
+    else: 
+        _log(f"Could not find valid JSON structure in response for {label}: '{cleaned_response_text[:200]}...'", 'error')
+        raise json.JSONDecodeError(f"Could not find valid JSON structure in response for {label}.", cleaned_response_text, 0)
 
-    if not combined_text.strip():
-        _log(f"No news content for LLM analysis for '{analysis_target_name}' after potential truncation.")
-        final_response = default_response_structure.copy()
-        final_response["summary"] = f"No news content was available for LLM analysis for {analysis_target_name}."
-        final_response["sentiment_reason"] = "No articles available or all were empty/irrelevant for the LLM."
-        return final_response, None
+    return json.loads(cleaned_response_text)
+
+def analysis_entry_problems(entry):
+    """Ways `entry` does not match DEFAULT_RESPONSE_STRUCTURE (missing keys, wrong types, score/label out of range); [] if valid."""
+    if not isinstance(entry, dict):
+        return ["not a JSON object"]
+    problems = []
+    for key, default_value in DEFAULT_RESPONSE_STRUCTURE.items():
+        value = entry.get(key)
+        if key not in entry:
+            problems.append(f"missing '{key}'")
+        elif isinstance(default_value, list) and not (isinstance(value, list) or (key in LIST_KEYS_ALLOWING_TEXT and isinstance(value, str))):
+            problems.append(f"'{key}' is not a list")
+        elif isinstance(default_value, float) and (isinstance(value, bool) or not isinstance(value, (float, int)) or not -1.0 <= value <= 1.0):
+            problems.append(f"'{key}' is not a number in [-1, 1]")
+        elif isinstance(default_value, str) and not isinstance(value, str):
+            problems.append(f"'{key}' is not a string")
+    if isinstance(entry.get("overall_sentiment"), str) and entry["overall_sentiment"] not in SENTIMENT_LABELS:
+        problems.append(f"unknown overall_sentiment '{entry['overall_sentiment']}'")
+    return problems
+
+def analyze_news_with_gemini(
+    _api_key, articles_texts_list, analysis_target_name, date_range_str,
+    custom_instructions="", append_log_func=None, target_type="sector", # New parameter
+    relevance_keywords=None, token_budget=LLM_CONTEXT_TOKEN_BUDGET
+):
+    log_msg_prefix = f"[Gemini][{analysis_target_name}]"
+    _log = _make_log(log_msg_prefix, append_log_func)
+
+    _log(f"Starting analysis for {target_type} '{analysis_target_name}' with {len(articles_texts_list)} articles for dates {date_range_str}.")
+
+    config_err = _configure_gemini(_api_key, _log)
+    if config_err:
+        return None, config_err
 
-    # Determine if we are analyzing a sector or a stock to tailor the prompt slightly
-    # The `analysis_target_name` will be the stock name if target_type is "stock"
-    # The prompt should inherently work, but we could add a specific instruction if needed.
-    # For now, relying on `analysis_target_name` to correctly scope the analysis.
+    combined_text = _pack_for_prompt(articles_texts_list, analysis_target_name, relevance_keywords, token_budget, _log)
+    default_response_structure = copy.deepcopy(DEFAULT_RESPONSE_STRUCTURE)
+
+    if not combined_text.strip():
+        _log(f"No news content for LLM analysis for '{analysis_target_name}' after context packing.")
+        return _no_content_response(analysis_target_name), None
 
+    response_keys = _response_keys_instructions(f"'{analysis_target_name}'")
     prompt = f"""
     Analyze the following news articles concerning '{analysis_target_name}' (which is a {target_type}) in the Indian market, from the period '{date_range_str}'.
-    Articles are concatenated and separated by '--- ARTICLE SEPARATOR ---'.
+    Each article has been condensed to its sentences most relevant to '{analysis_target_name}' (in original order); articles are separated by '--- ARTICLE SEPARATOR ---'.
 
     --- NEWS CONTENT START ---
     {combined_text}
@@ -644,54 +743,10 @@ def analyze_news_with_gemini(
     {custom_instructions if custom_instructions else f"Focus on financial and market implications specifically for '{analysis_target_name}'. Be concise and objective."}
 
     Your task is to provide a structured analysis in JSON format. The JSON object must include the following keys:
-    - "summary": A concise 2-3 sentence summary of the key news and developments for '{analysis_target_name}'. If no relevant news is found specific to '{analysis_target_name}', state that clearly.
-    - "overall_sentiment": Classify the overall sentiment FOR '{analysis_target_name}'. Choose one: "Strongly Positive", "Positive", "Neutral", "Negative", "Strongly Negative". This should align with your "sentiment_score_llm".
-    - "sentiment_score_llm": A float value representing the sentiment FOR '{analysis_target_name}'. Adhere to these ranges:
-        - Strongly Positive: 0.6 to 1.0
-        - Positive: 0.2 to 0.59
-        - Neutral: -0.19 to 0.19
-        - Negative: -0.59 to -0.2
-        - Strongly Negative: -1.0 to -0.6
-      GUIDANCE FOR NEUTRAL SCORES (apply this considering '{analysis_target_name}'):
-      1. If the news contains a mix of positive and negative developments for '{analysis_target_name}', and they roughly balance out, assign a score near 0.0 (e.g., -0.05 to 0.05).
-      2. If the news is predominantly factual without clear positive or negative sentiment cues *directly impacting '{analysis_target_name}'*, assign a score in the Neutral range.
-      3. If the news primarily concerns broader market/sector trends that only *indirectly* relate to '{analysis_target_name}', its specific sentiment is likely Neutral. However, if the *overall tone* of these indirect news items is slightly positive (e.g. general market optimism), you can use a score like 0.1 to 0.19 for '{analysis_target_name}'. If the tone is slightly negative, use -0.1 to -0.19.
-      4. If there is truly no relevant information specific to '{analysis_target_name}' or the information is entirely non-consequential, a score of 0.0 is appropriate.
-      Your score should reflect the *net sentiment impact on '{analysis_target_name}'* based on the provided articles.
-    - "sentiment_reason": A brief 1-sentence explanation for the assigned sentiment and score for '{analysis_target_name}'. If sentiment is Neutral due to indirect news or mixed signals, explain that.
-    - "key_themes": A list of 2-3 dominant themes emerging from the news concerning '{analysis_target_name}'. If no relevant news, this can be an empty list or state "N/A due to lack of relevant news".
-    - "potential_impact": A 1-sentence assessment of the potential impact on '{analysis_target_name}'. If no relevant news, state "N/A".
-    - "key_companies_mentioned_context": If analyzing a SECTOR, list key companies. If analyzing a specific STOCK ('{analysis_target_name}'), this list can be broader entities or related companies mentioned. Provide brief context. Empty list if not applicable.
-    - "risks_identified": A list of 1-2 potential risks for '{analysis_target_name}'. Each risk a short string. Empty list if none or no relevant news.
-    - "opportunities_identified": A list of 1-2 potential opportunities for '{analysis_target_name}'. Each opportunity a short string. Empty list if none or no relevant news.
-
-    Ensure the output is ONLY the JSON object, without any preceding or succeeding text, and no markdown formatting for the JSON block itself.
+{response_keys}    Ensure the output is ONLY the JSON object, without any preceding or succeeding text, and no markdown formatting for the JSON block itself.
     """
     try:
-        model_name = 'gemini-1.5-flash-latest'
-        _log(f"Using Gemini model: {model_name} for '{analysis_target_name}'", 'info')
-        model = genai.GenerativeModel(model_name)
-        generation_config = genai.types.GenerationConfig(temperature=0.3)
-        response = model.generate_content(prompt, generation_config=generation_config)
-        
-        cleaned_response_text = ""
-        if hasattr(response, 'text') and response.text: cleaned_response_text = response.text.strip()
-        elif response.parts: cleaned_response_text = "".join(part.text for part in response.parts).strip()
-        else: 
-            _log(f"Gemini response for '{analysis_target_name}' is empty or in an unexpected format.", "error")
-            raise ValueError("Gemini response is empty or in an unexpected format.")
-
-        if cleaned_response_text.startswith("```json"): cleaned_response_text = cleaned_response_text[len("```json"):].strip()
-        if cleaned_response_text.endswith("```"): cleaned_response_text = cleaned_response_text[:-len("```")].strip()
-        
-        json_start_index = cleaned_response_text.find('{'); json_end_index = cleaned_response_text.rfind('}')
-        if json_start_index != -1 and json_end_index != -1 and json_end_index > json_start_index:
-            cleaned_response_text = cleaned_response_text[json_start_index : json_end_index+1]
-        else: 
-            _log(f"Could not find valid JSON structure in response for '{analysis_target_name}': '{cleaned_response_text[:200]}...'", 'error')
-            raise json.JSONDecodeError(f"Could not find valid JSON structure in response for {analysis_target_name}.", cleaned_response_text, 0)
-
-        result = json.loads(cleaned_response_text)
+        result = _generate_json(prompt, f"'{analysis_target_name}'", _log)
         
         for key, default_value in default_response_structure.items():
             if key not in result:
@@ -708,7 +763,7 @@ def analyze_news_with_gemini(
         return result, None
 
     except json.JSONDecodeError as e:
-        err_msg = f"Gemini JSON Decode Error for '{analysis_target_name}': {str(e)[:150]}. Response: '{cleaned_response_text[:200]}...'"
+        err_msg = f"Gemini JSON Decode Error for '{analysis_target_name}': {str(e)[:150]}. Response: '{(e.doc or '')[:200]}...'"
         _log(err_msg, 'error')
         return None, f"Gemini returned an invalid JSON for {analysis_target_name}. Please check server logs."
     except Exception as e:
@@ -717,4 +772,79 @@ def analyze_news_with_gemini(
         logger.exception(f"{log_msg_prefix} Full Gemini Exception for {analysis_target_name}") 
         return None, f"Error during Gemini analysis for {analysis_target_name}: {str(e)[:100]}"
 
+def _batch_prompt(entity_names, packed_texts, date_range_str, custom_instructions, target_type):
+    sections = "\n\n".join(f"=== {name} ===\n{packed_texts[name]}" for name in entity_names)
+    response_keys = _response_keys_instructions(f"that {target_type}")
+    return f"""
+    Analyze the following news articles for each of these {target_type}s in the Indian market, from the period '{date_range_str}': {", ".join(entity_names)}.
+    The news for each {target_type} is in its own section headed '=== <name> ==='. Each article has been condensed to its sentences most relevant to that {target_type} (in original order); articles are separated by '--- ARTICLE SEPARATOR ---'. Analyze each {target_type} only from its own section.
+
+    --- NEWS CONTENT START ---
+    {sections}
+    --- NEWS CONTENT END ---
+
+    {custom_instructions if custom_instructions else f"Focus on financial and market implications specifically for each {target_type}. Be concise and objective."}
+
+    Your task is to provide a structured analysis in JSON format. Return ONE JSON object whose keys are exactly these {target_type} names: {json.dumps(list(entity_names))}. The value for each name must be a JSON object with the following keys, about that {target_type}:
+{response_keys}    Ensure the output is ONLY the JSON object, without any preceding or succeeding text, and no markdown formatting for the JSON block itself.
+    """
+
+def analyze_entities_batch_with_gemini(
+    _api_key, entity_articles, date_range_str, custom_instructions="", append_log_func=None, target_type="stock",
+    token_budget=LLM_CONTEXT_TOKEN_BUDGET, max_entities_per_call=GEMINI_BATCH_MAX_ENTITIES
+):
+    """
+    Analyses several entities with one Gemini call per group of `max_entities_per_call`, asking for a JSON object keyed
+    by entity name. `entity_articles` is {entity_name: (article texts, relevance keywords)}. Entries that are missing or
+    fail analysis_entry_problems() are retried one by one with analyze_news_with_gemini().
+    Returns {entity_name: (result, error, batched)} in input order; `batched` is False for fallback/single results.
+    """
+    _log = _make_log("[Gemini][batch]", append_log_func)
+    config_err = _configure_gemini(_api_key, _log)
+    if config_err:
+        return {name: (None, config_err, False) for name in entity_articles}
+
+    outcomes, packed_texts = {}, {}
+    for name, (texts, keywords) in entity_articles.items():
+        combined_text = _pack_for_prompt(texts, name, keywords, token_budget, _make_log(f"[Gemini][{name}]", append_log_func))
+        if combined_text.strip():
+            packed_texts[name] = combined_text
+        else:
+            outcomes[name] = (_no_content_response(name), None, False)
+
+    names = list(packed_texts)
+    group_size = max(1, max_entities_per_call)
+    fallback = []
+    for group_start in range(0, len(names), group_size):
+        group = names[group_start:group_start + group_size]
+        if len(group) == 1: # Nothing to share; use the regular prompt
+            fallback.extend(group)
+            continue
+        _log(f"Analyzing {len(group)} {target_type}s in one request: {', '.join(group)}.")
+        try:
+            response = _generate_json(_batch_prompt(group, packed_texts, date_range_str, custom_instructions, target_type),
+                                      f"{len(group)} {target_type}s", _log)
+        except Exception as e:
+            _log(f"Batched request for {', '.join(group)} failed: {str(e)[:150]}. Falling back to one request per {target_type}.", 'warning')
+            fallback.extend(group)
+            continue
+        entries = {str(key).strip().lower(): value for key, value in response.items()} if isinstance(response, dict) else {}
+        for name in group:
+            entry = entries.get(name.strip().lower())
+            problems = analysis_entry_problems(entry) if entry is not None else ["no entry in the response"]
+            if problems:
+                _log(f"Batched entry for '{name}' rejected ({'; '.join(problems[:3])}). Falling back to a single request.", 'warning')
+                fallback.append(name)
+            else:
+                outcomes[name] = (entry, None, True)
+
+    for name in fallback:
+        texts, keywords = entity_articles[name]
+        result, error = analyze_news_with_gemini(_api_key, texts, name, date_range_str, custom_instructions,
+                                                 append_log_func, target_type=target_type, relevance_keywords=keywords,
+                                                 token_budget=token_budget)
+        outcomes[name] = (result, error, False)
+    _log(f"Analyzed {len(entity_articles)} {target_type}s with {len(names) - len(fallback)} batched and {len(fallback)} single results.")
+    return {name: outcomes[name] for name in entity_articles}
+
 NEWSAPI_INDIA_MARKET_KEYWORDS = ["India", "Indian market", "NSE", "BSE", "Indian economy"]
\ No newline at end of file
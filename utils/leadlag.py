@@ -0,0 +1,260 @@
+# utils/leadlag.py
+"""
+Lead/lag statistics between daily stock sentiment and stock returns, for every stock in
+NIFTY_SECTORS_QUERY_CONFIG at once (inputs come from utils/backtest.load_backtest_data).
+
+Alignment follows the backtester: the sentiment for trading day t is the count-weighted mean
+of news dated (UTC) from the previous trading day up to the day before t, i.e. what is known
+at t's close. At lag k, corr(sentiment[t], return[t + k]) is measured, where return[t] is
+close(t-1) -> close(t). So k > 0 means sentiment leads returns (k = 1 is the backtest's
+tradeable signal), and k < 0 means returns lead sentiment.
+
+Cross-correlations and rolling correlations are masked NumPy reductions over the whole
+(stocks x trading days) matrix. Granger tests use statsmodels one stock at a time. Sector rows
+average their stocks' correlations in Fisher-z space. get_lead_lag() caches results per window
+until the window's sentiment aggregates change or LEADLAG_CACHE_SECONDS pass.
+"""
+import logging
+import os
+import threading
+import time
+import warnings
+from collections import OrderedDict
+from datetime import timedelta
+
+import numpy as np
+from sqlalchemy import func
+
+from .backtest import MAX_LOOKBACK_DAYS, load_backtest_data
+from .database_models import DailyEntitySentiment
+from .gemini_utils import NIFTY_SECTORS_QUERY_CONFIG
+from .price_store import nse_symbol
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_LAG_DAYS = 5
+MAX_LAG_DAYS = 20
+DEFAULT_ROLLING_WINDOW_DAYS = 60 # Trading days
+DEFAULT_ROLLING_LAG_DAYS = 1
+MIN_OBSERVATIONS = 20 # Paired days needed before a correlation or Granger test is reported
+SCORES = ('vader', 'llm')
+LEADLAG_CACHE_SECONDS = int(os.environ.get("LEADLAG_CACHE_SECONDS", 900))
+LEADLAG_CACHE_MAX_ENTRIES = 32
+_FISHER_CLIP = 0.999999
+
+_cache = OrderedDict() # key -> (stored_at, data fingerprint, payload)
+_cache_lock = threading.Lock()
+
+
+def trading_day_sentiment(sums, counts, trade_day_index):
+    """
+    (mean, scored_count) matrices on the trading-day axis from calendar-day sum/count matrices: each trading day
+    collects the calendar days from the previous trading day up to (excluding) its own date.
+    """
+    cumulative_sums = np.concatenate([np.zeros((sums.shape[0], 1)), np.cumsum(sums, axis=1)], axis=1)
+    cumulative_counts = np.concatenate([np.zeros((counts.shape[0], 1)), np.cumsum(counts, axis=1)], axis=1)
+    end = trade_day_index
+    start = np.concatenate([[max(int(end[0]) - 1, 0)], end[:-1]]) if len(end) else end
+    day_sums = cumulative_sums[:, end] - cumulative_sums[:, start]
+    day_counts = cumulative_counts[:, end] - cumulative_counts[:, start]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(day_counts > 0, day_sums / np.where(day_counts > 0, day_counts, 1.0), np.nan), day_counts
+
+
+def daily_returns(closes):
+    """close(t-1) -> close(t) simple returns; NaN on the first day and wherever either close is missing."""
+    returns = np.full(closes.shape, np.nan)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        returns[:, 1:] = closes[:, 1:] / closes[:, :-1] - 1.0
+    returns[~np.isfinite(returns)] = np.nan
+    return returns
+
+
+def _lag_pair(x, y, lag):
+    """Column-aligned (x[t], y[t + lag]) views."""
+    n_days = x.shape[1]
+    if lag >= 0:
+        return x[:, :n_days - lag], y[:, lag:]
+    return x[:, -lag:], y[:, :n_days + lag]
+
+
+def _correlation_from_sums(n, sx, sy, sxx, syy, sxy, min_observations):
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cov = sxy - sx * sy / n
+        var_x = sxx - sx * sx / n
+        var_y = syy - sy * sy / n
+        corr = cov / np.sqrt(var_x * var_y)
+    return np.where((n >= min_observations) & (var_x > 0) & (var_y > 0), np.clip(corr, -1.0, 1.0), np.nan)
+
+
+def _masked_moments(x, y):
+    valid = np.isfinite(x) & np.isfinite(y)
+    x0, y0 = np.where(valid, x, 0.0), np.where(valid, y, 0.0)
+    return valid.astype(np.float64), x0, y0, x0 * x0, y0 * y0, x0 * y0
+
+
+def masked_correlation(x, y, min_observations=MIN_OBSERVATIONS):
+    """Row-wise Pearson correlation over columns where both x and y are finite, plus the paired-day counts."""
+    moments = [moment.sum(axis=1) for moment in _masked_moments(x, y)]
+    return _correlation_from_sums(*moments, min_observations), moments[0].astype(np.int64)
+
+
+def cross_correlations(sentiment, returns, max_lag, min_observations=MIN_OBSERVATIONS):
+    """(lags, correlations (n_stocks x n_lags), observations (n_stocks x n_lags)) for lags -max_lag..+max_lag."""
+    lags = np.arange(-max_lag, max_lag + 1)
+    correlations = np.full((sentiment.shape[0], len(lags)), np.nan)
+    observations = np.zeros((sentiment.shape[0], len(lags)), dtype=np.int64)
+    for column, lag in enumerate(lags):
+        if abs(lag) >= sentiment.shape[1]:
+            continue
+        correlations[:, column], observations[:, column] = masked_correlation(*_lag_pair(sentiment, returns, lag),
+                                                                             min_observations=min_observations)
+    return lags, correlations, observations
+
+
+def rolling_correlation(sentiment, returns, window, lag=DEFAULT_ROLLING_LAG_DAYS):
+    """
+    corr(sentiment[t - lag], return[t]) over the trailing `window` trading days ending at each t (n_stocks x n_days,
+    NaN for the first `lag` days and windows with fewer than half their days paired).
+    """
+    x, y = _lag_pair(sentiment, returns, lag)
+    windowed = []
+    for moment in _masked_moments(x, y):
+        cumulative = np.concatenate([np.zeros((moment.shape[0], 1)), np.cumsum(moment, axis=1)], axis=1)
+        end = np.arange(1, moment.shape[1] + 1)
+        windowed.append(cumulative[:, end] - cumulative[:, np.maximum(end - window, 0)])
+    result = np.full(sentiment.shape, np.nan)
+    result[:, lag:] = _correlation_from_sums(*windowed, max(3, window // 2))
+    return result
+
+
+def granger_pvalues(sentiment, returns, max_lag, min_observations=MIN_OBSERVATIONS):
+    """
+    Per stock, the smallest SSR F-test p-value (and its lag) over lags 1..max_lag for "sentiment Granger-causes
+    returns" and the reverse. Days with no news count as neutral (0) sentiment; days without a return are dropped.
+    None for stocks with too little data, or for every stock when statsmodels is unavailable.
+    """
+    try:
+        from statsmodels.tsa.stattools import grangercausalitytests
+    except ImportError:
+        logger.warning("[LeadLag] statsmodels is not installed; skipping Granger tests.")
+        return [None] * sentiment.shape[0]
+
+    def best_lag(frame):
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            results = grangercausalitytests(frame, maxlag=max_lag)
+        lag = min(results, key=lambda lag: results[lag][0]['ssr_ftest'][1])
+        return {'lag': int(lag), 'p_value': float(results[lag][0]['ssr_ftest'][1])}
+
+    outcomes = []
+    for stock_sentiment, stock_returns in zip(sentiment, returns):
+        has_return = np.isfinite(stock_returns)
+        x = np.nan_to_num(stock_sentiment[has_return], nan=0.0)
+        y = stock_returns[has_return]
+        if len(y) < min_observations + 3 * max_lag or np.count_nonzero(x) < min_observations or np.ptp(x) == 0:
+            outcomes.append(None)
+            continue
+        try:
+            outcomes.append({'sentiment_to_returns': best_lag(np.column_stack([y, x])),
+                             'returns_to_sentiment': best_lag(np.column_stack([x, y]))})
+        except Exception as e: # e.g. a singular design matrix for a near-constant series
+            logger.debug(f"[LeadLag] Granger test failed: {e}")
+            outcomes.append(None)
+    return outcomes
+
+
+def _mean_correlation(correlations):
+    """Fisher-z average over rows (axis 0), ignoring NaN; NaN where no row has a value."""
+    z = np.arctanh(np.clip(correlations, -_FISHER_CLIP, _FISHER_CLIP))
+    counts = np.isfinite(z).sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(counts > 0, np.tanh(np.nansum(z, axis=0) / np.maximum(counts, 1)), np.nan)
+
+
+def _json_values(values, decimals=4):
+    rounded = np.round(values, decimals)
+    return np.where(np.isnan(rounded), None, rounded).tolist()
+
+
+def compute_lead_lag(db, start_date, end_date, sectors=None, score="vader", max_lag=DEFAULT_MAX_LAG_DAYS,
+                     rolling_window=DEFAULT_ROLLING_WINDOW_DAYS, rolling_lag=DEFAULT_ROLLING_LAG_DAYS, granger=True):
+    """JSON-ready lead/lag statistics per sector (heatmap rows) and per stock over [start_date, end_date]."""
+    data = load_backtest_data(db, start_date, end_date, sectors=sectors)
+    sums, counts = (data.vader_sums, data.vader_counts) if score == 'vader' else (data.llm_sums, data.llm_counts)
+    sentiment, scored_counts = trading_day_sentiment(sums, counts, data.trade_day_index)
+    returns = daily_returns(data.closes)
+
+    lags, correlations, observations = cross_correlations(sentiment, returns, max_lag)
+    rolling = rolling_correlation(sentiment, returns, rolling_window, lag=rolling_lag)
+    granger_results = granger_pvalues(sentiment, returns, max_lag) if granger else [None] * len(data.symbols)
+
+    row_of_symbol = {symbol: row for row, symbol in enumerate(data.symbols)}
+    sector_payload, sectors_of_symbol = {}, {}
+    for sector_name, details in NIFTY_SECTORS_QUERY_CONFIG.items():
+        if sectors and sector_name not in sectors:
+            continue
+        rows = sorted({row_of_symbol[symbol] for symbol in map(nse_symbol, details.get("stocks", {})) if symbol in row_of_symbol})
+        for row in rows:
+            sectors_of_symbol.setdefault(data.symbols[row], []).append(sector_name)
+        sector_payload[sector_name] = {
+            'stock_count': len(rows),
+            'cross_correlation': _json_values(_mean_correlation(correlations[rows])) if rows else [None] * len(lags),
+            'rolling_correlation': _json_values(_mean_correlation(rolling[rows])) if rows else [None] * rolling.shape[1],
+        }
+
+    stock_payload = {}
+    for row, symbol in enumerate(data.symbols):
+        finite = np.isfinite(correlations[row])
+        peak = int(np.argmax(np.where(finite, np.abs(correlations[row]), -1.0))) if finite.any() else None
+        finite_rolling = rolling[row][np.isfinite(rolling[row])]
+        stock_payload[symbol] = {
+            'names': data.names[row], 'sectors': sectors_of_symbol.get(symbol, []),
+            'news_days': int(np.count_nonzero(scored_counts[row])),
+            'cross_correlation': _json_values(correlations[row]),
+            'observations': observations[row].tolist(),
+            'peak_lag': int(lags[peak]) if peak is not None else None,
+            'peak_correlation': round(float(correlations[row, peak]), 4) if peak is not None else None,
+            'latest_rolling_correlation': round(float(finite_rolling[-1]), 4) if finite_rolling.size else None,
+            'granger': granger_results[row],
+        }
+    return {
+        'score': score, 'lags': lags.tolist(), 'rolling_window': rolling_window, 'rolling_lag': rolling_lag,
+        'dates': np.datetime_as_string(data.trade_dates, unit="D").tolist(),
+        'sectors': sector_payload, 'stocks': stock_payload,
+    }
+
+
+def data_fingerprint(db, start_date, end_date):
+    """Changes whenever stock sentiment aggregates inside the window (plus the lookback) are written."""
+    article_total, last_update = db.query(
+        func.sum(DailyEntitySentiment.article_count), func.max(DailyEntitySentiment.updated_at)
+    ).filter(DailyEntitySentiment.entity_type == 'stock',
+             DailyEntitySentiment.day >= start_date - timedelta(days=MAX_LOOKBACK_DAYS + 1),
+             DailyEntitySentiment.day <= end_date).one()
+    return (article_total or 0, last_update.isoformat() if last_update else None)
+
+
+def get_lead_lag(db, start_date, end_date, sectors=None, score="vader", max_lag=DEFAULT_MAX_LAG_DAYS,
+                 rolling_window=DEFAULT_ROLLING_WINDOW_DAYS, rolling_lag=DEFAULT_ROLLING_LAG_DAYS, granger=True):
+    """compute_lead_lag() through the per-window cache; the payload's 'cached' says whether it was reused."""
+    key = (start_date, end_date, tuple(sorted(sectors)) if sectors else None, score, max_lag, rolling_window,
+           rolling_lag, bool(granger))
+    fingerprint = data_fingerprint(db, start_date, end_date)
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry and entry[1] == fingerprint and time.monotonic() - entry[0] < LEADLAG_CACHE_SECONDS:
+            _cache.move_to_end(key)
+            return dict(entry[2], cached=True)
+
+    started = time.perf_counter()
+    payload = compute_lead_lag(db, start_date, end_date, sectors=sectors, score=score, max_lag=max_lag,
+                               rolling_window=rolling_window, rolling_lag=rolling_lag, granger=granger)
+    logger.info(f"[LeadLag] Computed {len(payload['stocks'])} stocks ({start_date} to {end_date}, {score}) "
+                f"in {time.perf_counter() - started:.2f}s.")
+    with _cache_lock:
+        _cache[key] = (time.monotonic(), fingerprint, payload)
+        _cache.move_to_end(key)
+        while len(_cache) > LEADLAG_CACHE_MAX_ENTRIES:
+            _cache.popitem(last=False)
+    return dict(payload, cached=False)
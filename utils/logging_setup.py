@@ -0,0 +1,154 @@
+# utils/logging_setup.py
+"""
+Non-blocking logging shared by app.py, the bulk scraper and newsfetch_lib.
+
+Loggers only enqueue records (QueueHandler on the root logger); one background
+QueueListener thread does the console and file I/O, so request/worker threads
+never wait on disk. The log file rotates by size and rotated files are gzipped.
+DEBUG records from noisy loggers are sampled (1 in N kept) before they are queued.
+"""
+import atexit
+import gzip
+import logging
+import logging.handlers
+import os
+import queue
+import shutil
+import sys
+import threading
+
+LOG_MAX_BYTES = int(os.environ.get("LOG_MAX_BYTES", 10 * 1024 * 1024))
+LOG_BACKUP_COUNT = int(os.environ.get("LOG_BACKUP_COUNT", 5))
+LOG_QUEUE_SIZE = int(os.environ.get("LOG_QUEUE_SIZE", 10000)) # Beyond this, records are dropped rather than blocking callers
+# Share of DEBUG records kept per logger prefix (longest prefix wins); override with
+# LOG_DEBUG_SAMPLE_RATES="utils.newsfetch_lib=0.1,utils.db_crud=0.5"
+DEFAULT_DEBUG_SAMPLE_RATES = {
+    "utils.newsfetch_lib": 0.05, # Per-article handler chatter
+    "urllib3": 0.0,
+    "selenium": 0.0,
+}
+DEFAULT_LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - [%(filename)s:%(lineno)d] - %(message)s'
+
+_listener = None
+_setup_lock = threading.Lock()
+
+
+def _parse_sample_rates(spec):
+    rates = {}
+    for item in (spec or "").split(","):
+        if "=" in item:
+            name, rate = item.split("=", 1)
+            rates[name.strip()] = float(rate)
+    return rates
+
+
+class DebugSamplingFilter(logging.Filter):
+    """Keeps 1 in round(1/rate) DEBUG records per logger whose name matches a configured prefix."""
+
+    def __init__(self, sample_rates):
+        super().__init__()
+        self.sample_rates = dict(sample_rates)
+        self._counters = {}
+        self._resolved = {} # logger name -> keep-every-N (None = not sampled, 0 = drop all)
+        self._lock = threading.Lock()
+
+    def _keep_every(self, logger_name):
+        if logger_name not in self._resolved:
+            matches = [prefix for prefix in self.sample_rates if logger_name == prefix or logger_name.startswith(prefix + ".")]
+            if not matches:
+                self._resolved[logger_name] = None
+            else:
+                rate = self.sample_rates[max(matches, key=len)]
+                self._resolved[logger_name] = 0 if rate <= 0 else max(1, round(1 / min(rate, 1.0)))
+        return self._resolved[logger_name]
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG:
+            return True
+        with self._lock:
+            keep_every = self._keep_every(record.name)
+            if keep_every is None:
+                return True
+            if keep_every == 0:
+                return False
+            count = self._counters.get(record.name, 0)
+            self._counters[record.name] = count + 1
+        return count % keep_every == 0
+
+
+class GzipRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """RotatingFileHandler whose rotated backups are gzip-compressed (app.log.1.gz, ...)."""
+
+    def __init__(self, filename, max_bytes=LOG_MAX_BYTES, backup_count=LOG_BACKUP_COUNT, encoding="utf-8"):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding=encoding, delay=True)
+        self.namer = lambda name: f"{name}.gz"
+        self.rotator = self._gzip_rotator
+
+    @staticmethod
+    def _gzip_rotator(source, dest):
+        with open(source, "rb") as f_in, gzip.open(dest, "wb") as f_out:
+            shutil.copyfileobj(f_in, f_out)
+        os.remove(source)
+
+
+class _NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Drops (and counts) records when the queue is full instead of blocking the caller."""
+    dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _NonBlockingQueueHandler.dropped += 1
+
+
+def setup_queued_logging(log_file, level=logging.INFO, fmt=DEFAULT_LOG_FORMAT, console=True, sample_rates=None):
+    """
+    Routes all logging through a queue to a background writer (console + gzip-rotating `log_file`).
+    Replaces any handlers already on the root logger. Idempotent: later calls return the running listener.
+    """
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            return _listener
+        formatter = logging.Formatter(fmt)
+        handlers = []
+        if log_file:
+            os.makedirs(os.path.dirname(os.path.abspath(log_file)), exist_ok=True)
+            file_handler = GzipRotatingFileHandler(log_file)
+            file_handler.setFormatter(formatter)
+            handlers.append(file_handler)
+        if console:
+            stream_handler = logging.StreamHandler()
+            stream_handler.setFormatter(formatter)
+            handlers.append(stream_handler)
+
+        log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+        queue_handler = _NonBlockingQueueHandler(log_queue)
+        rates = dict(DEFAULT_DEBUG_SAMPLE_RATES, **(sample_rates or {}), **_parse_sample_rates(os.environ.get("LOG_DEBUG_SAMPLE_RATES")))
+        queue_handler.addFilter(DebugSamplingFilter(rates))
+
+        root_logger = logging.getLogger()
+        for existing_handler in list(root_logger.handlers):
+            root_logger.removeHandler(existing_handler)
+        root_logger.addHandler(queue_handler)
+        root_logger.setLevel(level)
+
+        _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        atexit.register(stop_queued_logging)
+        return _listener
+
+
+def stop_queued_logging():
+    """Flushes the queue and stops the writer thread (registered atexit)."""
+    global _listener
+    with _setup_lock:
+        if _listener is None:
+            return
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+        if _NonBlockingQueueHandler.dropped: # The writer is gone, so report directly
+            sys.stderr.write(f"[Logging] {_NonBlockingQueueHandler.dropped} log records dropped (queue full).\n")
@@ -0,0 +1,160 @@
+# utils/near_duplicates.py
+"""
+Near-duplicate clustering of scraped articles (syndicated PTI/Reuters copies with minor edits).
+
+Each article body is signed at ingest with a 64-bit SimHash over word 3-shingles. The
+signature is split into SIMHASH_BANDS 16-bit bands, which are indexed in
+article_simhash_bands. Two signatures within SIMHASH_MAX_DISTANCE bits (<= 3) must match
+exactly in at least one band, so candidates are found with indexed equality lookups. Each
+candidate, published within NEAR_DUPLICATE_WINDOW_DAYS, is then checked by Hamming distance.
+A new article joins the cluster of its closest match (cluster_id = id of the first-ingested
+copy); otherwise it starts its own cluster. Retrieval in db_crud returns one article per cluster,
+and daily_entity_sentiment counts one article per (cluster, entity, day).
+"""
+import argparse
+import hashlib
+import logging
+import os
+import re
+from datetime import timedelta
+
+import numpy as np
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import undefer_group
+
+from .database_models import ArticleSimhashBand, ScrapedArticle
+from .sentiment_aggregates import ArticleAggregateChanges, article_snapshot
+
+logger = logging.getLogger(__name__)
+
+SIMHASH_BITS = 64
+SIMHASH_BANDS = 4 # 16-bit bands; must exceed SIMHASH_MAX_DISTANCE for the pigeonhole guarantee
+SIMHASH_MAX_DISTANCE = int(os.environ.get("SIMHASH_MAX_DISTANCE", 3))
+if not 0 <= SIMHASH_MAX_DISTANCE < SIMHASH_BANDS:
+    raise ValueError(f"SIMHASH_MAX_DISTANCE must be between 0 and {SIMHASH_BANDS - 1} (SIMHASH_BANDS - 1); "
+                     f"band lookups would miss matches at {SIMHASH_MAX_DISTANCE} bits.")
+SIMHASH_MIN_TOKENS = 30 # Shorter texts (headline-only pages) are not signed
+SHINGLE_SIZE = 3
+NEAR_DUPLICATE_WINDOW_DAYS = int(os.environ.get("NEAR_DUPLICATE_WINDOW_DAYS", 7))
+BACKFILL_BATCH_SIZE = 500
+_BAND_BITS = SIMHASH_BITS // SIMHASH_BANDS
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def simhash(text):
+    """Signed 64-bit SimHash of `text`'s word shingles (fits a BIGINT column), or None if the text is too short."""
+    tokens = _TOKEN_RE.findall((text or "").lower())
+    if len(tokens) < SIMHASH_MIN_TOKENS:
+        return None
+    shingles = {}
+    for start in range(len(tokens) - SHINGLE_SIZE + 1):
+        shingle = " ".join(tokens[start:start + SHINGLE_SIZE])
+        shingles[shingle] = shingles.get(shingle, 0) + 1
+    digests = b"".join(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest() for shingle in shingles)
+    bits = np.unpackbits(np.frombuffer(digests, dtype=np.uint8)).reshape(len(shingles), SIMHASH_BITS)
+    weights = np.fromiter(shingles.values(), dtype=np.float64, count=len(shingles))
+    votes = weights @ (bits.astype(np.float64) * 2.0 - 1.0) # Frequency-weighted +1/-1 per bit
+    value = int.from_bytes(np.packbits(votes > 0).tobytes(), "big")
+    return value - (1 << SIMHASH_BITS) if value >= 1 << (SIMHASH_BITS - 1) else value
+
+
+def hamming_distance(first, second):
+    return ((first ^ second) & ((1 << SIMHASH_BITS) - 1)).bit_count()
+
+
+def band_buckets(signature):
+    """[(band, bucket)] of a signature, bucket being that band's 16 bits."""
+    unsigned = signature & ((1 << SIMHASH_BITS) - 1)
+    mask = (1 << _BAND_BITS) - 1
+    return [(band, (unsigned >> (band * _BAND_BITS)) & mask) for band in range(SIMHASH_BANDS)]
+
+
+def _article_text(article):
+    return article.article_text or article.headline or ""
+
+
+def _closest_cluster(db, article, signature):
+    """cluster_id of the closest already-indexed article within SIMHASH_MAX_DISTANCE, or None."""
+    band_match = or_(*[and_(ArticleSimhashBand.band == band, ArticleSimhashBand.bucket == bucket)
+                       for band, bucket in band_buckets(signature)])
+    query = db.query(ScrapedArticle.id, ScrapedArticle.simhash, ScrapedArticle.cluster_id).join(
+        ArticleSimhashBand, ArticleSimhashBand.article_id == ScrapedArticle.id
+    ).filter(band_match, ScrapedArticle.id != article.id)
+    if article.publication_date:
+        window = timedelta(days=NEAR_DUPLICATE_WINDOW_DAYS)
+        query = query.filter(ScrapedArticle.publication_date >= article.publication_date - window,
+                             ScrapedArticle.publication_date <= article.publication_date + window)
+    best = None
+    for candidate_id, candidate_hash, candidate_cluster in query.distinct().all():
+        distance = hamming_distance(signature, candidate_hash)
+        if distance <= SIMHASH_MAX_DISTANCE and (best is None or (distance, candidate_id) < best[:2]):
+            best = (distance, candidate_id, candidate_cluster or candidate_id)
+    return best[2] if best else None
+
+
+def assign_clusters(db, articles):
+    """
+    Signs `articles` (ORM rows with their body loaded), (re)writes their band rows and gives each one without a
+    cluster its closest match's cluster_id, or its own id. Flushes but does not commit: call before the commit
+    that saves the articles. Articles are processed in order, so copies within one batch cluster together.
+    """
+    for article in articles:
+        if article.id is None:
+            db.flush() # Band rows and own-id clusters need the primary key
+        article.simhash = simhash(_article_text(article))
+        db.query(ArticleSimhashBand).filter(ArticleSimhashBand.article_id == article.id).delete(synchronize_session=False)
+        if article.simhash is None:
+            article.cluster_id = article.cluster_id or article.id
+            continue
+        if article.cluster_id is None:
+            article.cluster_id = _closest_cluster(db, article, article.simhash) or article.id
+        db.add_all([ArticleSimhashBand(band=band, bucket=bucket, article_id=article.id)
+                    for band, bucket in band_buckets(article.simhash)])
+        db.flush()
+        if article.cluster_id != article.id:
+            logger.debug(f"[NearDup] Article {article.id} is a near-duplicate of cluster {article.cluster_id}.")
+
+
+def backfill_clusters(db, batch_size=BACKFILL_BATCH_SIZE):
+    """
+    Signs and clusters every article that has no cluster yet (oldest id first); commits per batch together with
+    the daily aggregate cells of articles that turned out to be copies.
+    """
+    processed, last_id = 0, 0
+    while True:
+        batch = db.query(ScrapedArticle).options(undefer_group("body")).filter(
+            ScrapedArticle.cluster_id == None, ScrapedArticle.id > last_id
+        ).order_by(ScrapedArticle.id).limit(batch_size).all()
+        if not batch:
+            break
+        try:
+            before = [article_snapshot(article) for article in batch]
+            assign_clusters(db, batch)
+            aggregate_changes = ArticleAggregateChanges()
+            for snapshot, article in zip(before, batch):
+                aggregate_changes.add(snapshot, article_snapshot(article))
+            aggregate_changes.apply(db)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"[NearDup] Error clustering articles after id {last_id}: {e}")
+            break
+        processed += len(batch)
+        last_id = batch[-1].id
+        logger.info(f"[NearDup] Clustered {processed} articles so far.")
+    return processed
+
+
+if __name__ == "__main__":
+    from .database_models import SessionLocal, create_db_and_tables
+
+    parser = argparse.ArgumentParser(description="Sign and cluster scraped articles that have no near-duplicate cluster yet.")
+    parser.add_argument("--batch-size", type=int, default=BACKFILL_BATCH_SIZE)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    create_db_and_tables()
+    session = SessionLocal()
+    try:
+        print(f"Clustered {backfill_clusters(session, args.batch_size)} articles.")
+    finally:
+        session.close()
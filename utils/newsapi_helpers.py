@@ -4,6 +4,7 @@ from newsapi import NewsApiClient
 import time
 # from datetime import timedelta # Not directly used here but often useful with dates
 from .sentiment_analyzer import get_vader_sentiment_score 
+from .newsfetch_lib.http_client import get_http_client
 
 logger = logging.getLogger(__name__) # Ensures it uses the app's logger config
 
@@ -23,7 +24,9 @@ def get_newsapi_org_client(api_key, append_log_func=None):
         _log_relay(msg, 'warning')
         return None, msg
     try:
-        client = NewsApiClient(api_key=api_key)
+        # NewsApiClient only needs .get(url, auth=, timeout=, params=) from its session,
+        # which the shared httpx client provides, so NewsAPI calls reuse the same pool.
+        client = NewsApiClient(api_key=api_key, session=get_http_client())
         _log_relay("NewsAPI.org client initialized successfully.")
         return client, None
     except Exception as e:
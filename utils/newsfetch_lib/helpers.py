@@ -1,13 +1,16 @@
+import logging
 import re
 from collections import Counter
 
 from unidecode import unidecode
 
+logger = logging.getLogger("utils.newsfetch_lib.helpers")
+
 
 def unicode(text: str) -> str:
     # Add a check for None in unicode as well, as it's called by headline property too
     if text is None:
-        print("[helpers.py DEBUG] unicode received None, returning empty string.") # DEBUG
+        logger.debug("[helpers] unicode received None, returning empty string.")
         return ""
     return unidecode(text).strip()
 
@@ -15,7 +18,7 @@ def unicode(text: str) -> str:
 def clean_text(article):
     """Clean the article text by removing extra whitespace and newlines."""
     if article is None: # Added this check
-        print("[helpers.py DEBUG] clean_text received None, returning empty string.") # DEBUG
+        logger.debug("[helpers] clean_text received None, returning empty string.")
         return "" # Return empty string; ensures re.sub doesn't get None
     # Remove extra whitespace and newlines
     cleaned_article = re.sub(r'\s+', ' ', article).strip()
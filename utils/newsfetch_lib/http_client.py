@@ -0,0 +1,210 @@
+# ~/CombinedNiftyNewsApp/utils/newsfetch_lib/http_client.py
+"""
+Process-wide pooled HTTP client shared by every fetch path (article handlers,
+bulk scraper, on-demand scrape and NewsAPI helpers).
+
+One httpx.Client keeps per-host keep-alive pools, negotiates HTTP/2 where the
+server (and the optional `h2` package) support it, and resolves hostnames via a
+small TTL cache so the dozen news domains we hit repeatedly are looked up once.
+"""
+import hashlib
+import logging
+import os
+import socket
+import threading
+import time
+
+import httpx
+import httpcore
+
+from .metrics import get_scrape_metrics
+
+logger = logging.getLogger(__name__)
+
+HTTP_TIMEOUT_SECONDS = float(os.environ.get("HTTP_TIMEOUT_SECONDS", 15))
+HTTP_MAX_CONNECTIONS = int(os.environ.get("HTTP_MAX_CONNECTIONS", 100))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get("HTTP_MAX_KEEPALIVE_CONNECTIONS", 40))
+HTTP_KEEPALIVE_EXPIRY_SECONDS = float(os.environ.get("HTTP_KEEPALIVE_EXPIRY_SECONDS", 60))
+DNS_CACHE_TTL_SECONDS = float(os.environ.get("DNS_CACHE_TTL_SECONDS", 300))
+
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/118.0.0.0 Safari/537.36",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "en-IN,en;q=0.9",
+}
+
+try:
+    import h2  # noqa: F401 -- only needed to enable HTTP/2 in httpx
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+class _DNSCache:
+    """Thread-safe TTL cache in front of socket.getaddrinfo."""
+
+    def __init__(self, ttl_seconds):
+        self.ttl_seconds = ttl_seconds
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, host, port):
+        key = (host, port)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > now:
+                return entry[1]
+        addresses = [info[4][0] for info in socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)]
+        with self._lock:
+            self._entries[key] = (now + self.ttl_seconds, addresses)
+        return addresses
+
+    def invalidate(self, host, port):
+        with self._lock:
+            self._entries.pop((host, port), None)
+
+
+_dns_cache = _DNSCache(DNS_CACHE_TTL_SECONDS)
+
+
+class _CachingDNSBackend(httpcore.SyncBackend):
+    """httpcore network backend that connects to cached addresses; TLS SNI still uses the hostname."""
+
+    def connect_tcp(self, host, port, timeout=None, local_address=None, socket_options=None):
+        try:
+            addresses = _dns_cache.resolve(host, port)
+        except OSError:
+            addresses = []
+        last_exc = None
+        for address in addresses:
+            try:
+                return super().connect_tcp(address, port, timeout=timeout, local_address=local_address, socket_options=socket_options)
+            except httpcore.ConnectError as e:
+                last_exc = e
+        if addresses:
+            _dns_cache.invalidate(host, port)
+            logger.debug(f"[HTTPClient] Cached addresses for {host}:{port} failed ({last_exc}); retrying with fresh lookup.")
+        return super().connect_tcp(host, port, timeout=timeout, local_address=local_address, socket_options=socket_options)
+
+
+def _build_transport(proxy=None):
+    transport = httpx.HTTPTransport(
+        http2=HTTP2_AVAILABLE,
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY_SECONDS,
+        ),
+        proxy=proxy,
+        retries=1,  # Retries connection failures only, never a completed request
+    )
+    pool = getattr(transport, "_pool", None)
+    if proxy is None and pool is not None and hasattr(pool, "_network_backend"):
+        pool._network_backend = _CachingDNSBackend()
+    return transport
+
+
+_client = None
+_proxy_clients = {} # proxy URL -> httpx.Client, one keep-alive pool per upstream proxy
+_client_lock = threading.Lock()
+
+
+def _new_client(proxy=None):
+    return httpx.Client(
+        transport=_build_transport(proxy=proxy),
+        headers=DEFAULT_HEADERS,
+        timeout=HTTP_TIMEOUT_SECONDS,
+        follow_redirects=True,
+    )
+
+
+def get_http_client(proxy=None):
+    """Return the process-wide httpx.Client (or the one routed through `proxy`), creating it on first use."""
+    global _client
+    if proxy is not None:
+        client = _proxy_clients.get(proxy)
+        if client is None:
+            with _client_lock:
+                client = _proxy_clients.get(proxy)
+                if client is None:
+                    client = _proxy_clients[proxy] = _new_client(proxy=proxy)
+                    logger.info(f"[HTTPClient] Client created for proxy {httpx.URL(proxy).host}.")
+        return client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = _new_client()
+                logger.info(f"[HTTPClient] Shared client created (HTTP/2: {HTTP2_AVAILABLE}, max connections: {HTTP_MAX_CONNECTIONS}).")
+    return _client
+
+
+def fetch_response(url, headers=None, proxy=None):
+    """GET through the shared (or per-proxy) client; returns the response whatever its status, None on transport errors."""
+    metrics = get_scrape_metrics()
+    try:
+        with metrics.time_stage("http_get"):
+            response = get_http_client(proxy).get(url, headers=headers)
+    except httpx.HTTPError as e:
+        logger.warning(f"[HTTPClient] Request failed for {url}{' via proxy' if proxy else ''}: {e}")
+        metrics.inc("http_requests_total", status="error")
+        return None
+    metrics.inc("http_requests_total", status=response.status_code)
+    metrics.inc("bytes_downloaded_total", len(response.content))
+    return response
+
+
+def fetch_html(url, headers=None, proxy=None):
+    """
+    GET a page through the shared client (or the client for `proxy`).
+    Returns the response on a 2xx status, otherwise None (errors are logged, never raised).
+    """
+    response = fetch_response(url, headers=headers, proxy=proxy)
+    if response is None:
+        return None
+    if not response.is_success:
+        logger.warning(f"[HTTPClient] HTTP {response.status_code} for {url}")
+        return None
+    return response
+
+
+def fetch_conditional(url, etag=None, last_modified=None):
+    """
+    Conditional GET for refreshing an already-scraped page.
+    Returns the response for 200 or 304 (check `response.status_code`), otherwise None.
+    """
+    headers = {}
+    if etag: headers["If-None-Match"] = etag
+    if last_modified: headers["If-Modified-Since"] = last_modified
+    try:
+        response = get_http_client().get(url, headers=headers)
+    except httpx.HTTPError as e:
+        logger.warning(f"[HTTPClient] Conditional request failed for {url}: {e}")
+        return None
+    if response.status_code == 304 or response.is_success:
+        return response
+    logger.warning(f"[HTTPClient] HTTP {response.status_code} on conditional fetch for {url}")
+    return None
+
+
+def compute_content_hash(article_text):
+    """
+    SHA-256 hex digest of extracted article text, used to detect unchanged articles; None without text.
+    Case and whitespace are normalized, and the raw HTML is not hashed: its ads, timestamps and nonces
+    change on every fetch of a live page.
+    """
+    normalized = " ".join((article_text or "").lower().split())
+    if not normalized:
+        return None
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def close_http_client():
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+        for client in _proxy_clients.values():
+            client.close()
+        _proxy_clients.clear()
@@ -0,0 +1,193 @@
+# ~/CombinedNiftyNewsApp/utils/newsfetch_lib/metrics.py
+"""
+Process-wide scrape metrics: counters and latency histograms, labelled per stage/reason.
+
+Stages timed (histogram `scraper_stage_seconds{stage=...}`):
+  chrome_startup, governor_wait, serp_page  - Google search (google.py)
+  http_get                                  - every article/page download (http_client.py)
+  parse, nlp                                - newspaper4k extraction (newspaper_handler.py)
+  article_fetch                             - download + full Newspaper extraction of one article
+  db_commit                                 - saving one article (scrape_financial_news_db.py)
+
+Exported as Prometheus text (to_prometheus(), for a textfile collector or the daemon's
+/metrics endpoint) and as a JSON run report with per-stage latency percentiles.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+logger = logging.getLogger("utils.newsfetch_lib.metrics")
+
+METRIC_PREFIX = "scraper_"
+# Seconds; spans a cached HTTP GET up to a slow Chrome start / SERP wait
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+
+
+def _label_key(labels):
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _escape_label_value(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(label_key, extra=()):
+    pairs = list(label_key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape_label_value(value)}"' for name, value in pairs) + "}"
+
+
+class _Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.bucket_counts = [0] * (len(buckets) + 1) # Last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        for idx, upper in enumerate(self.buckets):
+            if value <= upper:
+                self.bucket_counts[idx] += 1
+                break
+        else:
+            self.bucket_counts[-1] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """Bucket-interpolated estimate (as Prometheus' histogram_quantile), capped at the observed max."""
+        if not self.count:
+            return None
+        rank, cumulative, lower = q * self.count, 0, 0.0
+        for idx, bucket_count in enumerate(self.bucket_counts):
+            upper = self.buckets[idx] if idx < len(self.buckets) else self.max
+            if bucket_count and cumulative + bucket_count >= rank:
+                estimate = lower + (upper - lower) * (rank - cumulative) / bucket_count
+                return min(estimate, self.max)
+            cumulative += bucket_count
+            lower = upper
+        return self.max
+
+    def summary(self):
+        quantile = lambda q: round(self.quantile(q), 4) if self.count else None
+        return {'count': self.count, 'sum_seconds': round(self.sum, 3),
+                'mean_seconds': round(self.sum / self.count, 4) if self.count else None,
+                'p50_seconds': quantile(0.5), 'p90_seconds': quantile(0.9), 'p99_seconds': quantile(0.99),
+                'max_seconds': round(self.max, 4),
+                'buckets': {str(upper): count for upper, count in zip(list(self.buckets) + ["+Inf"], self.bucket_counts)}}
+
+
+class ScrapeMetrics:
+    """
+    Thread-safe counter/histogram registry. Metric names are given without the prefix
+    (METRIC_PREFIX unless another is passed); labels are keyword arguments,
+    e.g. inc("articles_rejected_total", reason="out_of_range").
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS, prefix=METRIC_PREFIX):
+        self.buckets = buckets
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._counters = {} # name -> {label_key: value}
+            self._histograms = {} # name -> {label_key: _Histogram}
+            self.started_at = datetime.now(timezone.utc).replace(tzinfo=None)
+
+    def inc(self, name, value=1, **labels):
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            key = _label_key(labels)
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            key = _label_key(labels)
+            if key not in series:
+                series[key] = _Histogram(self.buckets)
+            series[key].observe(value)
+
+    @contextmanager
+    def time_stage(self, stage):
+        """Times the enclosed block into stage_seconds{stage=...}, whether or not it raises."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe("stage_seconds", time.perf_counter() - started, stage=stage)
+
+    def counter_value(self, name, **labels):
+        with self._lock:
+            return self._counters.get(name, {}).get(_label_key(labels), 0)
+
+    def to_prometheus(self):
+        """Prometheus text exposition format (0.0.4)."""
+        lines = []
+        with self._lock:
+            for name in sorted(self._counters):
+                full_name = self.prefix + name
+                lines.append(f"# TYPE {full_name} counter")
+                for key, value in sorted(self._counters[name].items()):
+                    lines.append(f"{full_name}{_format_labels(key)} {value}")
+            for name in sorted(self._histograms):
+                full_name = self.prefix + name
+                lines.append(f"# TYPE {full_name} histogram")
+                for key, histogram in sorted(self._histograms[name].items()):
+                    cumulative = 0
+                    for upper, bucket_count in zip(list(histogram.buckets) + ["+Inf"], histogram.bucket_counts):
+                        cumulative += bucket_count
+                        lines.append(f"{full_name}_bucket{_format_labels(key, [('le', upper)])} {cumulative}")
+                    lines.append(f"{full_name}_sum{_format_labels(key)} {histogram.sum:.6f}")
+                    lines.append(f"{full_name}_count{_format_labels(key)} {histogram.count}")
+            lines.append(f"# TYPE {self.prefix}run_started_timestamp_seconds gauge")
+            lines.append(f"{self.prefix}run_started_timestamp_seconds {self.started_at.replace(tzinfo=timezone.utc).timestamp():.0f}")
+        return "\n".join(lines) + "\n"
+
+    def report(self, **run_info):
+        """JSON-serialisable run report: counters and per-series latency summaries."""
+        finished_at = datetime.now(timezone.utc).replace(tzinfo=None)
+        with self._lock:
+            counters = {name: {",".join(f"{k}={v}" for k, v in key) or "total": value for key, value in sorted(series.items())}
+                        for name, series in sorted(self._counters.items())}
+            histograms = {name: {",".join(f"{k}={v}" for k, v in key) or "all": histogram.summary()
+                                 for key, histogram in sorted(series.items())}
+                          for name, series in sorted(self._histograms.items())}
+        return dict(run_info, started_at=self.started_at.isoformat(), finished_at=finished_at.isoformat(),
+                    duration_seconds=round((finished_at - self.started_at).total_seconds(), 1),
+                    counters=counters, histograms=histograms)
+
+    def write_prometheus(self, path):
+        _write_atomically(path, self.to_prometheus())
+
+    def write_report(self, path, **run_info):
+        report = self.report(**run_info)
+        _write_atomically(path, json.dumps(report, indent=2, default=str))
+        return report
+
+
+def _write_atomically(path, text):
+    try:
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp_path, path) # Scrapers (node_exporter textfile collector) never see a half-written file
+    except OSError as e:
+        logger.warning(f"[Metrics] Could not write {path}: {e}")
+
+
+_metrics = ScrapeMetrics()
+
+
+def get_scrape_metrics():
+    """The process-wide ScrapeMetrics registry."""
+    return _metrics
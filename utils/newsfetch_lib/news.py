@@ -1,28 +1,68 @@
 # ~/CombinedNiftyNewsApp/utils/newsfetch_lib/news.py
+import logging
+
 from .newspaper_handler import ArticleHandler 
 from .news_please_handler import NewsPleaseHandler 
 from .soup_handler import SoupHandler 
-# Removed logging import as it's not used directly in this class, debugs use print
+from .http_client import compute_content_hash, fetch_html
+from .tracing import span, start_trace
+
+logger = logging.getLogger("utils.newsfetch_lib.news")
 
 class Newspaper: # Make sure this line is exactly like this
     """Class to scrape and extract information from a news article."""
 
-    def __init__(self, url: str) -> None:
-        """Initialize the Newspaper object with the given URL."""
-        print(f"[Newspaper DEBUG __init__] Initializing for URL: {url}") 
+    def __init__(self, url: str, html: str = None, response=None) -> None:
+        """
+        Initialize the Newspaper object with the given URL.
+        The page is downloaded once through the shared pooled HTTP client (unless `html`
+        or an already fetched 2xx `response`, e.g. via a proxy, is supplied) and the same
+        HTML is handed to every handler. Each handler stage is a span of the article's trace
+        (see tracing.py; off unless NEWSFETCH_TRACE_* is set).
+        """
+        logger.debug("[Newspaper] Initializing for URL: %s", url)
         self.url = url
-        self.__news_please = NewsPleaseHandler(url) 
-        self.__article = ArticleHandler(url)       
-        self.__soup = SoupHandler(url)             
-
-        self.__validate_initialization() 
+        # HTTP validators, persisted so later refreshes can issue conditional GETs
+        self.etag = None
+        self.last_modified = None
+        self.content_hash = None
+        with start_trace(url) as trace:
+            if html is None:
+                if response is None:
+                    with span("http", "download") as download_span:
+                        response = fetch_html(url)
+                        if response is None: download_span.outcome = "empty"
+                if response is not None:
+                    html = response.text
+                    self.etag = response.headers.get("ETag")
+                    self.last_modified = response.headers.get("Last-Modified")
+            if html is None:
+                raise ValueError(f"Sorry, the page could not be downloaded: {url}")
+            self.__news_please = NewsPleaseHandler(url, html=html) # Opens its own extract span
+            with span("newspaper4k", "init"):
+                self.__article = ArticleHandler(url, html=html)
+            with span("soup", "parse"):
+                self.__soup = SoupHandler(url, html=html)
+
+            self.__validate_initialization()
+
+            if self.__article.is_valid():
+                self.__article.download_and_parse() # Opens its own parse span
+            else:
+                logger.debug("[Newspaper] ArticleHandler (newspaper4k) is NOT valid after initialization for %s.", url)
+
+            with span("newspaper", "extract_fields") as extract_span:
+                self.__extract_fields()
+                if not self.article and not self.headline: extract_span.outcome = "empty"
+            self.content_hash = compute_content_hash(self.article) # Of the extracted text, not the page HTML
+            trace.outcome = "ok" if self.article or self.headline else "empty"
 
-        if self.__article.is_valid():
-            print("[Newspaper DEBUG __init__] ArticleHandler (newspaper4k) is_valid, calling download_and_parse.") 
-            self.__article.download_and_parse() 
-        else:
-            print("[Newspaper DEBUG __init__] ArticleHandler (newspaper4k) is NOT valid after initialization.") 
+        self.get_dict = self.__serialize()
+        logger.debug("[Newspaper] Final headline: %s; article text (first 100 chars): %r",
+                     self.headline, self.article[:100] if self.article else None)
 
+    def __extract_fields(self):
+        """Merges every field from the handlers (keywords/summary may trigger newspaper4k's .nlp())."""
         self.headline = self.__extract_headline()
         self.article = self.__extract_article() 
         self.authors = self.__extract_authors()
@@ -42,108 +82,83 @@ class Newspaper: # Make sure this line is exactly like this
         self.source_favicon_url = self.__extract_source_favicon_url()
         self.description = self.__extract_description()
 
-        self.get_dict = self.__serialize()
-        print(f"[Newspaper DEBUG __init__] Final extracted article text (first 100 chars): {repr(self.article[:100]) if self.article else 'None'}") 
-        print(f"[Newspaper DEBUG __init__] Final extracted headline: {self.headline}") 
-
     def __validate_initialization(self):
         """Raise an error if no valid data is found from any handler's basic initialization."""
         np_valid = self.__news_please.is_valid()
         ar_valid = self.__article.is_valid()
         so_valid = self.__soup.is_valid() 
-        print(f"[Newspaper DEBUG __validate_initialization] NewsPlease valid: {np_valid}, ArticleHandler valid: {ar_valid}, SoupHandler valid: {so_valid}") 
+        logger.debug("[Newspaper] Handlers valid for %s - NewsPlease: %s, ArticleHandler: %s, SoupHandler: %s",
+                     self.url, np_valid, ar_valid, so_valid)
         if not (np_valid or ar_valid or so_valid): 
             raise ValueError("Sorry, the page you are looking for caused all handlers to fail initialization.")
 
     @staticmethod
     def __extract(*sources):
         """Generic method to extract the first valid value from provided sources."""
-        for i, source_value_getter in enumerate(sources): 
-            value = source_value_getter 
-            print(f"[Newspaper DEBUG __extract] Trying source index {i}. Value (first 50 if str): {repr(value[:50] if isinstance(value, str) else value)}") 
+        for value in sources:
             if isinstance(value, list): 
                 if value and value != ['N/A']: 
                     return value
             elif value is not None and value != "" and value != "N/A": 
                 return value
-        print("[Newspaper DEBUG __extract] All sources yielded no valid value.") 
         return None 
 
     def __extract_authors(self):
-        print("[Newspaper DEBUG __extract_authors] called.") 
         return self.__extract(self.__news_please.authors, self.__article.authors, self.__soup.authors)
 
     def __extract_date_publish(self):
-        print("[Newspaper DEBUG __extract_date_publish] called.") 
         return self.__extract(self.__news_please.date_publish, self.__article.date_publish, self.__soup.date_publish)
 
     def __extract_date_modify(self):
-        print("[Newspaper DEBUG __extract_date_modify] called (uses NewsPleaseHandler).") 
         return self.__news_please.date_modify
 
     def __extract_date_download(self):
-        print("[Newspaper DEBUG __extract_date_download] called (uses NewsPleaseHandler).") 
         return self.__news_please.date_download
 
     def __extract_image_url(self):
-        print("[Newspaper DEBUG __extract_image_url] called (uses NewsPleaseHandler).") 
         return self.__news_please.image_url
 
     def __extract_filename(self):
-        print("[Newspaper DEBUG __extract_filename] called (uses NewsPleaseHandler).") 
         return self.__news_please.filename
 
     def __extract_article(self):
-        print("[Newspaper DEBUG __extract_article] Trying NewsPleaseHandler.article...") 
         news_please_text = self.__news_please.article 
-        print(f"[Newspaper DEBUG __extract_article] NewsPleaseHandler.article returned (first 100): {repr(news_please_text[:100]) if news_please_text else 'None'}") 
-        print("[Newspaper DEBUG __extract_article] Trying ArticleHandler.article (newspaper4k)...") 
         article_handler_text = self.__article.article 
-        print(f"[Newspaper DEBUG __extract_article] ArticleHandler.article (newspaper4k) returned (first 100): {repr(article_handler_text[:100]) if article_handler_text else 'None'}") 
+        logger.debug("[Newspaper] Article text for %s - NewsPlease: %s chars, newspaper4k: %s chars", self.url,
+                     len(news_please_text) if news_please_text else None, len(article_handler_text) if article_handler_text else None)
         return self.__extract(news_please_text, article_handler_text)
 
     def __extract_title_page(self):
-        print("[Newspaper DEBUG __extract_title_page] called (uses NewsPleaseHandler).") 
         return self.__news_please.title_page
 
     def __extract_title_rss(self):
-        print("[Newspaper DEBUG __extract_title_rss] called (uses NewsPleaseHandler).") 
         return self.__news_please.title_rss
 
     def __extract_language(self):
-        print("[Newspaper DEBUG __extract_language] called (uses NewsPleaseHandler).") 
         return self.__news_please.language
 
     def __extract_publication(self):
-        print("[Newspaper DEBUG __extract_publication] called.") 
         return self.__extract(self.__article.publication, self.__soup.publisher)
 
     def __extract_category(self):
-        print("[Newspaper DEBUG __extract_category] called.") 
         return self.__extract(self.__article.category, self.__soup.category)
 
     def __extract_headline(self):
-        print("[Newspaper DEBUG __extract_headline] called.") 
         return self.__extract(self.__news_please.headline, self.__article.headline)
 
     def __extract_keywords(self):
-        print("[Newspaper DEBUG __extract_keywords] called (uses ArticleHandler).") 
         return self.__article.keywords or [] 
 
     def __extract_summary(self):
-        print("[Newspaper DEBUG __extract_summary] called (uses ArticleHandler).") 
         return self.__article.summary
 
     def __extract_source_domain(self):
-        print("[Newspaper DEBUG __extract_source_domain] called (uses NewsPleaseHandler).") 
         return self.__news_please.source_domain
 
     def __extract_source_favicon_url(self):
-        print("[Newspaper DEBUG __extract_source_favicon_url] called (uses ArticleHandler).") 
         return self.__article.meta_favicon
 
     def __extract_description(self): 
-        print("[Newspaper DEBUG __extract_description] called.") 
         return self.__extract(self.__news_please.summary, self.__article.summary)
 
     def __serialize(self):
@@ -2,28 +2,34 @@
 from urllib.parse import unquote
 from newsplease import NewsPlease
 from .helpers import clean_text, unicode # Note the leading dot
+from .http_client import fetch_html
+from .tracing import span
 import logging 
 logger = logging.getLogger(__name__) 
 
 class NewsPleaseHandler:
     """Handle interactions with the NewsPlease library."""
 
-    def __init__(self, url: str):
+    def __init__(self, url: str, html: str = None):
         self.url = url
-        print(f"[NewsPleaseHandler DEBUG] Initializing with URL: {self.url}") 
+        logger.debug("[NewsPleaseHandler] Initializing with URL: %s", self.url)
         try:
-            self._raw_news_please_object = NewsPlease.from_url(self.url, timeout=10)
+            if html is None: # Standalone use: fetch through the shared pooled client
+                with span("http", "download"):
+                    response = fetch_html(self.url)
+                html = response.text if response is not None else None
+            with span("news_please", "extract") as extract_span:
+                self._raw_news_please_object = NewsPlease.from_html(html, url=self.url, fetch_images=False) if html else None
+                if self._raw_news_please_object is None: extract_span.outcome = "empty"
             self.__news_please = self._raw_news_please_object 
             if self.__news_please:
-                print(f"[NewsPleaseHandler DEBUG] NewsPlease.from_url successful for {self.url}") 
-                print(f"[NewsPleaseHandler DEBUG] Raw maintext: {repr(self.__news_please.maintext)}") 
-                print(f"[NewsPleaseHandler DEBUG] Raw title: {repr(self.__news_please.title)}") 
+                logger.debug("[NewsPleaseHandler] NewsPlease.from_html successful for %s; title: %r; maintext: %s chars",
+                             self.url, self.__news_please.title, len(self.__news_please.maintext or ""))
             else:
-                print(f"[NewsPleaseHandler DEBUG] NewsPlease.from_url returned None directly for {self.url}") 
+                logger.debug("[NewsPleaseHandler] NewsPlease.from_html returned None (or no HTML fetched) for %s", self.url)
                 self._raw_news_please_object = None 
-        except Exception as e:
-            print(f"[NewsPleaseHandler DEBUG] Exception during NewsPlease.from_url for {self.url}: {e}") 
-            logger.exception(f"NewsPlease.from_url failed for {self.url}") 
+        except Exception:
+            logger.exception("NewsPlease.from_html failed for %s", self.url)
             self.__news_please = None
             self._raw_news_please_object = None 
 
@@ -34,9 +40,8 @@ class NewsPleaseHandler:
         """Executes a function and returns None if it raises an exception."""
         try:
             return func()
-        except Exception as e_safe: 
-            print(f"[NewsPleaseHandler DEBUG - __safe_execute] Exception caught: {e_safe}") 
-            logger.exception("Exception in __safe_execute") 
+        except Exception:
+            logger.exception("Exception in __safe_execute")
             return None
 
     def is_valid(self) -> bool:
@@ -107,10 +112,10 @@ class NewsPleaseHandler:
     def article(self) -> str:
         """Return cleaned article text from the NewsPlease instance."""
         if not self.is_valid():
-            print("[NewsPleaseHandler DEBUG] article property: self.__news_please is invalid (None), returning None for article.") 
+            logger.debug("[NewsPleaseHandler] article property: NewsPlease object is invalid for %s.", self.url)
             return None
         if self.__news_please.maintext is None:
-            print(f"[NewsPleaseHandler DEBUG] article property: self.__news_please.maintext is None for {self.url}, returning None for article.") 
+            logger.debug("[NewsPleaseHandler] article property: maintext is None for %s.", self.url)
             return None 
         return unicode(clean_text(self.__news_please.maintext))
 
@@ -124,6 +129,6 @@ class NewsPleaseHandler:
         """Return headline from NewsPlease instance."""
         if not self.is_valid(): return None
         if self.__news_please.title is None:
-            print(f"[NewsPleaseHandler DEBUG] headline property: self.__news_please.title is None for {self.url}, returning None for headline.") 
+            logger.debug("[NewsPleaseHandler] headline property: title is None for %s.", self.url)
             return None
         return unicode(self.__news_please.title)
\ No newline at end of file
@@ -1,20 +1,24 @@
 from newspaper import Article # This should now be newspaper4k's Article
 
 from .helpers import clean_text, extract_keywords, summarize_article, unicode # Note the leading dot
+from .http_client import fetch_html
+from .metrics import get_scrape_metrics
+from .tracing import span
 import logging # Add this
 logger = logging.getLogger(__name__) # Add this
 
 class ArticleHandler:
     """Handle interactions with the Article class (from newspaper4k)."""
 
-    def __init__(self, url: str):
+    def __init__(self, url: str, html: str = None):
         self.url = url
-        print(f"[ArticleHandler DEBUG] Initializing with URL: {self.url}") # DEBUG
+        self.__html = html # Pre-fetched page from the shared HTTP client, if the caller has it
+        logger.debug("[ArticleHandler] Initializing with URL: %s", self.url)
         self.__article = self.__initialize_article()
         if self.__article:
-            print(f"[ArticleHandler DEBUG] Article object from newspaper4k initialized successfully for {self.url}.") # DEBUG
+            logger.debug("[ArticleHandler] newspaper4k Article initialized for %s.", self.url)
         else:
-            print(f"[ArticleHandler DEBUG] Article object (newspaper4k) initialization FAILED for {self.url}.") # DEBUG
+            logger.debug("[ArticleHandler] newspaper4k Article initialization FAILED for %s.", self.url)
 
     def __initialize_article(self):
         """Initialize the Article instance."""
@@ -26,9 +30,8 @@ class ArticleHandler:
         """Executes a function and returns None if it raises an exception."""
         try:
             return func()
-        except Exception as e:
-            print(f"[ArticleHandler DEBUG - __safe_execute] Exception caught: {e}") # DEBUG
-            logger.exception(f"Exception in ArticleHandler __safe_execute during function: {func}") # Log full traceback
+        except Exception:
+            logger.exception("Exception in ArticleHandler __safe_execute during function: %s", func) # Log full traceback
             return None
 
     def is_valid(self):
@@ -38,34 +41,38 @@ class ArticleHandler:
     def download_and_parse(self):
         """Download and parse the article."""
         if self.is_valid():
-            print(f"[ArticleHandler DEBUG] Downloading article (newspaper4k) for {self.url}") # DEBUG
-            self.__safe_execute(self.__article.download) # Call download
+            logger.debug("[ArticleHandler] Downloading article (newspaper4k) for %s", self.url)
+            if self.__html is None: # Never let newspaper4k open its own connection
+                response = fetch_html(self.url)
+                self.__html = response.text if response is not None else None
+            if self.__html is None:
+                logger.debug("[ArticleHandler] No HTML available for %s; skipping parse.", self.url)
+                return
+            self.__safe_execute(lambda: self.__article.download(input_html=self.__html)) # Hand over pre-fetched HTML
             
             download_failed_due_to_exception = False
             if hasattr(self.__article, 'download_exception_msg') and self.__article.download_exception_msg: 
-                print(f"[ArticleHandler DEBUG] Download (newspaper4k) FAILED for {self.url}. Exception: {self.__article.download_exception_msg}") # DEBUG
+                logger.debug("[ArticleHandler] Download (newspaper4k) FAILED for %s: %s", self.url, self.__article.download_exception_msg)
                 download_failed_due_to_exception = True
-            else:
-                print(f"[ArticleHandler DEBUG] Download (newspaper4k) attempt made for {self.url}. Further status via parse.")
 
             # Attempt to parse if no immediate download exception was noted.
             # .parse() internally checks if download was successful enough to proceed.
             if not download_failed_due_to_exception:
-                print(f"[ArticleHandler DEBUG] Parsing article (newspaper4k) for {self.url}") # DEBUG
-                self.__safe_execute(self.__article.parse) # Call parse
+                with span("newspaper4k", "parse") as parse_span, get_scrape_metrics().time_stage("parse"):
+                    self.__safe_execute(self.__article.parse) # Call parse
+                    if not self.__article.is_parsed: parse_span.outcome = "failed"
+                    elif not self.__article.text and not self.__article.title: parse_span.outcome = "empty"
                 
                 if self.__article.is_parsed: # Check the is_parsed flag
-                    print(f"[ArticleHandler DEBUG] Parse (newspaper4k) completed (is_parsed is True).")
+                    logger.debug("[ArticleHandler] Parse (newspaper4k) completed for %s.", self.url)
                     if not self.__article.text and not self.__article.title: # Check if it actually got content
-                        print(f"[ArticleHandler DEBUG] Parse (newspaper4k) completed but yielded no text or title for {self.url}.")
-                    else:
-                        print(f"[ArticleHandler DEBUG] Parse (newspaper4k) seems to have yielded content for {self.url}.")
+                        logger.debug("[ArticleHandler] Parse (newspaper4k) yielded no text or title for %s.", self.url)
                 else:
-                    print(f"[ArticleHandler DEBUG] Parse (newspaper4k) FAILED or did not complete (is_parsed is False) for {self.url}.")
+                    logger.debug("[ArticleHandler] Parse (newspaper4k) FAILED or did not complete for %s.", self.url)
             else:
-                print(f"[ArticleHandler DEBUG] Skipping parse (newspaper4k) because download reported an exception for {self.url}.")
+                logger.debug("[ArticleHandler] Skipping parse (newspaper4k): download reported an exception for %s.", self.url)
         else:
-            print(f"[ArticleHandler DEBUG] download_and_parse (newspaper4k) skipped: Article object is not valid for {self.url}.")
+            logger.debug("[ArticleHandler] download_and_parse skipped: Article object is not valid for %s.", self.url)
 
     @property
     def authors(self):
@@ -89,16 +96,17 @@ class ArticleHandler:
             return []
         # For keywords, .nlp() must be called. Let's ensure it's called if needed.
         if not self.__article.keywords and self.__article.is_parsed: # Only run nlp if parsed and no keywords yet
-            print(f"[ArticleHandler DEBUG] Keywords: Calling .nlp() for {self.url} as keywords are empty.") # DEBUG
-            self.__safe_execute(self.__article.nlp)
+            logger.debug("[ArticleHandler] Keywords empty; calling .nlp() for %s", self.url)
+            with span("newspaper4k", "nlp"), get_scrape_metrics().time_stage("nlp"):
+                self.__safe_execute(self.__article.nlp)
 
         article_keywords = self.__article.keywords
         if article_keywords:
              processed_keywords = self.__process_keywords(article_keywords)
-             print(f"[ArticleHandler DEBUG] Keywords from newspaper4k: {processed_keywords}") # DEBUG
+             logger.debug("[ArticleHandler] Keywords from newspaper4k: %s", processed_keywords)
              return processed_keywords
         
-        print("[ArticleHandler DEBUG] newspaper4k keywords empty after nlp/check, falling back to custom extraction.") # DEBUG
+        logger.debug("[ArticleHandler] newspaper4k keywords empty after nlp, falling back to custom extraction for %s.", self.url)
         current_article_text = self.article 
         if current_article_text:
             return extract_keywords(current_article_text)
@@ -118,15 +126,16 @@ class ArticleHandler:
 
         # For summary, .nlp() must be called.
         if not self.__article.summary and self.__article.is_parsed: # Only run nlp if parsed and no summary yet
-            print(f"[ArticleHandler DEBUG] Summary: Calling .nlp() for {self.url} as summary is empty.") # DEBUG
-            self.__safe_execute(self.__article.nlp)
+            logger.debug("[ArticleHandler] Summary empty; calling .nlp() for %s", self.url)
+            with span("newspaper4k", "nlp"), get_scrape_metrics().time_stage("nlp"):
+                self.__safe_execute(self.__article.nlp)
 
         article_summary = self.__article.summary
-        print(f"[ArticleHandler DEBUG] Raw summary from newspaper4k: {repr(article_summary[:200]) if article_summary else 'None'}") # DEBUG
+        logger.debug("[ArticleHandler] Raw summary from newspaper4k: %r", article_summary[:200] if article_summary else None)
         if article_summary: 
             return unicode(article_summary)
         
-        print("[ArticleHandler DEBUG] newspaper4k summary empty after nlp/check, falling back to custom summarizer.") # DEBUG
+        logger.debug("[ArticleHandler] newspaper4k summary empty after nlp, falling back to custom summarizer for %s.", self.url)
         current_article_text = self.article 
         if current_article_text:
             return unicode(summarize_article(current_article_text))
@@ -136,16 +145,16 @@ class ArticleHandler:
     def article(self):
         """Return cleaned article text from the Article instance."""
         if not self.is_valid():
-            print("[ArticleHandler DEBUG] article property: self.__article (newspaper4k) is invalid, returning None.") # DEBUG
+            logger.debug("[ArticleHandler] article property: newspaper4k Article is invalid for %s.", self.url)
             return None 
         
         # Ensure article has been parsed before trying to access .text
         if not self.__article.is_parsed:
-            print("[ArticleHandler DEBUG] article property: Article not parsed yet, cannot get text. Returning None.") # DEBUG
+            logger.debug("[ArticleHandler] article property: not parsed yet for %s.", self.url)
             return None
 
         raw_text = self.__article.text
-        print(f"[ArticleHandler DEBUG] article property: Raw text from newspaper4k (first 200 chars): {repr(raw_text[:200]) if raw_text else 'None'}") # DEBUG
+        logger.debug("[ArticleHandler] Raw text from newspaper4k (first 200 chars): %r", raw_text[:200] if raw_text else None)
         if not raw_text: 
             return None 
         return unicode(clean_text(raw_text))
@@ -179,11 +188,11 @@ class ArticleHandler:
     def headline(self):
         """Return title from the Article instance."""
         if not self.is_valid() or not self.__article.title:
-            print(f"[ArticleHandler DEBUG] headline property: newspaper4k title is missing or invalid.") #DEBUG
+            logger.debug("[ArticleHandler] headline property: newspaper4k title is missing for %s.", self.url)
             return None
         # Ensure article has been parsed before trying to access .title
         if not self.__article.is_parsed and self.__article.title is None: # check if title is None AND not parsed
-             print("[ArticleHandler DEBUG] headline property: Article not parsed yet and title is None. Returning None.") # DEBUG
+             logger.debug("[ArticleHandler] headline property: not parsed yet and title is None for %s.", self.url)
              return None
         return unicode(self.__article.title)
 
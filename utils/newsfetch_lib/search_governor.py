@@ -0,0 +1,185 @@
+# ~/CombinedNiftyNewsApp/utils/newsfetch_lib/search_governor.py
+"""
+Process-wide pacing for Google SERP requests, shared by every search worker (bulk scraper
+threads and on-demand scrapes in the Flask app).
+
+- A sliding window of recent search outcomes gives the current CAPTCHA rate.
+- A circuit breaker opens when that rate (or a streak of CAPTCHAs) is too high; while open,
+  nobody searches. After an exponentially growing cool-down a single probe search is let
+  through (half-open); a clean probe closes the circuit, a CAPTCHA re-opens it for longer.
+- The allowed search rate adapts AIMD-style: +SEARCH_GOVERNOR_RATE_STEP searches/minute after
+  each clean search, halved on each CAPTCHA, so it settles near the highest sustainable rate.
+"""
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger("utils.newsfetch_lib.search_governor")
+
+SEARCH_GOVERNOR_INITIAL_PER_MINUTE = float(os.environ.get("SEARCH_GOVERNOR_INITIAL_PER_MINUTE", 4)) # = the old 15s SEARCH_DELAY
+SEARCH_GOVERNOR_MIN_PER_MINUTE = float(os.environ.get("SEARCH_GOVERNOR_MIN_PER_MINUTE", 0.5))
+SEARCH_GOVERNOR_MAX_PER_MINUTE = float(os.environ.get("SEARCH_GOVERNOR_MAX_PER_MINUTE", 10))
+SEARCH_GOVERNOR_RATE_STEP = 0.25          # Additive increase (searches/minute) per clean search
+SEARCH_GOVERNOR_BACKOFF_FACTOR = 0.5      # Multiplicative decrease on a CAPTCHA
+SEARCH_GOVERNOR_WINDOW_SECONDS = 900      # Sliding window for the CAPTCHA rate
+SEARCH_GOVERNOR_MIN_SAMPLES = 4           # Don't judge the rate on fewer outcomes than this
+SEARCH_GOVERNOR_TRIP_CAPTCHA_RATE = 0.3   # Open the circuit at this CAPTCHA share of the window
+SEARCH_GOVERNOR_TRIP_STREAK = 3           # ... or after this many CAPTCHAs in a row
+SEARCH_GOVERNOR_BASE_COOLDOWN_SECONDS = float(os.environ.get("SEARCH_GOVERNOR_BASE_COOLDOWN_SECONDS", 300))
+SEARCH_GOVERNOR_MAX_COOLDOWN_SECONDS = float(os.environ.get("SEARCH_GOVERNOR_MAX_COOLDOWN_SECONDS", 7200))
+
+CIRCUIT_CLOSED = "closed"
+CIRCUIT_OPEN = "open"
+CIRCUIT_HALF_OPEN = "half_open"
+
+
+class SearchGovernor:
+    """
+    Call before_search() before every SERP request and record_result(captcha) after it.
+    `capacity` scales the rate bounds, e.g. to the number of proxies searching in parallel.
+    """
+
+    def __init__(self, initial_per_minute=SEARCH_GOVERNOR_INITIAL_PER_MINUTE, min_per_minute=SEARCH_GOVERNOR_MIN_PER_MINUTE,
+                 max_per_minute=SEARCH_GOVERNOR_MAX_PER_MINUTE, capacity=1, clock=time.monotonic):
+        self._base_rates = (initial_per_minute, min_per_minute, max_per_minute)
+        self._clock = clock
+        self._condition = threading.Condition()
+        self._outcomes = deque() # (timestamp, captcha: bool)
+        self._captcha_streak = 0
+        self._trips = 0 # Consecutive openings without a clean probe; drives the cool-down exponent
+        self._state = CIRCUIT_CLOSED
+        self._open_until = 0.0
+        self._probe_in_flight = False
+        self._next_slot = 0.0
+        self.totals = {'searches': 0, 'captchas': 0, 'circuit_openings': 0, 'waited_seconds': 0.0}
+        self.set_capacity(capacity, reset_rate=True)
+
+    def set_capacity(self, capacity, reset_rate=False):
+        with self._condition:
+            self.capacity = max(1, capacity)
+            initial, low, high = (rate * self.capacity for rate in self._base_rates)
+            self.min_rate, self.max_rate = low, high
+            if reset_rate:
+                self.rate_per_minute = initial
+            else:
+                self.rate_per_minute = min(high, max(low, self.rate_per_minute))
+
+    @property
+    def interval_seconds(self):
+        return 60.0 / self.rate_per_minute
+
+    def _prune(self, now):
+        while self._outcomes and self._outcomes[0][0] < now - SEARCH_GOVERNOR_WINDOW_SECONDS:
+            self._outcomes.popleft()
+
+    def captcha_rate(self):
+        with self._condition:
+            self._prune(self._clock())
+            if not self._outcomes:
+                return 0.0
+            return sum(1 for _, captcha in self._outcomes if captcha) / len(self._outcomes)
+
+    def before_search(self, timeout=None):
+        """
+        Blocks until this caller may issue a search. Returns False if that would take longer
+        than `timeout` seconds (the caller should skip the search), True otherwise.
+        """
+        started = self._clock()
+        deadline = None if timeout is None else started + timeout
+        with self._condition:
+            while True:
+                now = self._clock()
+                if self._state == CIRCUIT_OPEN and now >= self._open_until:
+                    self._state = CIRCUIT_HALF_OPEN
+                    logger.info("[SearchGovernor] Cool-down over; letting one probe search through.")
+
+                if self._state == CIRCUIT_OPEN:
+                    wait_for = self._open_until - now
+                elif self._state == CIRCUIT_HALF_OPEN and self._probe_in_flight:
+                    wait_for = None # Until the probe's result is recorded
+                else:
+                    wait_for = self._next_slot - now
+                    if wait_for <= 0:
+                        self._next_slot = now + self.interval_seconds
+                        if self._state == CIRCUIT_HALF_OPEN:
+                            self._probe_in_flight = True
+                        self.totals['waited_seconds'] += now - started
+                        return True
+
+                if deadline is not None:
+                    remaining = deadline - now
+                    if remaining <= 0 or (wait_for is not None and wait_for > remaining and self._state == CIRCUIT_OPEN):
+                        logger.warning(f"[SearchGovernor] Search slot not available within {timeout}s (circuit {self._state}).")
+                        return False
+                    wait_for = remaining if wait_for is None else min(wait_for, remaining)
+                self._condition.wait(wait_for)
+
+    def record_result(self, captcha):
+        """Feeds one search outcome back; adapts the rate and opens/closes the circuit."""
+        with self._condition:
+            now = self._clock()
+            self._outcomes.append((now, bool(captcha)))
+            self._prune(now)
+            self.totals['searches'] += 1
+            was_probe = self._state == CIRCUIT_HALF_OPEN and self._probe_in_flight
+            self._probe_in_flight = False
+
+            if captcha:
+                self.totals['captchas'] += 1
+                self._captcha_streak += 1
+                self.rate_per_minute = max(self.min_rate, self.rate_per_minute * SEARCH_GOVERNOR_BACKOFF_FACTOR)
+                window_captchas = sum(1 for _, c in self._outcomes if c)
+                rate_tripped = len(self._outcomes) >= SEARCH_GOVERNOR_MIN_SAMPLES and \
+                    window_captchas / len(self._outcomes) >= SEARCH_GOVERNOR_TRIP_CAPTCHA_RATE
+                if was_probe or rate_tripped or self._captcha_streak >= SEARCH_GOVERNOR_TRIP_STREAK:
+                    self._open_circuit(now, window_captchas)
+                else:
+                    logger.warning(f"[SearchGovernor] CAPTCHA; search rate cut to {self.rate_per_minute:.2f}/min.")
+            else:
+                self._captcha_streak = 0
+                self.rate_per_minute = min(self.max_rate, self.rate_per_minute + SEARCH_GOVERNOR_RATE_STEP)
+                if was_probe:
+                    self._state = CIRCUIT_CLOSED
+                    self._trips = 0
+                    logger.info(f"[SearchGovernor] Probe search clean; circuit closed at {self.rate_per_minute:.2f} searches/min.")
+            self._condition.notify_all()
+
+    def abandon_search(self):
+        """For a search that ended without a verdict (driver error etc.): frees a half-open probe slot."""
+        with self._condition:
+            if self._probe_in_flight:
+                self._probe_in_flight = False
+                self._condition.notify_all()
+
+    def _open_circuit(self, now, window_captchas):
+        self._trips += 1
+        self.totals['circuit_openings'] += 1
+        cooldown = min(SEARCH_GOVERNOR_MAX_COOLDOWN_SECONDS, SEARCH_GOVERNOR_BASE_COOLDOWN_SECONDS * (2 ** (self._trips - 1)))
+        self._state = CIRCUIT_OPEN
+        self._open_until = now + cooldown
+        self._outcomes.clear() # Judge the next period on fresh evidence
+        self._captcha_streak = 0
+        logger.error(f"[SearchGovernor] Circuit OPEN ({window_captchas} CAPTCHAs in window, opening #{self._trips}); "
+                     f"pausing all searches for {cooldown:.0f}s, then resuming at {self.rate_per_minute:.2f}/min.")
+
+    def stats(self):
+        with self._condition:
+            now = self._clock()
+            return dict(self.totals, state=self._state, rate_per_minute=round(self.rate_per_minute, 2),
+                        open_for_seconds=round(max(0.0, self._open_until - now), 1) if self._state == CIRCUIT_OPEN else 0.0)
+
+
+_governor = None
+_governor_lock = threading.Lock()
+
+
+def get_search_governor():
+    """The process-wide SearchGovernor shared by all GoogleSearchNewsURLExtractor instances."""
+    global _governor
+    if _governor is None:
+        with _governor_lock:
+            if _governor is None:
+                _governor = SearchGovernor()
+    return _governor
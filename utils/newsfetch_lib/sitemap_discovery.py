@@ -0,0 +1,261 @@
+# ~/CombinedNiftyNewsApp/utils/newsfetch_lib/sitemap_discovery.py
+"""
+Sitemap / RSS based URL discovery: a cheap alternative to Google SERP scraping.
+
+Most target news domains publish (news) sitemaps and RSS/Atom feeds carrying publication
+dates and titles, so candidate article URLs can be found with a handful of plain HTTP
+requests through the shared client instead of one Selenium search per keyword/domain.
+"""
+import gzip
+import logging
+import xml.etree.ElementTree as ET
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+
+from .http_client import fetch_html
+
+logger = logging.getLogger("utils.newsfetch_lib.sitemap_discovery")
+
+MAX_CHILD_SITEMAPS_PER_SOURCE = 50 # Guards against huge archive indexes (one sitemap per day for 10+ years)
+
+
+def _parse_datetime(value):
+    """Parses W3C/ISO-8601 (sitemaps, Atom) and RFC-822 (RSS) dates into naive UTC datetimes."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        try:
+            parsed = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def _child_text(element, name):
+    """Namespace-agnostic lookup of a descendant's text, e.g. 'loc' or 'publication_date'."""
+    found = element.find(f".//{{*}}{name}") # {*} matches any namespace or none
+    return found.text.strip() if found is not None and found.text else None
+
+
+class SitemapFeedDiscovery:
+    """
+    Crawls per-domain sitemap indexes and feeds and yields candidate article dicts:
+        {'url', 'title', 'published', 'source', 'entities'}
+
+    `sources` is the list of sitemap/feed URLs for the domain; without it the `Sitemap:`
+    lines of the domain's robots.txt are used. Pointing `sources` at a
+    local HTTP server serving fixture XML is enough to exercise the whole pipeline offline.
+
+    `watermarks` maps source URL -> (scanned_from, last_item_date): the contiguous range of
+    item dates already offered. With `incremental=True` and a requested range that starts
+    inside the stored one and reaches past its end, items (and child sitemaps whose lastmod
+    is) at or before last_item_date are skipped. Any other range (a backfill, or one starting
+    before scanned_from) is scanned as requested. After discover(), `self.watermarks` holds
+    the merged ranges; advance_watermarks(failed_urls) recomputes them once the candidates
+    have been fetched, so items whose fetch failed are offered again.
+    `keyword_matcher(text, url)` returns the entity matches for an item; items without a
+    match are dropped.
+    """
+
+    def __init__(self, news_domain, start_date, end_date, sources=None, watermarks=None,
+                 keyword_matcher=None, incremental=True):
+        self.news_domain = news_domain.lower()
+        self.start_dt = datetime.combine(start_date, datetime.min.time())
+        self.end_dt = datetime.combine(end_date, datetime.max.time())
+        self.sources = list(sources) if sources else None
+        self._previous_watermarks = dict(watermarks or {}) # Bounds are fixed for the whole run
+        self.watermarks = {}
+        self._latest_items = {} # source URL -> newest in-window item date seen this run
+        self._crawled_sources = set() # Sources whose top-level document was fetched
+        self._candidates = []
+        self.keyword_matcher = keyword_matcher
+        self.incremental = incremental
+        self.stats = {'documents_fetched': 0, 'items_seen': 0, 'items_out_of_range': 0,
+                      'items_unmatched': 0, 'candidates': 0, 'child_sitemaps_skipped': 0}
+
+    def _base_url(self):
+        host = self.news_domain.split('/')[0]
+        return f"https://{host}"
+
+    def _robots_sitemaps(self):
+        response = fetch_html(f"{self._base_url()}/robots.txt")
+        if response is None:
+            return []
+        sitemap_urls = [line.split(":", 1)[1].strip() for line in response.text.splitlines()
+                        if line.lower().startswith("sitemap:")]
+        # News sitemaps carry titles + publication dates; prefer them over full archives.
+        news_sitemaps = [u for u in sitemap_urls if "news" in u.lower()]
+        logger.info(f"[SitemapDiscovery] robots.txt for {self.news_domain} lists {len(sitemap_urls)} sitemaps ({len(news_sitemaps)} news).")
+        return news_sitemaps or sitemap_urls
+
+    def _fetch_xml(self, url):
+        response = fetch_html(url)
+        if response is None:
+            return None
+        self.stats['documents_fetched'] += 1
+        content = response.content
+        if content[:2] == b"\x1f\x8b": # .xml.gz served without Content-Encoding
+            try:
+                content = gzip.decompress(content)
+            except OSError as e:
+                logger.warning(f"[SitemapDiscovery] Could not gunzip {url}: {e}")
+                return None
+        try:
+            return ET.fromstring(content)
+        except ET.ParseError as e:
+            logger.warning(f"[SitemapDiscovery] XML parse error for {url}: {e}")
+            return None
+
+    def _effective_start(self, source_url):
+        scanned_from, watermark = self._previous_watermarks.get(source_url) or (None, None)
+        # Only the part not yet scanned, and only if nothing before the watermark is missing from the stored range.
+        if self.incremental and scanned_from and watermark and scanned_from <= self.start_dt < watermark < self.end_dt:
+            return watermark
+        return self.start_dt
+
+    def _child_rank(self, lastmod):
+        """
+        Sort key for a child sitemap: last modified inside the window first (newest first), then
+        undated, then later ones by how far past the window end. In a backfill through a daily
+        archive index the children for the requested days thus come before the cap, not years of
+        newer ones.
+        """
+        if lastmod is None:
+            return (1, timedelta(0))
+        if lastmod <= self.end_dt:
+            return (0, self.end_dt - lastmod)
+        return (2, lastmod - self.end_dt)
+
+    def _accept(self, source_url, url, title, published, candidates):
+        self.stats['items_seen'] += 1
+        if not url or self.news_domain not in url.lower():
+            return
+        lower_bound = self._effective_start(source_url)
+        in_window = published is not None and published <= self.end_dt and \
+            (published > lower_bound if lower_bound != self.start_dt else published >= lower_bound)
+        if not in_window:
+            self.stats['items_out_of_range'] += 1
+            return
+        if published > (self._latest_items.get(source_url) or datetime.min):
+            self._latest_items[source_url] = published
+        entities = self.keyword_matcher(title or "", url) if self.keyword_matcher else []
+        if self.keyword_matcher and not entities:
+            self.stats['items_unmatched'] += 1
+            return
+        candidates[url] = {'url': url, 'title': title, 'published': published,
+                           'source': source_url, 'entities': entities}
+
+    def _crawl(self, document_url, source_url, candidates, depth=0):
+        """
+        Walks one document; items are attributed (and watermarked) to the top-level `source_url`.
+        Returns False if the document could not be fetched or parsed.
+        """
+        root = self._fetch_xml(document_url)
+        if root is None:
+            return False
+        tag = root.tag.rsplit('}', 1)[-1].lower()
+
+        if tag == "sitemapindex":
+            children = []
+            for sitemap_el in root.findall("{*}sitemap"):
+                child_url = _child_text(sitemap_el, "loc")
+                child_lastmod = _parse_datetime(_child_text(sitemap_el, "lastmod"))
+                # A child last modified before the window (or the watermark) holds nothing new.
+                if child_lastmod and child_lastmod < self._effective_start(source_url):
+                    self.stats['child_sitemaps_skipped'] += 1
+                    continue
+                if child_url:
+                    children.append((self._child_rank(child_lastmod), child_url))
+            children.sort()
+            if depth < 2:
+                for _, child_url in children[:MAX_CHILD_SITEMAPS_PER_SOURCE]:
+                    self._crawl(child_url, source_url, candidates, depth + 1)
+
+        elif tag == "urlset":
+            for url_el in root.findall("{*}url"):
+                published = _parse_datetime(_child_text(url_el, "publication_date") or _child_text(url_el, "lastmod"))
+                self._accept(source_url, _child_text(url_el, "loc"), _child_text(url_el, "title"), published, candidates)
+
+        elif tag in ("rss", "rdf"): # RSS 2.0 / RSS 1.0
+            for item_el in root.findall(".//{*}item"):
+                published = _parse_datetime(_child_text(item_el, "pubDate") or _child_text(item_el, "date"))
+                self._accept(source_url, _child_text(item_el, "link"), _child_text(item_el, "title"), published, candidates)
+
+        elif tag == "feed": # Atom
+            for entry_el in root.findall("{*}entry"):
+                link_el = entry_el.find("{*}link")
+                link = link_el.get("href") if link_el is not None else None
+                published = _parse_datetime(_child_text(entry_el, "published") or _child_text(entry_el, "updated"))
+                self._accept(source_url, link, _child_text(entry_el, "title"), published, candidates)
+        else:
+            logger.warning(f"[SitemapDiscovery] Unrecognised document root <{tag}> at {document_url}")
+        return True
+
+    def advance_watermarks(self, failed_urls=()):
+        """
+        Sets (and returns) self.watermarks for the sources crawled this run: the stored range
+        merged with this run's. Candidates in `failed_urls` (fetch or save errors) end the range
+        just before the oldest of them, so the next incremental run offers them again. Sources
+        that could not be fetched, or had nothing in the window, keep their stored range.
+        """
+        failed_dates = {}
+        for candidate in self._candidates:
+            if candidate['url'] in failed_urls:
+                source_url = candidate['source']
+                failed_dates[source_url] = min(candidate['published'], failed_dates.get(source_url, datetime.max))
+        self.watermarks = {}
+        for source_url in self._crawled_sources:
+            previous_from, previous_through = self._previous_watermarks.get(source_url) or (None, None)
+            if source_url in failed_dates:
+                through = covered_through = failed_dates[source_url] - timedelta(microseconds=1)
+            else:
+                through, covered_through = self._latest_items.get(source_url), self.end_dt
+            scanned_from = self.start_dt
+            if previous_from and previous_through:
+                if self.start_dt <= previous_through and previous_from <= covered_through: # Joins the stored range
+                    scanned_from = min(self.start_dt, previous_from)
+                    if source_url not in failed_dates:
+                        through = max(through or previous_through, previous_through)
+                elif covered_through < previous_from:
+                    continue # An older, separate range: incremental runs keep resuming from the stored one
+            if through is None or through < scanned_from:
+                continue
+            self.watermarks[source_url] = (scanned_from, through)
+        return self.watermarks
+
+    def discover(self):
+        """Returns candidate dicts (newest first) for this domain and date window."""
+        source_urls = self.sources if self.sources is not None else self._robots_sitemaps()
+        candidates = {}
+        for source_url in source_urls:
+            try:
+                if self._crawl(source_url, source_url, candidates):
+                    self._crawled_sources.add(source_url)
+            except Exception as e:
+                logger.error(f"[SitemapDiscovery] Error crawling {source_url}: {e}", exc_info=True)
+        self.stats['candidates'] = len(candidates)
+        logger.info(f"[SitemapDiscovery] {self.news_domain}: {self.stats}")
+        self._candidates = sorted(candidates.values(), key=lambda c: c['published'], reverse=True)
+        self.advance_watermarks()
+        return list(self._candidates)
+
+
+# Standalone Test Block
+if __name__ == '__main__':
+    import sys
+    from datetime import date
+    from utils.logging_setup import setup_queued_logging
+    setup_queued_logging(None, level=logging.DEBUG, fmt='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    # Usage: python -m utils.newsfetch_lib.sitemap_discovery <domain> [sitemap_or_feed_url ...]
+    # e.g. serve fixtures with `python -m http.server 8000` and pass http://localhost:8000/news-sitemap.xml
+    test_domain = sys.argv[1] if len(sys.argv) > 1 else "livemint.com"
+    test_sources = sys.argv[2:] or None
+    discovery = SitemapFeedDiscovery(test_domain, date.today() - timedelta(days=7), date.today(), sources=test_sources)
+    for candidate in discovery.discover()[:20]:
+        logger.info(f"{candidate['published']} | {candidate['title']} | {candidate['url']}")
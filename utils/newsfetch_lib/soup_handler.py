@@ -1,15 +1,19 @@
 import json
 from bs4 import BeautifulSoup
-from requests import get
+
+from .http_client import fetch_html
 
 
 class SoupHandler:
     """Handle interactions with BeautifulSoup for HTML parsing."""
 
-    def __init__(self, url: str):
-        """Initialize the SoupHandler with a given URL."""
+    def __init__(self, url: str, html: str = None):
+        """Initialize the SoupHandler with a given URL, parsing `html` if it was already fetched."""
         self.url = url
-        self.__soup = self.__safe_execute(lambda: BeautifulSoup(get(self.url).text, "lxml"))
+        if html is None:
+            response = fetch_html(self.url)
+            html = response.text if response is not None else None
+        self.__soup = self.__safe_execute(lambda: BeautifulSoup(html, "lxml")) if html else None
 
     @staticmethod
     def __safe_execute(func):
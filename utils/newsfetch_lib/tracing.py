@@ -0,0 +1,132 @@
+# ~/CombinedNiftyNewsApp/utils/newsfetch_lib/tracing.py
+"""
+Optional per-article tracing for the extraction pipeline. Off by default.
+
+Newspaper() opens a trace per article; handlers wrap their work in span(handler, stage),
+which records the duration and outcome ('ok', 'empty', 'error:<Exception>'). When the
+article is done the whole trace is appended as one JSON line to NEWSFETCH_TRACE_FILE if
+it was sampled (NEWSFETCH_TRACE_SAMPLE_RATE, 0..1) or took at least
+NEWSFETCH_TRACE_SLOW_SECONDS -- so slow articles can be kept without tracing every one.
+With neither setting, start_trace()/span() are near no-ops.
+"""
+import json
+import logging
+import os
+import random
+import threading
+import time
+from contextvars import ContextVar
+from datetime import datetime, timezone
+
+logger = logging.getLogger("utils.newsfetch_lib.tracing")
+
+NEWSFETCH_TRACE_SAMPLE_RATE = float(os.environ.get("NEWSFETCH_TRACE_SAMPLE_RATE", 0))
+NEWSFETCH_TRACE_SLOW_SECONDS = float(os.environ.get("NEWSFETCH_TRACE_SLOW_SECONDS", 0)) # 0 = no slow-article capture
+NEWSFETCH_TRACE_FILE = os.environ.get("NEWSFETCH_TRACE_FILE", "newsfetch_traces.jsonl")
+
+_current_trace = ContextVar("newsfetch_trace", default=None) # Per thread: fetch workers each trace their own article
+_write_lock = threading.Lock()
+
+
+class _Span:
+    __slots__ = ("trace", "handler", "stage", "outcome", "started")
+
+    def __init__(self, trace, handler, stage):
+        self.trace = trace
+        self.handler = handler
+        self.stage = stage
+        self.outcome = "ok" # Callers may set e.g. 'empty' before leaving the block
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.outcome = f"error:{exc_type.__name__}"
+        self.trace.spans.append({'handler': self.handler, 'stage': self.stage, 'outcome': self.outcome,
+                                 'start_ms': round((self.started - self.trace.started) * 1000, 1),
+                                 'duration_ms': round((time.perf_counter() - self.started) * 1000, 1)})
+        return False
+
+
+class _NullSpan:
+    """Returned when no trace is active; `outcome` writes are discarded."""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    @property
+    def outcome(self):
+        return None
+
+    @outcome.setter
+    def outcome(self, value):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class ArticleTrace:
+    """Context manager for one article; becomes the target of span() in this thread/context."""
+
+    def __init__(self, url, sampled, slow_seconds):
+        self.url = url
+        self.sampled = sampled
+        self.slow_seconds = slow_seconds
+        self.spans = []
+        self.outcome = "ok"
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        self.started_at = datetime.now(timezone.utc).replace(tzinfo=None)
+        self._token = _current_trace.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _current_trace.reset(self._token)
+        duration = time.perf_counter() - self.started
+        if exc_type is not None:
+            self.outcome = f"error:{exc_type.__name__}"
+        slow = bool(self.slow_seconds) and duration >= self.slow_seconds
+        if self.sampled or slow:
+            self._write(duration, slow)
+        return False
+
+    def _write(self, duration, slow):
+        record = {'url': self.url, 'started_at': self.started_at.isoformat(), 'duration_ms': round(duration * 1000, 1),
+                  'outcome': self.outcome, 'slow': slow, 'spans': self.spans}
+        try:
+            with _write_lock, open(NEWSFETCH_TRACE_FILE, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record) + "\n")
+        except OSError as e:
+            logger.warning("[Tracing] Could not append trace for %s: %s", self.url, e)
+
+
+class _NullTrace(_NullSpan):
+    __slots__ = ()
+
+
+_NULL_TRACE = _NullTrace()
+
+
+def start_trace(url, sample_rate=None, slow_seconds=None):
+    """Trace context for one article; a shared no-op unless sampling or slow capture is enabled."""
+    sample_rate = NEWSFETCH_TRACE_SAMPLE_RATE if sample_rate is None else sample_rate
+    slow_seconds = NEWSFETCH_TRACE_SLOW_SECONDS if slow_seconds is None else slow_seconds
+    if sample_rate <= 0 and slow_seconds <= 0:
+        return _NULL_TRACE
+    return ArticleTrace(url, sampled=random.random() < sample_rate, slow_seconds=slow_seconds)
+
+
+def span(handler, stage):
+    """Times one handler stage into the current article trace (no-op outside a trace)."""
+    trace = _current_trace.get()
+    if trace is None:
+        return _NULL_SPAN
+    return _Span(trace, handler, stage)
@@ -0,0 +1,329 @@
+# utils/price_store.py
+"""
+Local incremental daily OHLCV store: one Parquet file per NSE symbol under PRICE_STORE_DIR
+(Date index; Open/High/Low/Close/Volume, auto-adjusted). Each file's schema metadata records
+the date range already requested from yfinance, so ensure_prices() only downloads dates
+outside it. Those downloads are batched: symbols missing the same range share one
+multi-ticker yf.download call. Readers never touch the network, so stored data also works offline.
+"""
+import json
+import logging
+import os
+import re
+import threading
+from datetime import date, datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from .gemini_utils import NIFTY_SECTORS_QUERY_CONFIG
+
+logger = logging.getLogger(__name__)
+
+PRICE_STORE_DIR = os.environ.get("PRICE_STORE_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), "price_data"))
+PRICE_STORE_OFFLINE = os.environ.get("PRICE_STORE_OFFLINE", "").lower() in ("1", "true", "yes") # Never download
+PRICE_TAIL_REFRESH_MINUTES = int(os.environ.get("PRICE_TAIL_REFRESH_MINUTES", 60)) # Re-check today's bar at most this often
+PRICE_COLUMNS = ["Open", "High", "Low", "Close", "Volume"]
+DOWNLOAD_BATCH_SIZE = 50 # Tickers per yf.download call
+_COVERAGE_KEY = b"price_store"
+
+_write_lock = threading.Lock() # Flask request threads may top up the same symbol concurrently
+
+# NSE symbols for the stock names used in NIFTY_SECTORS_QUERY_CONFIG (and as related_stock)
+NSE_SYMBOLS = {
+    # Nifty IT
+    "TCS": "TCS", "Infosys": "INFY", "HCL Technologies": "HCLTECH", "Wipro": "WIPRO", "Tech Mahindra": "TECHM",
+    "LTIMindtree": "LTIM", "Mphasis": "MPHASIS", "Persistent Systems": "PERSISTENT", "Coforge": "COFORGE",
+    "Zensar Technologies": "ZENSARTECH", "Oracle Financial Services": "OFSS", "Happiest Minds": "HAPPSTMNDS",
+    "Cyient": "CYIENT", "Sonata Software": "SONATSOFTW", "Intellect Design Arena": "INTELLECT",
+    # Banks
+    "HDFC Bank": "HDFCBANK", "ICICI Bank": "ICICIBANK", "SBI": "SBIN", "Axis Bank": "AXISBANK",
+    "Kotak Mahindra Bank": "KOTAKBANK", "IndusInd Bank": "INDUSINDBK", "Bank of Baroda": "BANKBARODA", "PNB": "PNB",
+    "Canara Bank": "CANBK", "Yes Bank": "YESBANK", "IDFC First Bank": "IDFCFIRSTB", "Federal Bank": "FEDERALBNK",
+    "Bandhan Bank": "BANDHANBNK", "Union Bank of India": "UNIONBANK", "Indian Bank": "INDIANB",
+    "Bank of India": "BANKINDIA", "Central Bank of India": "CENTRALBK", "UCO Bank": "UCOBANK",
+    "Indian Overseas Bank": "IOB", "Maharashtra Bank": "MAHABANK", "Punjab & Sind Bank": "PSB", "J&K Bank": "J&KBANK",
+    "IDBI Bank": "IDBI", "RBL Bank": "RBLBANK", "City Union Bank": "CUB", "Karur Vysya Bank": "KARURVYSYA",
+    "DCB Bank": "DCBBANK", "Equitas Small Finance Bank": "EQUITASBNK", "AU Small Finance Bank": "AUBANK",
+    # Auto
+    "Maruti Suzuki": "MARUTI", "Tata Motors": "TATAMOTORS", "Mahindra & Mahindra": "M&M", "Bajaj Auto": "BAJAJ-AUTO",
+    "Hero MotoCorp": "HEROMOTOCO", "Eicher Motors": "EICHERMOT", "TVS Motor": "TVSMOTOR", "Ashok Leyland": "ASHOKLEY",
+    "Bharat Forge": "BHARATFORG", "Bosch": "BOSCHLTD", "MRF": "MRF", "Apollo Tyres": "APOLLOTYRE",
+    "Exide Industries": "EXIDEIND", "Balkrishna Industries": "BALKRISIND", "Ceat": "CEATLTD",
+    # Pharma / healthcare
+    "Sun Pharma": "SUNPHARMA", "Dr Reddy's Labs": "DRREDDY", "Cipla": "CIPLA", "Divi's Laboratories": "DIVISLAB",
+    "Aurobindo Pharma": "AUROPHARMA", "Lupin": "LUPIN", "Torrent Pharma": "TORNTPHARM", "Alkem Laboratories": "ALKEM",
+    "Zydus Lifesciences": "ZYDUSLIFE", "Mankind Pharma": "MANKIND", "Biocon": "BIOCON",
+    "Glenmark Pharmaceuticals": "GLENMARK", "Laurus Labs": "LAURUSLABS", "Ipca Laboratories": "IPCALAB",
+    "Abbott India": "ABBOTINDIA", "Apollo Hospitals": "APOLLOHOSP", "Fortis Healthcare": "FORTIS",
+    "Max Healthcare": "MAXHEALTH", "Metropolis Healthcare": "METROPOLIS", "Dr Lal PathLabs": "LALPATHLAB",
+    "Narayana Hrudayalaya": "NH", "Aster DM Healthcare": "ASTERDM", "Thyrocare Technologies": "THYROCARE",
+    "Healthcare Global Enterprises": "HCG", "Krishna Institute of Medical Sciences": "KIMS",
+    "Global Health Ltd (Medanta)": "MEDANTA", "Rainbow Childrens Medicare": "RAINBOW", "Kovai Medical Center": "KOVAI",
+    "Shalby Multi-specialty Hospitals": "SHALBY", "Vijaya Diagnostic Centre": "VIJAYA",
+    # FMCG / consumer
+    "Hindustan Unilever": "HINDUNILVR", "ITC": "ITC", "ITC Ltd": "ITC", "Nestle India": "NESTLEIND",
+    "Britannia Industries": "BRITANNIA", "Dabur India": "DABUR", "Godrej Consumer Products": "GODREJCP",
+    "Colgate-Palmolive India": "COLPAL", "Marico": "MARICO", "United Spirits": "UNITDSPR", "Varun Beverages": "VBL",
+    "Emami": "EMAMILTD", "Jyothy Labs": "JYOTHYLAB", "Tata Consumer Products": "TATACONSUM",
+    "Patanjali Foods": "PATANJALI", "Radico Khaitan": "RADICO", "Havells India": "HAVELLS", "Voltas": "VOLTAS",
+    "Whirlpool of India": "WHIRLPOOL", "Crompton Greaves Consumer": "CROMPTON", "Bajaj Electricals": "BAJAJELEC",
+    "Blue Star": "BLUESTARCO", "V-Guard Industries": "VGUARD", "Symphony": "SYMPHONY", "TTK Prestige": "TTKPRESTIG",
+    "Orient Electric": "ORIENTELEC", "Dixon Technologies": "DIXON", "Amber Enterprises": "AMBER",
+    "Polycab India": "POLYCAB", "Relaxo Footwears": "RELAXO", "Century Plyboards": "CENTURYPLY",
+    "Avenue Supermarts (DMart)": "DMART", "Zomato": "ETERNAL", "Indian Hotels": "INDHOTEL",
+    # Financial services
+    "Bajaj Finance": "BAJFINANCE", "HDFC Life Insurance": "HDFCLIFE", "SBI Life Insurance": "SBILIFE",
+    "ICICI Prudential Life": "ICICIPRULI", "Shriram Finance": "SHRIRAMFIN", "Cholamandalam Investment": "CHOLAFIN",
+    "Power Finance Corporation": "PFC", "REC Limited": "RECLTD", "Muthoot Finance": "MUTHOOTFIN",
+    "Bajaj Finserv": "BAJAJFINSV", "LIC Housing Finance": "LICHSGFIN", "Aditya Birla Capital": "ABCAPITAL",
+    "Max Financial Services": "MFSL", "Piramal Enterprises": "PEL", "L&T Finance Holdings": "LTF",
+    # Media / telecom
+    "Zee Entertainment": "ZEEL", "Sun TV Network": "SUNTV", "PVR Inox": "PVRINOX", "Dish TV India": "DISHTV",
+    "Network18 Media": "NETWORK18", "TV Today Network": "TVTODAY", "Jagran Prakashan": "JAGRAN", "DB Corp": "DBCORP",
+    "Nazara Technologies": "NAZARA", "Saregama India": "SAREGAMA", "Hathway Cable": "HATHWAY",
+    "Tips Industries": "TIPSMUSIC", "Balaji Telefilms": "BALAJITELE", "Prime Focus": "PFOCUS", "NDTV": "NDTV",
+    "Bharti Airtel": "BHARTIARTL", "Vodafone Idea": "IDEA",
+    # Metals / commodities
+    "Tata Steel": "TATASTEEL", "JSW Steel": "JSWSTEEL", "Hindalco Industries": "HINDALCO", "Vedanta": "VEDL",
+    "SAIL": "SAIL", "NALCO": "NATIONALUM", "Jindal Steel & Power": "JINDALSTEL", "APL Apollo Tubes": "APLAPOLLO",
+    "Ratnamani Metals": "RATNAMANI", "Hindustan Zinc": "HINDZINC", "NMDC": "NMDC", "Welspun Corp": "WELCORP",
+    "JSL Stainless": "JSL", "Hindustan Copper": "HINDCOPPER", "MOIL": "MOIL", "UltraTech Cement": "ULTRACEMCO",
+    "Shree Cement": "SHREECEM", "Asian Paints": "ASIANPAINT", "Grasim Industries": "GRASIM",
+    "Pidilite Industries": "PIDILITIND", "Ambuja Cements": "AMBUJACEM", "ACC": "ACC", "Tata Chemicals": "TATACHEM",
+    "UPL": "UPL", "Coromandel International": "COROMANDEL", "Deepak Nitrite": "DEEPAKNTR", "SRF": "SRF",
+    "Gujarat Fluorochemicals": "FLUOROCHEM", "Kansai Nerolac": "KANSAINER", "Berger Paints": "BERGEPAINT",
+    "PI Industries": "PIIND", "Aarti Industries": "AARTIIND", "Astral Ltd": "ASTRAL",
+    # Realty
+    "DLF": "DLF", "Godrej Properties": "GODREJPROP", "Oberoi Realty": "OBEROIRLTY", "Prestige Estates": "PRESTIGE",
+    "Brigade Enterprises": "BRIGADE", "Sobha": "SOBHA", "Phoenix Mills": "PHOENIXLTD", "Macrotech Developers": "LODHA",
+    "Sunteck Realty": "SUNTECK", "Mahindra Lifespace": "MAHLIFE", "Kolte Patil Developers": "KOLTEPATIL",
+    "Puravankara": "PURVA", "Anant Raj": "ANANTRAJ", "Indiabulls Real Estate": "IBREALEST", "NBCC India": "NBCC",
+    # Energy / oil & gas / PSE
+    "Reliance Industries": "RELIANCE", "NTPC": "NTPC", "Power Grid Corporation": "POWERGRID",
+    "Adani Green Energy": "ADANIGREEN", "Tata Power": "TATAPOWER", "Adani Power": "ADANIPOWER",
+    "JSW Energy": "JSWENERGY", "NHPC": "NHPC", "Torrent Power": "TORNTPOWER", "SJVN": "SJVN",
+    "Indian Oil Corporation": "IOC", "IOC": "IOC", "BPCL": "BPCL", "GAIL India": "GAIL", "ONGC": "ONGC",
+    "Coal India": "COALINDIA", "BHEL": "BHEL", "HPCL": "HINDPETRO", "Oil India": "OIL", "Petronet LNG": "PETRONET",
+    "Indraprastha Gas": "IGL", "Mahanagar Gas": "MGL", "Gujarat Gas": "GUJGASLTD", "Adani Total Gas": "ATGL",
+    "Castrol India": "CASTROLIND", "Gulf Oil Lubricants": "GULFOILLUB", "Aegis Logistics": "AEGISLOG",
+    "Bharat Electronics": "BEL", "Hindustan Aeronautics": "HAL", "Cochin Shipyard": "COCHINSHIP",
+    "Mazagon Dock Shipbuilders": "MAZDOCK", "Garden Reach Shipbuilders": "GRSE", "RITES Ltd": "RITES",
+    "Engineers India Ltd": "ENGINERSIN",
+    # Infrastructure / capital goods
+    "Larsen & Toubro": "LT", "Adani Ports and SEZ": "ADANIPORTS", "GMR Airports Infrastructure": "GMRAIRPORT",
+    "IRB Infrastructure": "IRB", "KNR Constructions": "KNRCON", "PNC Infratech": "PNCINFRA", "NCC": "NCC",
+    "Dilip Buildcon": "DBL", "Ashoka Buildcon": "ASHOKA", "GR Infraprojects": "GRINFRA",
+    "HG Infra Engineering": "HGINFRA", "Container Corporation": "CONCOR", "Siemens India": "SIEMENS",
+    "Cummins India": "CUMMINSIND", "ABB India": "ABB",
+}
+_CONFIGURED_SYMBOLS = set(NSE_SYMBOLS.values())
+
+
+def nse_symbol(name_or_ticker):
+    """NSE symbol for a configured stock name; otherwise the input upper-cased, minus any exchange suffix."""
+    if name_or_ticker in NSE_SYMBOLS:
+        return NSE_SYMBOLS[name_or_ticker]
+    return name_or_ticker.strip().upper().split(".")[0]
+
+
+def yahoo_ticker(symbol):
+    return symbol if "." in symbol else f"{symbol}.NS"
+
+
+def sector_peer_symbols(stock_name):
+    """Symbols of every configured sector containing `stock_name` (so one download tops up the whole sector)."""
+    peers = []
+    for details in NIFTY_SECTORS_QUERY_CONFIG.values():
+        stocks = details.get("stocks", {})
+        if stock_name in stocks:
+            peers.extend(nse_symbol(name) for name in stocks)
+    return list(dict.fromkeys(peers))
+
+
+def _symbol_path(symbol):
+    safe_name = re.sub(r"[^A-Za-z0-9_.-]", lambda match: f"%{ord(match.group(0)):02X}", symbol) # M&M -> M%26M
+    return os.path.join(PRICE_STORE_DIR, f"{safe_name}.parquet")
+
+
+def stored_coverage(symbol):
+    """{'start', 'end' (dates requested so far), 'ticker', 'fetched_at'} from the file's metadata, or None."""
+    path = _symbol_path(symbol)
+    if not os.path.exists(path):
+        return None
+    metadata = pq.read_schema(path).metadata or {}
+    if _COVERAGE_KEY not in metadata:
+        return None
+    coverage = json.loads(metadata[_COVERAGE_KEY])
+    coverage['start'] = date.fromisoformat(coverage['start'])
+    coverage['end'] = date.fromisoformat(coverage['end'])
+    return coverage
+
+
+def read_prices(symbol, start_date=None, end_date=None, columns=None):
+    """Stored daily rows for `symbol` within [start_date, end_date] (empty DataFrame if none stored)."""
+    path = _symbol_path(symbol)
+    if not os.path.exists(path):
+        return pd.DataFrame(columns=columns or PRICE_COLUMNS, index=pd.DatetimeIndex([], name="Date"))
+    df = pd.read_parquet(path, columns=columns)
+    if start_date is not None:
+        df = df[df.index >= pd.Timestamp(start_date)]
+    if end_date is not None:
+        df = df[df.index <= pd.Timestamp(end_date)]
+    return df
+
+
+def write_prices(symbol, df, covered_start, covered_end, ticker):
+    """
+    Merges `df` (Date index, PRICE_COLUMNS; may be empty) into the symbol's file (newer rows win) and widens
+    its recorded coverage to include [covered_start, covered_end]. Returns the stored row count.
+    """
+    df = df.reindex(columns=PRICE_COLUMNS).dropna(subset=["Close"])
+    index = pd.DatetimeIndex(df.index)
+    df.index = (index.tz_convert(None) if index.tz is not None else index).normalize()
+    df.index.name = "Date"
+    with _write_lock:
+        os.makedirs(PRICE_STORE_DIR, exist_ok=True)
+        existing = read_prices(symbol)
+        coverage = stored_coverage(symbol)
+        if not existing.empty:
+            df = pd.concat([existing[~existing.index.isin(df.index)], df]) if not df.empty else existing
+        df = df.sort_index()
+        if coverage:
+            covered_start, covered_end = min(covered_start, coverage['start']), max(covered_end, coverage['end'])
+        table = pa.Table.from_pandas(df.astype("float64"), preserve_index=True)
+        metadata = dict(table.schema.metadata or {})
+        metadata[_COVERAGE_KEY] = json.dumps({
+            'start': covered_start.isoformat(), 'end': covered_end.isoformat(), 'ticker': ticker,
+            'fetched_at': datetime.now(timezone.utc).isoformat(timespec="seconds")}).encode("utf-8")
+        temp_path = _symbol_path(symbol) + ".tmp"
+        pq.write_table(table.replace_schema_metadata(metadata), temp_path)
+        os.replace(temp_path, _symbol_path(symbol)) # Readers never see a half-written file
+    return len(df)
+
+
+def load_close_matrix(symbols, start_date, end_date):
+    """
+    (trade_dates datetime64[D] array, closes float64 array of shape (len(symbols), len(trade_dates))) on the union
+    of stored trading days in [start_date, end_date]; NaN where a symbol has no close that day.
+    """
+    closes = {symbol: read_prices(symbol, start_date, end_date, columns=["Close"])["Close"] for symbol in symbols}
+    frame = pd.DataFrame(closes, columns=list(symbols)).sort_index()
+    return frame.index.values.astype("datetime64[D]"), frame.to_numpy(dtype=np.float64).T
+
+
+def chart_price_records(df):
+    """[{'date': 'YYYY-MM-DD', 'close_price': float}] for the ad-hoc chart, without a per-row loop over the frame."""
+    closes = df["Close"].dropna()
+    return [{"date": day, "close_price": close}
+            for day, close in zip(closes.index.strftime("%Y-%m-%d"), closes.to_numpy(dtype=np.float64).tolist())]
+
+
+def _missing_ranges(symbols, start_date, end_date):
+    """{(range_start, range_end): [symbols]} of dates never requested; today's bar is re-checked every PRICE_TAIL_REFRESH_MINUTES."""
+    now = datetime.now(timezone.utc)
+    yesterday = now.date() - timedelta(days=1)
+    end_date = min(end_date, now.date())
+    missing = {}
+    for symbol in symbols:
+        coverage = stored_coverage(symbol)
+        if coverage is None:
+            ranges = [(start_date, end_date)]
+        else:
+            ranges = []
+            if start_date < coverage['start']:
+                ranges.append((start_date, coverage['start'] - timedelta(days=1)))
+            if end_date > coverage['end']:
+                tail_start = coverage['end'] + timedelta(days=1)
+                recently_fetched = now - datetime.fromisoformat(coverage['fetched_at']) < timedelta(minutes=PRICE_TAIL_REFRESH_MINUTES)
+                if tail_start < yesterday or not recently_fetched: # Only the still-open latest bar is throttled
+                    ranges.append((tail_start, end_date))
+        for missing_range in ranges:
+            if missing_range[0] <= missing_range[1]:
+                missing.setdefault(missing_range, []).append(symbol)
+    return missing
+
+
+def _download_batch(tickers, start_date, end_date):
+    """{ticker: DataFrame} from one multi-ticker yf.download (empty frames for tickers without data); None on failure."""
+    import yfinance as yf # Only needed to fill the store
+
+    try:
+        data = yf.download(list(tickers), start=start_date.strftime("%Y-%m-%d"),
+                           end=(end_date + timedelta(days=1)).strftime("%Y-%m-%d"), # yfinance's end is exclusive
+                           progress=False, auto_adjust=True, group_by="ticker", threads=True)
+    except Exception as e:
+        logger.error(f"[PriceStore] yfinance download failed for {len(tickers)} tickers ({start_date} to {end_date}): {e}")
+        return None
+    frames = {}
+    for ticker in tickers:
+        if data.empty:
+            frame = pd.DataFrame(columns=PRICE_COLUMNS)
+        elif isinstance(data.columns, pd.MultiIndex):
+            frame = data[ticker] if ticker in data.columns.get_level_values(0) else pd.DataFrame(columns=PRICE_COLUMNS)
+        else: # Single ticker without a ticker level
+            frame = data
+        frames[ticker] = frame.dropna(how="all")
+    return frames
+
+
+def ensure_prices(symbols, start_date, end_date, offline=None):
+    """
+    Downloads only the dates in [start_date, end_date] not yet requested for each symbol, in batched multi-ticker
+    calls, and stores them. Plain tickers (no configured NSE symbol) that return nothing as SYMBOL.NS are retried
+    without the suffix. Returns {symbol: rows stored} for symbols that were topped up.
+    """
+    if PRICE_STORE_OFFLINE if offline is None else offline:
+        return {}
+    symbols = list(dict.fromkeys(symbols))
+    stored = {}
+    for (range_start, range_end), range_symbols in _missing_ranges(symbols, start_date, end_date).items():
+        covered_end = min(range_end, datetime.now(timezone.utc).date() - timedelta(days=1)) # Today's bar may still change
+        for batch_start in range(0, len(range_symbols), DOWNLOAD_BATCH_SIZE):
+            batch = range_symbols[batch_start:batch_start + DOWNLOAD_BATCH_SIZE]
+            tickers = {(stored_coverage(symbol) or {}).get('ticker') or yahoo_ticker(symbol): symbol for symbol in batch}
+            frames = _download_batch(tickers, range_start, range_end)
+            if frames is None:
+                continue # Network/API failure: leave coverage unchanged so the range is retried
+            retry = {ticker[:-3]: symbol for ticker, symbol in tickers.items()
+                     if frames[ticker].empty and ticker.endswith(".NS") and symbol not in _CONFIGURED_SYMBOLS
+                     and stored_coverage(symbol) is None}
+            if retry:
+                retried = _download_batch(retry, range_start, range_end) or {}
+                for ticker, symbol in retry.items():
+                    if not retried.get(ticker, pd.DataFrame()).empty:
+                        del frames[f"{ticker}.NS"]
+                        frames[ticker] = retried[ticker]
+                        tickers[ticker] = symbol
+            if all(frame.empty for frame in frames.values()):
+                # yfinance logs failures instead of raising, so a batch with no rows at all is treated as one
+                logger.warning(f"[PriceStore] No rows returned for {len(batch)} symbols ({range_start} to {range_end}); coverage left unchanged.")
+                continue
+            for ticker, frame in frames.items():
+                if frame.empty:
+                    continue # Nothing confirmed for this symbol: keep the range missing so it is requested again
+                symbol = tickers[ticker]
+                stored[symbol] = write_prices(symbol, frame, range_start, max(covered_end, range_start - timedelta(days=1)), ticker)
+        logger.info(f"[PriceStore] Topped up {len(range_symbols)} symbols for {range_start} to {range_end}.")
+    return stored
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Top up the local price store for configured sectors or symbols.")
+    parser.add_argument("--start-date", type=date.fromisoformat, required=True)
+    parser.add_argument("--end-date", type=date.fromisoformat, default=date.today())
+    parser.add_argument("--sectors", nargs="*", help="Sectors from NIFTY_SECTORS_QUERY_CONFIG (default: all).")
+    parser.add_argument("--symbols", nargs="*", help="Explicit NSE symbols or configured stock names instead of sectors.")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    if args.symbols:
+        wanted = [nse_symbol(symbol) for symbol in args.symbols]
+    else:
+        wanted = [nse_symbol(name) for sector, details in NIFTY_SECTORS_QUERY_CONFIG.items()
+                  if not args.sectors or sector in args.sectors for name in details.get("stocks", {})]
+    result = ensure_prices(wanted, args.start_date, args.end_date, offline=False)
+    print(f"Topped up {len(result)} of {len(set(wanted))} symbols.")
@@ -0,0 +1,69 @@
+# utils/query_scheduler.py
+import logging
+import math
+from collections import defaultdict
+
+logger = logging.getLogger(__name__)
+
+YIELD_PRIOR_STRENGTH = 3.0   # Pseudo-searches pulling a cell's estimate towards its domain/entity prior
+YIELD_EXPLORATION_WEIGHT = 0.5 # UCB bonus scale; 0 = pure exploitation of past yield
+GLOBAL_PRIOR_YIELD = 1.0     # Assumed new articles per search before any history exists
+
+
+class QueryScheduler:
+    """
+    Orders Google search jobs by expected new in-range articles per unit cost.
+
+    History comes from get_query_yield_stats(): {(entity_type, entity_name, domain, pattern):
+    (searches, articles_saved, urls_found)}. A cell's expected yield is its mean shrunk towards a
+    prior built from the same domain (over all entities) and the same entity (over all domains),
+    so a niche stock on a domain that never covers it sinks even before it has much history of
+    its own. An upper-confidence bonus that shrinks with the cell's search count keeps untried
+    pairs from being starved. observe() feeds results from the running scrape back in.
+    """
+
+    def __init__(self, yield_stats=None, prior_strength=YIELD_PRIOR_STRENGTH, exploration_weight=YIELD_EXPLORATION_WEIGHT):
+        self.prior_strength = prior_strength
+        self.exploration_weight = exploration_weight
+        self._cells = defaultdict(lambda: [0, 0]) # key -> [searches, articles_saved]
+        self._domains = defaultdict(lambda: [0, 0]) # (entity_type, domain) -> [searches, articles_saved]
+        self._entities = defaultdict(lambda: [0, 0]) # (entity_type, entity_name) -> [searches, articles_saved]
+        self._total = [0, 0]
+        for key, (searches, articles_saved, _urls_found) in (yield_stats or {}).items():
+            self._add(key, searches, articles_saved)
+
+    def _add(self, key, searches, articles_saved):
+        entity_type, entity_name, domain, _pattern = key
+        for bucket in (self._cells[key], self._domains[(entity_type, domain)], self._entities[(entity_type, entity_name)], self._total):
+            bucket[0] += searches
+            bucket[1] += articles_saved
+
+    def observe(self, key, articles_saved, searches=1):
+        self._add(key, searches, articles_saved)
+
+    def _shrunk_mean(self, bucket, prior):
+        searches, saved = bucket
+        return (saved + self.prior_strength * prior) / (searches + self.prior_strength)
+
+    def expected_yield(self, key):
+        entity_type, entity_name, domain, _pattern = key
+        global_mean = self._shrunk_mean(self._total, GLOBAL_PRIOR_YIELD)
+        domain_mean = self._shrunk_mean(self._domains.get((entity_type, domain), (0, 0)), global_mean)
+        entity_mean = self._shrunk_mean(self._entities.get((entity_type, entity_name), (0, 0)), global_mean)
+        return self._shrunk_mean(self._cells.get(key, (0, 0)), (domain_mean + entity_mean) / 2.0)
+
+    def score(self, key, cost=1.0):
+        """Expected yield per unit cost plus an exploration bonus (same units, scaled by the global mean)."""
+        cell_searches = self._cells[key][0] if key in self._cells else 0
+        global_mean = self._shrunk_mean(self._total, GLOBAL_PRIOR_YIELD)
+        bonus = self.exploration_weight * global_mean * math.sqrt(math.log(self._total[0] + 2) / (cell_searches + 1))
+        return (self.expected_yield(key) + bonus) / max(cost, 1e-9)
+
+    def pop_best(self, jobs, key_func, cost_func=lambda job: 1.0):
+        """Removes and returns the highest-scoring job from the `jobs` list (re-scored on every call)."""
+        best_idx = max(range(len(jobs)), key=lambda idx: self.score(key_func(jobs[idx]), cost_func(jobs[idx])))
+        return jobs.pop(best_idx)
+
+    def rank(self, jobs, key_func, cost_func=lambda job: 1.0):
+        """Jobs sorted best-first by the current scores (no state change)."""
+        return sorted(jobs, key=lambda job: self.score(key_func(job), cost_func(job)), reverse=True)
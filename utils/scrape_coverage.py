@@ -0,0 +1,140 @@
+# utils/scrape_coverage.py
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from .db_crud import get_scrape_coverage_rows
+
+logger = logging.getLogger(__name__)
+
+ONE_DAY = timedelta(days=1)
+COVERAGE_GAP_MERGE_DAYS = 2 # Gaps separated by a covered stretch this short are searched as one window
+
+
+def merge_intervals(intervals):
+    """Merges inclusive (start_date, end_date) intervals; overlapping or adjacent ones coalesce."""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1] + ONE_DAY:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def subtract_intervals(start, end, covered):
+    """Returns the inclusive sub-intervals of [start, end] not covered by any interval in `covered`."""
+    gaps = []
+    cursor = start
+    for covered_start, covered_end in merge_intervals(covered):
+        if covered_end < cursor:
+            continue
+        if covered_start > end:
+            break
+        if covered_start > cursor:
+            gaps.append((cursor, covered_start - ONE_DAY))
+        cursor = covered_end + ONE_DAY
+        if cursor > end:
+            break
+    if cursor <= end:
+        gaps.append((cursor, end))
+    return gaps
+
+
+def coalesce_gaps(gaps, max_bridge_days=COVERAGE_GAP_MERGE_DAYS):
+    """Joins gaps whose separating covered stretch is <= max_bridge_days: one search instead of two."""
+    coalesced = []
+    for start, end in gaps:
+        if coalesced and (start - coalesced[-1][1]).days - 1 <= max_bridge_days:
+            coalesced[-1] = (coalesced[-1][0], end)
+        else:
+            coalesced.append((start, end))
+    return coalesced
+
+
+def interval_days(intervals):
+    return sum((end - start).days + 1 for start, end in intervals)
+
+
+class CoverageIndex:
+    """
+    In-memory view of the scrape_coverage table for one run: which (entity, domain, query
+    pattern) day windows have already been searched, and what they yielded.
+    """
+
+    def __init__(self, rows=()):
+        self._covered = defaultdict(list) # (entity_type, entity_name, domain, pattern) -> [(start, end)]
+        self._yield = defaultdict(lambda: {'searches': 0, 'urls_found': 0, 'articles_saved': 0})
+        for row in rows:
+            self.add(*row)
+
+    @classmethod
+    def load(cls, db, start_date, end_date, news_domains=None):
+        rows = get_scrape_coverage_rows(db, start_date, end_date, news_domains)
+        logger.info(f"[Coverage] Loaded {len(rows)} coverage windows overlapping {start_date}..{end_date}.")
+        return cls(rows)
+
+    def add(self, entity_type, entity_name, news_domain, query_pattern, start_date, end_date, urls_found=0, articles_saved=0):
+        key = (entity_type, entity_name, news_domain, query_pattern)
+        self._covered[key].append((start_date, end_date))
+        entity_yield = self._yield[(entity_type, entity_name, news_domain)]
+        entity_yield['searches'] += 1
+        entity_yield['urls_found'] += urls_found or 0
+        entity_yield['articles_saved'] += articles_saved or 0
+
+    def covered(self, entity_type, entity_name, news_domain, query_pattern=None):
+        """Merged covered intervals for one query pattern, or the union over all patterns when None."""
+        if query_pattern is not None:
+            return merge_intervals(self._covered.get((entity_type, entity_name, news_domain, query_pattern), []))
+        intervals = [interval for (e_type, e_name, domain, _), windows in self._covered.items()
+                     if (e_type, e_name, domain) == (entity_type, entity_name, news_domain) for interval in windows]
+        return merge_intervals(intervals)
+
+    def gaps(self, entity_type, entity_name, news_domain, query_pattern, start_date, end_date, max_bridge_days=COVERAGE_GAP_MERGE_DAYS):
+        """Uncovered windows of [start_date, end_date] still to be searched for this query pattern."""
+        return coalesce_gaps(subtract_intervals(start_date, end_date, self.covered(entity_type, entity_name, news_domain, query_pattern)),
+                             max_bridge_days)
+
+    def entity_yield(self, entity_type, entity_name, news_domain):
+        return dict(self._yield[(entity_type, entity_name, news_domain)])
+
+
+def contiguous_coverage_end(index, entity_type, entity_name, news_domains, query_patterns, start_date, end_date):
+    """
+    Last day D such that [start_date, D] is covered for every domain x query pattern of the entity
+    (start_date - 1 day when the first day itself is still a gap). Used to advance entity watermarks.
+    """
+    covered_through = end_date
+    for domain in news_domains:
+        for pattern in query_patterns:
+            gaps = subtract_intervals(start_date, end_date, index.covered(entity_type, entity_name, domain, pattern))
+            if gaps:
+                covered_through = min(covered_through, gaps[0][0] - ONE_DAY)
+    return covered_through
+
+
+def build_coverage_report(index, sectors_config, news_domains, start_date, end_date):
+    """
+    Per-sector coverage of [start_date, end_date]: an entity (the sector itself or one of its
+    stocks) counts a day as covered on a domain when any of its query patterns searched it.
+    Returns [{'sector', 'coverage_pct', 'entities': [{'entity_type', 'entity_name', 'news_domain',
+    'coverage_pct', 'holes', 'articles_saved'}]}], least covered sectors first.
+    """
+    total_days = (end_date - start_date).days + 1
+    report = []
+    for sector_name, sector_details in sectors_config.items():
+        entities = [("sector", sector_name)] + [("stock", stock) for stock in sector_details.get("stocks", {})]
+        rows, covered_days_sum = [], 0
+        for entity_type, entity_name in entities:
+            for domain in news_domains:
+                holes = subtract_intervals(start_date, end_date, index.covered(entity_type, entity_name, domain))
+                covered_days = total_days - interval_days(holes)
+                covered_days_sum += covered_days
+                rows.append({'entity_type': entity_type, 'entity_name': entity_name, 'news_domain': domain,
+                             'coverage_pct': round(100.0 * covered_days / total_days, 1), 'holes': holes,
+                             'articles_saved': index.entity_yield(entity_type, entity_name, domain)['articles_saved']})
+        sector_pct = 100.0 * covered_days_sum / (total_days * len(rows)) if rows else 0.0
+        report.append({'sector': sector_name, 'coverage_pct': round(sector_pct, 1), 'entities': rows})
+    report.sort(key=lambda sector_report: sector_report['coverage_pct'])
+    return report
@@ -0,0 +1,324 @@
+# utils/sentiment_aggregates.py
+"""
+Incrementally maintained daily sentiment per entity (the daily_entity_sentiment table).
+
+Each write path that inserts an article or changes its VADER/LLM score or entity tags
+passes before/after snapshots to ArticleAggregateChanges. A score that appears for the
+first time only adds to sum/count and widens min/max, so it becomes one upsert. A score
+that is replaced or removed recomputes just the affected (entity, day, source) cells from
+scraped_articles. Daily series and range averages are then primary-key range reads.
+
+Near-duplicate copies (utils/near_duplicates.py) count once: each (cluster, entity, day) is
+represented by its lowest-id article, so a syndicated story carried by several outlets does
+not weigh several times. Cells touched by an article of a multi-member cluster are rebuilt
+rather than incremented, since adding a copy may not change them at all.
+"""
+import argparse
+import logging
+from datetime import date, datetime, time, timedelta, timezone
+
+from sqlalchemy import and_, case, exists, func, insert, or_
+from sqlalchemy.orm import aliased
+
+from .database_models import DailyEntitySentiment, ScrapedArticle
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FIELDS = ('id', 'cluster_id', 'publication_date', 'source_domain', 'related_sector', 'related_stock',
+                   'vader_score', 'llm_sentiment_score')
+ENTITY_COLUMNS = (('sector', 'related_sector'), ('stock', 'related_stock'))
+UNKNOWN_SOURCE = ''
+
+
+def article_snapshot(article):
+    """SNAPSHOT_FIELDS of an ORM article, a query row or a dict (missing fields -> None)."""
+    if article is None:
+        return None
+    if isinstance(article, dict):
+        return {field: article.get(field) for field in SNAPSHOT_FIELDS}
+    return {field: getattr(article, field, None) for field in SNAPSHOT_FIELDS}
+
+
+def _cells(snapshot):
+    """{(entity_type, entity_name, day, source): (vader_score, llm_score)} an article contributes to."""
+    if not snapshot or not snapshot.get('publication_date'):
+        return {}
+    day = snapshot['publication_date'].date()
+    source = snapshot.get('source_domain') or UNKNOWN_SOURCE
+    scores = (snapshot.get('vader_score'), snapshot.get('llm_sentiment_score'))
+    return {(entity_type, snapshot[field], day, source): scores
+            for entity_type, field in ENTITY_COLUMNS if snapshot.get(field)}
+
+
+def _day_bounds(day):
+    start = datetime.combine(day, time.min)
+    return start, start + timedelta(days=1)
+
+
+def _utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class ArticleAggregateChanges:
+    """Collects aggregate deltas for a batch of article writes; apply() them in the same transaction."""
+
+    def __init__(self):
+        self.increments = {} # cell -> column increments
+        self.rebuild = set() # cells whose min/max (or sums) cannot be adjusted additively
+        self.touched_clusters = set() # cluster_ids of changed articles; shared clusters are rebuilt as a whole
+
+    def __bool__(self):
+        return bool(self.increments or self.rebuild)
+
+    def add(self, before, after):
+        """Records one article change; `before` is None for a new article, snapshots from article_snapshot()."""
+        old_cells, new_cells = _cells(before), _cells(after)
+        cluster_changed = before is not None and after is not None and \
+            (before.get('cluster_id') or before.get('id')) != (after.get('cluster_id') or after.get('id')) # Unclustered = own cluster
+        for cell in old_cells.keys() | new_cells.keys():
+            old, new = old_cells.get(cell), new_cells.get(cell)
+            if old == new and not cluster_changed:
+                continue
+            self.touched_clusters.update(snapshot['cluster_id'] for snapshot in (before, after)
+                                         if snapshot and snapshot.get('cluster_id') is not None)
+            if cluster_changed: # It may stop (or start) being its cluster's representative
+                self.rebuild.add(cell)
+                continue
+            if old is None: # Article now counts towards this cell
+                self._increment(cell, 1, *new)
+            elif new is None: # Article left the cell (tags or date changed)
+                self.rebuild.add(cell)
+            elif any(old_score is not None and old_score != new_score for old_score, new_score in zip(old, new)):
+                self.rebuild.add(cell) # A score was replaced or cleared
+            else: # Only scores that were missing before
+                self._increment(cell, 0, *[new_score if old_score is None else None for old_score, new_score in zip(old, new)])
+
+    def _increment(self, cell, articles, vader_score, llm_score):
+        inc = self.increments.setdefault(cell, {
+            'article_count': 0, 'vader_sum': 0.0, 'vader_count': 0, 'vader_min': None, 'vader_max': None,
+            'llm_score_sum': 0.0, 'llm_score_count': 0})
+        inc['article_count'] += articles
+        if vader_score is not None:
+            inc['vader_sum'] += vader_score
+            inc['vader_count'] += 1
+            inc['vader_min'] = vader_score if inc['vader_min'] is None else min(inc['vader_min'], vader_score)
+            inc['vader_max'] = vader_score if inc['vader_max'] is None else max(inc['vader_max'], vader_score)
+        if llm_score is not None:
+            inc['llm_score_sum'] += llm_score
+            inc['llm_score_count'] += 1
+
+    def apply(self, db):
+        """Writes the collected deltas through `db` without committing (the caller's commit covers article + aggregates)."""
+        if not self:
+            return
+        db.flush() # Rebuilt cells read the article rows written in this transaction
+        self._rebuild_shared_clusters(db)
+        now = _utcnow()
+        rows = [dict(entity_type=cell[0], entity_name=cell[1], day=cell[2], source=cell[3], updated_at=now, **inc)
+                for cell, inc in self.increments.items() if cell not in self.rebuild]
+        if rows:
+            _upsert_increments(db, rows)
+        for cell in self.rebuild:
+            _rebuild_cell(db, cell, now)
+        logger.debug(f"[SentimentAgg] Applied {len(rows)} incremental and {len(self.rebuild)} rebuilt daily cells.")
+        self.increments, self.rebuild, self.touched_clusters = {}, set(), set()
+
+    def _rebuild_shared_clusters(self, db):
+        """Rebuilds every cell of the touched clusters that have near-duplicate copies (the representative may move)."""
+        if not self.touched_clusters:
+            return
+        snapshot_columns = [getattr(ScrapedArticle, field) for field in SNAPSHOT_FIELDS]
+        members = {}
+        for row in db.query(*snapshot_columns).filter(ScrapedArticle.cluster_id.in_(list(self.touched_clusters))).all():
+            members.setdefault(row.cluster_id, []).append(dict(zip(SNAPSHOT_FIELDS, row)))
+        for copies in members.values():
+            if len(copies) > 1:
+                for snapshot in copies:
+                    self.rebuild.update(_cells(snapshot))
+
+
+def _dialect_insert(db):
+    dialect_name = db.get_bind().dialect.name
+    if dialect_name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    elif dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        return None
+    return dialect_insert
+
+
+def _extreme(current, incoming, lowest):
+    """NULL-aware LEAST/GREATEST that works on both SQLite and PostgreSQL."""
+    return case((current.is_(None), incoming), (incoming.is_(None), current),
+                ((incoming < current) if lowest else (incoming > current), incoming), else_=current)
+
+
+def _upsert_increments(db, rows):
+    dialect_insert = _dialect_insert(db)
+    if dialect_insert is None: # Portable (slower) path for other databases
+        for row in rows:
+            key = (row['entity_type'], row['entity_name'], row['day'], row['source'])
+            existing = db.get(DailyEntitySentiment, key)
+            if existing is None:
+                db.add(DailyEntitySentiment(**row))
+                continue
+            for column in ('article_count', 'vader_sum', 'vader_count', 'llm_score_sum', 'llm_score_count'):
+                setattr(existing, column, getattr(existing, column) + row[column])
+            for column, pick in (('vader_min', min), ('vader_max', max)):
+                values = [v for v in (getattr(existing, column), row[column]) if v is not None]
+                setattr(existing, column, pick(values) if values else None)
+            existing.updated_at = row['updated_at']
+        return
+    table = DailyEntitySentiment.__table__
+    statement = dialect_insert(table)
+    excluded = statement.excluded
+    set_ = {column: table.c[column] + excluded[column]
+            for column in ('article_count', 'vader_sum', 'vader_count', 'llm_score_sum', 'llm_score_count')}
+    set_['vader_min'] = _extreme(table.c.vader_min, excluded.vader_min, lowest=True)
+    set_['vader_max'] = _extreme(table.c.vader_max, excluded.vader_max, lowest=False)
+    set_['updated_at'] = excluded.updated_at
+    statement = statement.on_conflict_do_update(index_elements=[column.name for column in table.primary_key.columns], set_=set_)
+    db.execute(statement, rows) # executemany
+
+
+def _aggregate_columns():
+    return (func.count(ScrapedArticle.id), func.coalesce(func.sum(ScrapedArticle.vader_score), 0.0),
+            func.count(ScrapedArticle.vader_score), func.min(ScrapedArticle.vader_score), func.max(ScrapedArticle.vader_score),
+            func.coalesce(func.sum(ScrapedArticle.llm_sentiment_score), 0.0), func.count(ScrapedArticle.llm_sentiment_score))
+
+
+def _aggregate_row(key, values, now):
+    article_count, vader_sum, vader_count, vader_min, vader_max, llm_sum, llm_count = values
+    entity_type, entity_name, day, source = key
+    return dict(entity_type=entity_type, entity_name=entity_name, day=day, source=source,
+                article_count=article_count, vader_sum=vader_sum, vader_count=vader_count, vader_min=vader_min,
+                vader_max=vader_max, llm_score_sum=llm_sum, llm_score_count=llm_count, updated_at=now)
+
+
+def _cluster_representative(field):
+    """Filter keeping one article per (cluster, `field` entity, day): the lowest id. Unclustered articles always count."""
+    copy = aliased(ScrapedArticle)
+    return or_(ScrapedArticle.cluster_id == None, ~exists().where(and_(
+        copy.cluster_id == ScrapedArticle.cluster_id, copy.id < ScrapedArticle.id,
+        getattr(copy, field) == getattr(ScrapedArticle, field),
+        func.date(copy.publication_date) == func.date(ScrapedArticle.publication_date))))
+
+
+def _rebuild_cell(db, cell, now):
+    entity_type, entity_name, day, source = cell
+    field = dict(ENTITY_COLUMNS)[entity_type]
+    entity_column = getattr(ScrapedArticle, field)
+    day_start, day_end = _day_bounds(day)
+    source_filter = (func.coalesce(ScrapedArticle.source_domain, UNKNOWN_SOURCE) == source)
+    values = db.query(*_aggregate_columns()).filter(
+        entity_column == entity_name, ScrapedArticle.publication_date >= day_start,
+        ScrapedArticle.publication_date < day_end, source_filter, _cluster_representative(field)).one()
+    existing = db.get(DailyEntitySentiment, cell)
+    if not values[0]:
+        if existing is not None:
+            db.delete(existing)
+        return
+    db.merge(DailyEntitySentiment(**_aggregate_row(cell, values, now)))
+
+
+def rebuild_daily_entity_sentiment(db, start_date=None, end_date=None):
+    """Recomputes daily_entity_sentiment from scraped_articles for [start_date, end_date] (all days if omitted) and commits."""
+    now = _utcnow()
+    aggregates = db.query(DailyEntitySentiment)
+    if start_date is not None:
+        aggregates = aggregates.filter(DailyEntitySentiment.day >= start_date)
+    if end_date is not None:
+        aggregates = aggregates.filter(DailyEntitySentiment.day <= end_date)
+    try:
+        aggregates.delete(synchronize_session=False)
+        rows = []
+        for entity_type, field in ENTITY_COLUMNS:
+            entity_column = getattr(ScrapedArticle, field)
+            day_column = func.date(ScrapedArticle.publication_date)
+            source_column = func.coalesce(ScrapedArticle.source_domain, UNKNOWN_SOURCE)
+            query = db.query(entity_column, day_column, source_column, *_aggregate_columns()).filter(
+                entity_column != None, entity_column != "", ScrapedArticle.publication_date != None,
+                _cluster_representative(field))
+            if start_date is not None:
+                query = query.filter(ScrapedArticle.publication_date >= _day_bounds(start_date)[0])
+            if end_date is not None:
+                query = query.filter(ScrapedArticle.publication_date < _day_bounds(end_date)[1])
+            for entity_name, day, source, *values in query.group_by(entity_column, day_column, source_column).all():
+                day = day if isinstance(day, date) else date.fromisoformat(str(day)[:10]) # SQLite's date() returns text
+                rows.append(_aggregate_row((entity_type, entity_name, day, source), values, now))
+        if rows:
+            db.execute(insert(DailyEntitySentiment.__table__), rows)
+        db.commit()
+        logger.info(f"[SentimentAgg] Rebuilt {len(rows)} daily entity sentiment rows ({start_date or 'start'} to {end_date or 'end'}).")
+        return len(rows)
+    except Exception as e:
+        db.rollback()
+        logger.error(f"[SentimentAgg] Error rebuilding daily entity sentiment: {e}")
+        return 0
+
+
+def record_new_articles(db, articles):
+    """Adds newly inserted (not yet committed) articles to their daily cells; call before the commit."""
+    changes = ArticleAggregateChanges()
+    for article in articles:
+        changes.add(None, article_snapshot(article))
+    changes.apply(db)
+
+
+def _filtered_aggregates(query, entity_type, entity_name, start_date, end_date, sources):
+    query = query.filter(DailyEntitySentiment.entity_type == entity_type, DailyEntitySentiment.entity_name == entity_name,
+                         DailyEntitySentiment.day >= start_date, DailyEntitySentiment.day <= end_date)
+    if sources:
+        query = query.filter(DailyEntitySentiment.source.in_(list(sources)))
+    return query
+
+
+def _summary_columns():
+    return (func.sum(DailyEntitySentiment.article_count), func.sum(DailyEntitySentiment.vader_sum),
+            func.sum(DailyEntitySentiment.vader_count), func.min(DailyEntitySentiment.vader_min),
+            func.max(DailyEntitySentiment.vader_max), func.sum(DailyEntitySentiment.llm_score_sum),
+            func.sum(DailyEntitySentiment.llm_score_count))
+
+
+def _summary_dict(values):
+    article_count, vader_sum, vader_count, vader_min, vader_max, llm_sum, llm_count = values
+    return {
+        'article_count': article_count or 0,
+        'vader_count': vader_count or 0,
+        'avg_vader_score': vader_sum / vader_count if vader_count else None,
+        'min_vader_score': vader_min,
+        'max_vader_score': vader_max,
+        'llm_score_count': llm_count or 0,
+        'avg_llm_score': llm_sum / llm_count if llm_count else None,
+    }
+
+
+def get_daily_sentiment_series(db, entity_type, entity_name, start_date, end_date, sources=None):
+    """One dict per day with articles in [start_date, end_date] (oldest first), summed over sources."""
+    query = _filtered_aggregates(db.query(DailyEntitySentiment.day, *_summary_columns()),
+                                 entity_type, entity_name, start_date, end_date, sources)
+    return [dict(date=day.isoformat(), **_summary_dict(values))
+            for day, *values in query.group_by(DailyEntitySentiment.day).order_by(DailyEntitySentiment.day).all()]
+
+
+def get_entity_sentiment_summary(db, entity_type, entity_name, start_date, end_date, sources=None):
+    """Totals/averages for an entity over [start_date, end_date]."""
+    values = _filtered_aggregates(db.query(*_summary_columns()), entity_type, entity_name, start_date, end_date, sources).one()
+    return _summary_dict(values)
+
+
+if __name__ == "__main__":
+    from .database_models import SessionLocal, create_db_and_tables
+
+    parser = argparse.ArgumentParser(description="Rebuild daily_entity_sentiment from scraped_articles.")
+    parser.add_argument("--start-date", type=date.fromisoformat, default=None, help="YYYY-MM-DD (default: all days)")
+    parser.add_argument("--end-date", type=date.fromisoformat, default=None, help="YYYY-MM-DD (default: all days)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    create_db_and_tables()
+    session = SessionLocal()
+    try:
+        print(f"Rebuilt {rebuild_daily_entity_sentiment(session, args.start_date, args.end_date)} rows.")
+    finally:
+        session.close()
@@ -0,0 +1,164 @@
+# utils/sentiment_series.py
+"""
+Daily sentiment time series for many sectors/stocks, computed with NumPy over the
+daily_entity_sentiment columns (one grouped query for all requested entities).
+
+Every entity is laid on the same dense calendar-day axis. Daily means are count-weighted
+(sum of article scores / number of scored articles), the rolling mean and EMA weight each
+day by its article count (empty days contribute nothing), and the z-score compares a
+day's mean with the means of the `z_window` days before it.
+"""
+import logging
+
+import numpy as np
+from sqlalchemy import and_, func, or_
+
+from .database_models import DailyEntitySentiment
+
+logger = logging.getLogger(__name__)
+
+SCORE_COLUMNS = {
+    'vader': (DailyEntitySentiment.vader_sum, DailyEntitySentiment.vader_count),
+    'llm': (DailyEntitySentiment.llm_score_sum, DailyEntitySentiment.llm_score_count),
+}
+DEFAULT_ROLLING_WINDOW_DAYS = 7
+DEFAULT_EMA_SPAN_DAYS = 10
+DEFAULT_ZSCORE_WINDOW_DAYS = 30
+MAX_SERIES_ENTITIES = 50
+_EMA_MAX_LOG_GROWTH = 600.0 # Keeps (1 - alpha) ** -k well inside float64 range in _ema()
+
+
+def fetch_daily_columns(db, entities, start_date, end_date, score="vader"):
+    """
+    Columns (entity_key, day, score_sum, score_count, article_count) summed over sources, for
+    `entities` = [(entity_type, entity_name), ...] over [start_date, end_date], as NumPy arrays.
+    """
+    score_sum, score_count = SCORE_COLUMNS[score]
+    names_by_type = {}
+    for entity_type, entity_name in entities:
+        names_by_type.setdefault(entity_type, []).append(entity_name)
+    entity_filter = or_(*[and_(DailyEntitySentiment.entity_type == entity_type, DailyEntitySentiment.entity_name.in_(names))
+                          for entity_type, names in names_by_type.items()])
+    rows = db.query(
+        DailyEntitySentiment.entity_type, DailyEntitySentiment.entity_name, DailyEntitySentiment.day,
+        func.sum(score_sum), func.sum(score_count), func.sum(DailyEntitySentiment.article_count)
+    ).filter(entity_filter, DailyEntitySentiment.day >= start_date, DailyEntitySentiment.day <= end_date).group_by(
+        DailyEntitySentiment.entity_type, DailyEntitySentiment.entity_name, DailyEntitySentiment.day).all()
+    keys = {entity: index for index, entity in enumerate(entities)}
+    return (
+        np.fromiter((keys[(row[0], row[1])] for row in rows), dtype=np.int64, count=len(rows)),
+        np.array([row[2] for row in rows], dtype="datetime64[D]"),
+        np.fromiter((row[3] or 0.0 for row in rows), dtype=np.float64, count=len(rows)),
+        np.fromiter((row[4] or 0 for row in rows), dtype=np.float64, count=len(rows)),
+        np.fromiter((row[5] or 0 for row in rows), dtype=np.float64, count=len(rows)),
+    )
+
+
+def _trailing_sum(values, window, include_current=True):
+    """Sum over the last `window` days along axis 1 (ending today, or yesterday with include_current=False)."""
+    cumulative = np.concatenate([np.zeros((values.shape[0], 1)), np.cumsum(values, axis=1)], axis=1)
+    end = np.arange(values.shape[1]) + (1 if include_current else 0)
+    start = np.maximum(end - window, 0)
+    return cumulative[:, end] - cumulative[:, start]
+
+
+def _ema(values, alpha):
+    """
+    y[t] = (1 - alpha) * y[t-1] + alpha * x[t] along axis 1, y[-1] = 0, without a Python loop over days:
+    within a block, y[t] = d**t * (y0 + sum_k alpha * x[k] / d**k) with d = 1 - alpha. Blocks are sized so d**-k stays finite.
+    """
+    decay = 1.0 - alpha
+    if decay <= 0.0:
+        return values.copy()
+    block = max(1, int(_EMA_MAX_LOG_GROWTH / -np.log(decay)))
+    result = np.empty_like(values)
+    carry = np.zeros(values.shape[0])
+    for block_start in range(0, values.shape[1], block):
+        chunk = values[:, block_start:block_start + block]
+        powers = decay ** np.arange(1, chunk.shape[1] + 1)
+        ema_chunk = powers * (carry[:, None] + np.cumsum(alpha * chunk / powers, axis=1))
+        result[:, block_start:block_start + block] = ema_chunk
+        carry = ema_chunk[:, -1]
+    return result
+
+
+def _ratio(numerator, denominator):
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(denominator > 0, numerator / np.where(denominator > 0, denominator, 1.0), np.nan)
+
+
+def dense_daily_arrays(entity_index, days, score_sums, score_counts, article_counts, n_entities, start_date, end_date):
+    """Calendar-day axis plus (n_entities x n_days) score sum / score count / article count matrices (zeros on empty days)."""
+    axis = np.arange(np.datetime64(start_date, "D"), np.datetime64(end_date, "D") + 1)
+    shape = (n_entities, len(axis))
+    sums, counts, articles = np.zeros(shape), np.zeros(shape), np.zeros(shape)
+    day_index = (days - axis[0]).astype(np.int64)
+    sums[entity_index, day_index] = score_sums # Rows are unique per (entity, day) after the GROUP BY
+    counts[entity_index, day_index] = score_counts
+    articles[entity_index, day_index] = article_counts
+    return axis, sums, counts, articles
+
+
+def load_daily_matrices(db, entities, start_date, end_date, score="vader"):
+    """dense_daily_arrays() for `entities` straight from the database."""
+    return dense_daily_arrays(*fetch_daily_columns(db, entities, start_date, end_date, score=score),
+                              len(entities), start_date, end_date)
+
+
+def trailing_mean(sums, counts, window):
+    """Count-weighted mean over the trailing `window` days (including the current one); NaN when no scores."""
+    return _ratio(_trailing_sum(sums, window), _trailing_sum(counts, window))
+
+
+def compute_sentiment_series(entity_index, days, score_sums, score_counts, article_counts, n_entities, start_date, end_date,
+                             rolling_window=DEFAULT_ROLLING_WINDOW_DAYS, ema_span=DEFAULT_EMA_SPAN_DAYS,
+                             z_window=DEFAULT_ZSCORE_WINDOW_DAYS):
+    """Dense (n_entities x n_days) arrays from fetch_daily_columns() output."""
+    axis, sums, counts, articles = dense_daily_arrays(entity_index, days, score_sums, score_counts, article_counts,
+                                                      n_entities, start_date, end_date)
+
+    daily_mean = _ratio(sums, counts)
+    rolling_mean = trailing_mean(sums, counts, rolling_window)
+    alpha = 2.0 / (ema_span + 1.0)
+    ema = _ratio(_ema(sums, alpha), _ema(counts, alpha)) # Count-weighted EMA; empty days only decay the weights
+
+    has_mean = counts > 0
+    mean_or_zero = np.where(has_mean, daily_mean, 0.0)
+    prior_days = _trailing_sum(has_mean.astype(np.float64), z_window, include_current=False)
+    prior_mean = _ratio(_trailing_sum(mean_or_zero, z_window, include_current=False), prior_days)
+    prior_square_mean = _ratio(_trailing_sum(mean_or_zero ** 2, z_window, include_current=False), prior_days)
+    prior_std = np.sqrt(np.maximum(prior_square_mean - prior_mean ** 2, 0.0))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        zscore = np.where(has_mean & (prior_days >= 2) & (prior_std > 0), (daily_mean - prior_mean) / prior_std, np.nan)
+
+    return {
+        'dates': np.datetime_as_string(axis, unit="D"),
+        'article_count': articles, 'scored_count': counts, 'mean': daily_mean,
+        'rolling_mean': rolling_mean, 'ema': ema, 'zscore': zscore,
+    }
+
+
+def _json_values(values, decimals=4):
+    rounded = np.round(values, decimals)
+    return np.where(np.isnan(rounded), None, rounded).tolist()
+
+
+def get_sentiment_series(db, entities, start_date, end_date, score="vader", rolling_window=DEFAULT_ROLLING_WINDOW_DAYS,
+                         ema_span=DEFAULT_EMA_SPAN_DAYS, z_window=DEFAULT_ZSCORE_WINDOW_DAYS):
+    """JSON-ready series for /api/sentiment-series: {'dates': [...], 'series': {"stock:TCS": {...}, ...}}."""
+    entities = list(dict.fromkeys(entities))
+    columns = fetch_daily_columns(db, entities, start_date, end_date, score=score)
+    arrays = compute_sentiment_series(*columns, len(entities), start_date, end_date,
+                                      rolling_window=rolling_window, ema_span=ema_span, z_window=z_window)
+    series = {}
+    for index, (entity_type, entity_name) in enumerate(entities):
+        series[f"{entity_type}:{entity_name}"] = {
+            'entity_type': entity_type, 'entity_name': entity_name,
+            'article_count': arrays['article_count'][index].astype(int).tolist(),
+            'scored_count': arrays['scored_count'][index].astype(int).tolist(),
+            'mean': _json_values(arrays['mean'][index]),
+            'rolling_mean': _json_values(arrays['rolling_mean'][index]),
+            'ema': _json_values(arrays['ema'][index]),
+            'zscore': _json_values(arrays['zscore'][index], decimals=3),
+        }
+    return {'dates': arrays['dates'].tolist(), 'series': series}
@@ -0,0 +1,133 @@
+# utils/storage.py
+"""
+Storage configuration: engine creation, SQLite pragmas and connection/lock metrics.
+
+SQLite runs in WAL mode so the Flask app's readers never wait for the bulk scraper's
+writes (and vice versa for the last committed snapshot); only writers serialise, and
+they wait up to SQLITE_BUSY_TIMEOUT_MS for the lock instead of failing immediately.
+"""
+import logging
+import os
+import time
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import OperationalError
+
+from .newsfetch_lib.metrics import ScrapeMetrics
+
+logger = logging.getLogger(__name__)
+
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", 30000))
+SQLITE_MMAP_SIZE_BYTES = int(os.environ.get("SQLITE_MMAP_SIZE_BYTES", 256 * 1024 * 1024))
+SQLITE_CACHE_SIZE_KIB = int(os.environ.get("SQLITE_CACHE_SIZE_KIB", 64 * 1024)) # Per connection
+SQLITE_SYNCHRONOUS = os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL") # Durable across app crashes in WAL mode; FULL for power loss
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 10))
+DB_POOL_MAX_OVERFLOW = int(os.environ.get("DB_POOL_MAX_OVERFLOW", 10))
+SLOW_WRITE_SECONDS = 0.1 # Write statements slower than this are counted as (probable) lock waits
+
+STATEMENT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+_WRITE_VERBS = ("INSERT", "UPDATE", "DELETE", "REPLACE", "CREATE", "ALTER", "DROP")
+
+storage_metrics = ScrapeMetrics(buckets=STATEMENT_BUCKETS, prefix="storage_")
+
+
+def sqlite_pragmas():
+    return [
+        "PRAGMA journal_mode=WAL",
+        f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}",
+        f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}",
+        f"PRAGMA mmap_size={SQLITE_MMAP_SIZE_BYTES}",
+        f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KIB}", # Negative = KiB rather than pages
+        "PRAGMA temp_store=MEMORY",
+    ]
+
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        for pragma in sqlite_pragmas():
+            try:
+                cursor.execute(pragma)
+            except Exception as e: # e.g. WAL switch while another process holds an exclusive lock
+                logger.warning(f"[Storage] {pragma} failed: {e}")
+    finally:
+        cursor.close()
+    storage_metrics.inc("connections_opened_total")
+
+
+def _install_metrics_hooks(engine):
+    @event.listens_for(engine, "checkout")
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+        storage_metrics.inc("pool_checkouts_total")
+        connection_record.info['checked_out_at'] = time.perf_counter()
+
+    @event.listens_for(engine, "checkin")
+    def _on_checkin(dbapi_connection, connection_record):
+        checked_out_at = connection_record.info.pop('checked_out_at', None)
+        if checked_out_at is not None:
+            storage_metrics.observe("connection_hold_seconds", time.perf_counter() - checked_out_at)
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('statement_started', []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['statement_started'].pop()
+        kind = "write" if statement.lstrip()[:7].upper().startswith(_WRITE_VERBS) else "read"
+        storage_metrics.observe("statement_seconds", elapsed, kind=kind)
+        if kind == "write" and elapsed >= SLOW_WRITE_SECONDS:
+            # With busy_timeout, a write blocked by another writer shows up as a slow statement
+            storage_metrics.inc("slow_writes_total")
+            storage_metrics.observe("slow_write_seconds", elapsed)
+
+    @event.listens_for(engine, "handle_error")
+    def _on_error(exception_context):
+        if exception_context.statement is not None and exception_context.connection is not None:
+            started = exception_context.connection.info.get('statement_started')
+            if started:
+                started.pop()
+        if isinstance(exception_context.sqlalchemy_exception, OperationalError) and \
+                "locked" in str(exception_context.original_exception).lower():
+            storage_metrics.inc("lock_timeouts_total")
+
+
+def create_storage_engine(database_url):
+    """Engine for `database_url`; SQLite gets WAL + tuned pragmas on every new connection."""
+    engine_kwargs = {}
+    is_sqlite = database_url.startswith("sqlite")
+    if is_sqlite:
+        # Flask request threads and scraper workers share the pool; sqlite3's own timeout mirrors busy_timeout
+        engine_kwargs['connect_args'] = {"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000.0}
+        if ":memory:" not in database_url and database_url not in ("sqlite://", "sqlite:///"):
+            engine_kwargs.update(pool_size=DB_POOL_SIZE, max_overflow=DB_POOL_MAX_OVERFLOW)
+    else:
+        engine_kwargs.update(pool_size=DB_POOL_SIZE, max_overflow=DB_POOL_MAX_OVERFLOW, pool_pre_ping=True)
+    engine = create_engine(database_url, **engine_kwargs)
+    if is_sqlite:
+        event.listen(engine, "connect", _apply_sqlite_pragmas)
+    _install_metrics_hooks(engine)
+    return engine
+
+
+def storage_stats(engine):
+    """Pool state, effective SQLite settings and statement/lock metrics, for /api/storage-metrics."""
+    pool = engine.pool
+    pool_stats = {'class': type(pool).__name__, 'status': pool.status()}
+    for attr in ("size", "checkedout", "checkedin", "overflow"):
+        if hasattr(pool, attr):
+            pool_stats[attr] = getattr(pool, attr)()
+    stats = {'pool': pool_stats}
+    if engine.dialect.name == "sqlite":
+        settings = {}
+        try:
+            with engine.connect() as conn:
+                for pragma in ("journal_mode", "synchronous", "busy_timeout", "mmap_size", "cache_size", "wal_autocheckpoint"):
+                    settings[pragma] = conn.exec_driver_sql(f"PRAGMA {pragma}").scalar()
+        except Exception as e:
+            settings['error'] = str(e)
+        stats['sqlite'] = settings
+    report = storage_metrics.report()
+    stats['counters'] = report['counters']
+    stats['histograms'] = report['histograms']
+    return stats